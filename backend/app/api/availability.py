@@ -0,0 +1,25 @@
+# 空き状況の一括確認API
+from fastapi import APIRouter, HTTPException
+from app.schemas.availability import AvailabilityBatchRequest, AvailabilityBatchResponse
+from app.services.availability_service import get_batch_availability
+
+router = APIRouter(prefix="/api/availability", tags=["availability"])
+
+@router.post("/batch", response_model=AvailabilityBatchResponse)
+async def check_availability_batch(request: AvailabilityBatchRequest):
+    """複数の予約枠・商品の空き状況をまとめて確認
+
+    /api/timeslots/availability と /api/products/{id}/availability と同じ項目を、
+    リクエストと同じ順で返す。
+    """
+    try:
+        return await get_batch_availability(
+            [(slot.date, slot.time) for slot in request.slots],
+            request.product_ids,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"空き状況の確認に失敗しました: {str(e)}")
@@ -0,0 +1,107 @@
+# 一括リクエストAPI（初回表示で必要な複数のGET APIを1回の通信で取得する）
+import asyncio
+import json
+from urllib.parse import unquote, urlsplit
+from fastapi import APIRouter, HTTPException, Request
+from app.schemas.batch import BatchRequest, BatchResponse, BatchSubRequest
+from app.utils.request_cache import start_request_cache, reset_request_cache
+
+router = APIRouter(prefix="/api", tags=["batch"])
+
+# サブリクエストに引き継がないヘッダー
+_SKIPPED_REQUEST_HEADERS = (b"content-length", b"content-type", b"transfer-encoding")
+
+def _rejection_reason(path: str) -> str:
+    """サブリクエストとして実行できないパスの場合は理由を返す"""
+    if path.startswith("/api/batch"):
+        return "一括リクエストを入れ子にすることはできません"
+    if path.startswith("/api/admin/"):
+        return "管理者用APIは一括リクエストに含められません"
+    return ""
+
+async def _dispatch(request: Request, sub_request: BatchSubRequest) -> dict:
+    """サブリクエストをアプリ内で実行し、ステータス・ヘッダー・ボディを返す"""
+    url = urlsplit(sub_request.path)
+    path = unquote(url.path)
+    reason = _rejection_reason(path)
+    if reason:
+        return {"id": sub_request.id, "status": 400, "headers": {}, "body": {"detail": reason}}
+
+    parent = request.scope
+    scope = {
+        "type": "http",
+        "asgi": parent.get("asgi", {"version": "3.0"}),
+        "http_version": parent.get("http_version", "1.1"),
+        "method": sub_request.method,
+        "scheme": parent.get("scheme", "http"),
+        "path": path,
+        "raw_path": url.path.encode("latin-1"),
+        "query_string": url.query.encode("latin-1"),
+        "root_path": parent.get("root_path", ""),
+        "headers": [(name, value) for name, value in parent["headers"] if name not in _SKIPPED_REQUEST_HEADERS],
+        "client": parent.get("client"),
+        "server": parent.get("server"),
+    }
+
+    response_complete = asyncio.Event()
+    request_sent = False
+    status = 500
+    headers = {}
+    chunks = []
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await response_complete.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+            for name, value in message.get("headers", []):
+                name = name.decode("latin-1").lower()
+                if name != "content-length":
+                    headers[name] = value.decode("latin-1")
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                response_complete.set()
+
+    try:
+        await request.app(scope, receive, send)
+    except Exception as e:
+        # 予期しない例外は500の応答を送信した後に再送出されるため、このサブリクエストの失敗として返す
+        if not response_complete.is_set():
+            detail = f"サブリクエストの処理に失敗しました: {str(e)}"
+            return {"id": sub_request.id, "status": 500, "headers": {}, "body": {"detail": detail}}
+
+    body = b"".join(chunks)
+    if headers.get("content-type", "").startswith("application/json"):
+        try:
+            content = json.loads(body) if body else None
+        except ValueError:
+            content = body.decode("utf-8", errors="replace")
+    else:
+        content = body.decode("utf-8", errors="replace")
+    return {"id": sub_request.id, "status": status, "headers": headers, "body": content}
+
+@router.post("/batch", response_model=BatchResponse)
+async def batch_api(batch: BatchRequest, request: Request):
+    """複数のGET APIをまとめて実行し、結果を1つのレスポンスで返す
+
+    サブリクエストは並行に実行し、同じ読み取り（予約枠・商品・定期スケジュールなど）は
+    1回の取得を共有する。各サブリクエストのステータスは個別に返す。
+    """
+    token = start_request_cache()
+    try:
+        responses = await asyncio.gather(*[_dispatch(request, sub_request) for sub_request in batch.requests])
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"一括リクエストの処理に失敗しました: {str(e)}")
+    finally:
+        reset_request_cache(token)
+    return {"responses": responses}
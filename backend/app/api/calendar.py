@@ -1,8 +1,10 @@
 # カレンダー関連API
 import logging
-from fastapi import APIRouter, HTTPException, Query
-from app.schemas.calendar import CalendarDataResponse
-from app.services.timeslot_service import get_calendar_data
+from fastapi import APIRouter, HTTPException, Query, Response
+from app.schemas.calendar import CalendarDataResponse, CalendarRangeResponse
+from app.services.calendar_service import get_calendar_data_with_status, get_calendar_range
+from app.utils.firestore_indexes import is_missing_index_error
+from app.utils.snapshots import read_through_snapshot, mark_stale
 
 logger = logging.getLogger(__name__)
 
@@ -10,29 +12,80 @@ router = APIRouter(prefix="/api/calendar", tags=["calendar"])
 
 @router.get("", response_model=CalendarDataResponse)
 async def get_calendar(
+    response: Response,
     year: int = Query(..., description="年"),
     month: int = Query(..., ge=1, le=12, description="月（1-12）"),
 ):
     """カレンダーデータを取得（月次）"""
     try:
-        data = await get_calendar_data(year, month)
+        # 縮退時の結果は欠損を含む可能性があるためスナップショットにしない
+        (data, status), snapshot_at = await read_through_snapshot(
+            f"calendar_{year}-{month:02d}",
+            lambda: get_calendar_data_with_status(year, month),
+            should_save=lambda result: not result[1]["degraded"],
+        )
+        mark_stale(response, snapshot_at)
+        if status["degraded"]:
+            # 監視用: 縮退応答であることをログとヘッダーで通知
+            logger.warning(
+                f"カレンダーを縮退モードで応答しました (year={year}, month={month}, "
+                f"取得失敗日数={len(status['missing_dates'])})"
+            )
+            response.headers["X-Degraded"] = "timeslot-fallback"
         return CalendarDataResponse(
             year=year,
             month=month,
             data=data,
+            degraded=status["degraded"],
+            missing_dates=status["missing_dates"],
+            stale=snapshot_at is not None,
+            snapshot_at=snapshot_at,
         )
+    except HTTPException:
+        raise
     except Exception as e:
         error_msg = str(e)
         logger.error(f"カレンダーデータ取得エラー (year={year}, month={month}): {error_msg}", exc_info=True)
         
         # インデックスエラーの場合は、より分かりやすいメッセージを返す
-        if "index" in error_msg.lower() or "requires an index" in error_msg.lower():
+        if is_missing_index_error(e):
             raise HTTPException(
                 status_code=500,
-                detail=f"カレンダーデータの取得に失敗しました: Firestoreの複合インデックスが必要です。エラーメッセージに表示されたURLからインデックスを作成してください。エラー詳細: {error_msg}"
+                detail=f"カレンダーデータの取得に失敗しました: Firestoreの複合インデックスが必要です。backend/generate_firestore_indexes.py で生成したインデックスをデプロイするか、エラーメッセージに表示されたURLからインデックスを作成してください。エラー詳細: {error_msg}"
             )
         
         raise HTTPException(status_code=500, detail=f"カレンダーデータの取得に失敗しました: {error_msg}")
 
-
-
+@router.get("/range", response_model=CalendarRangeResponse)
+async def get_calendar_range_api(
+    response: Response,
+    year: int = Query(..., description="開始年"),
+    month: int = Query(..., ge=1, le=12, description="開始月（1-12）"),
+    months: int = Query(3, ge=1, le=12, description="取得する月数"),
+    include_slots: bool = Query(False, description="日ごとの予約枠の空き状況を含める"),
+):
+    """カレンダーデータを取得（開始月から複数月分、日ごとの予約枠の空き状況も取得可能）"""
+    try:
+        month_list = await get_calendar_range(year, month, months, include_slots)
+        degraded = any(m["degraded"] for m in month_list)
+        if degraded:
+            # 監視用: 縮退応答であることをログとヘッダーで通知
+            logger.warning(
+                f"カレンダーを縮退モードで応答しました (year={year}, month={month}, months={months}, "
+                f"取得失敗日数={sum(len(m['missing_dates']) for m in month_list)})"
+            )
+            response.headers["X-Degraded"] = "timeslot-fallback"
+        return CalendarRangeResponse(months=month_list, degraded=degraded)
+    except HTTPException:
+        raise
+    except Exception as e:
+        error_msg = str(e)
+        logger.error(f"カレンダーデータ取得エラー (year={year}, month={month}, months={months}): {error_msg}", exc_info=True)
+        
+        if is_missing_index_error(e):
+            raise HTTPException(
+                status_code=500,
+                detail=f"カレンダーデータの取得に失敗しました: Firestoreの複合インデックスが必要です。backend/generate_firestore_indexes.py で生成したインデックスをデプロイするか、エラーメッセージに表示されたURLからインデックスを作成してください。エラー詳細: {error_msg}"
+            )
+        
+        raise HTTPException(status_code=500, detail=f"カレンダーデータの取得に失敗しました: {error_msg}")
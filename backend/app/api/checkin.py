@@ -0,0 +1,55 @@
+# 来店受付（チェックイン）関連API
+import gzip as gzip_module
+import json
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from datetime import date
+from app.schemas.checkin import CheckinSyncRequest
+from app.services.checkin_service import build_checkin_manifest, sync_checkins
+
+# 管理者用API（受付端末から利用）
+admin_router = APIRouter(prefix="/api/admin/checkin", tags=["admin-checkin"])
+
+@admin_router.get("/{visit_date}/manifest")
+async def get_checkin_manifest_api(
+    visit_date: date,
+    request: Request,
+    gzip: bool = Query(False, description="gzip圧縮して出力する"),
+):
+    """来店日の受付用マニフェストを取得（管理者）
+
+    予約番号の昇順に並んだ予約一覧を返す。端末は保持しているマニフェストの version を
+    If-None-Match ヘッダーに指定すると、内容が変わっていない場合は304を受け取る。
+    """
+    try:
+        manifest = await build_checkin_manifest(visit_date)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"受付用マニフェストの作成に失敗しました: {str(e)}")
+
+    etag = f'"{manifest["version"]}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    body = json.dumps(manifest, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    if gzip:
+        body = gzip_module.compress(body)
+        headers["Content-Encoding"] = "gzip"
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@admin_router.post("/{visit_date}/sync")
+async def sync_checkins_api(visit_date: date, sync_request: CheckinSyncRequest):
+    """受付端末で記録した来店（完了）を一括で反映（管理者）"""
+    try:
+        return await sync_checkins(
+            visit_date, [completion.model_dump() for completion in sync_request.completions]
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"受付の同期に失敗しました: {str(e)}")
@@ -0,0 +1,44 @@
+# 保守運用関連API
+from fastapi import APIRouter, HTTPException, Query
+from typing import Optional
+from datetime import date
+from app.services.reconciliation_service import reconcile_counters, backfill_slot_ids
+
+# 管理者用API
+admin_router = APIRouter(prefix="/api/admin/maintenance", tags=["admin-maintenance"])
+
+@admin_router.post("/reconcile-counters")
+async def reconcile_counters_api(
+    start_date: Optional[date] = Query(None, description="来店日（開始）。省略時は全期間・商品を含めてチェック"),
+    end_date: Optional[date] = Query(None, description="来店日（終了）"),
+    partition_days: int = Query(7, ge=1, le=31, description="1区間あたりの日数"),
+    fix: bool = Query(False, description="差分を修正する"),
+):
+    """予約済み数・受注数を予約データから再集計して差分を報告（管理者）"""
+    try:
+        return await reconcile_counters(
+            start_date=start_date,
+            end_date=end_date,
+            partition_days=partition_days,
+            fix=fix,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"カウンターの整合性チェックに失敗しました: {str(e)}")
+
+@admin_router.post("/backfill-slot-ids")
+async def backfill_slot_ids_api(
+    dry_run: bool = Query(False, description="対象件数の確認のみ行い、書き込まない"),
+):
+    """既存の予約に予約枠ID（slot_id）を補完（管理者）"""
+    try:
+        return await backfill_slot_ids(dry_run=dry_run)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"slot_id の補完に失敗しました: {str(e)}")
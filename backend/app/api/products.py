@@ -1,6 +1,6 @@
 # 商品関連API
 from datetime import datetime
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Response
 from typing import List
 from app.schemas.product import (
     ProductCreate, ProductUpdate, ProductResponse, ProductAvailabilityResponse
@@ -12,6 +12,7 @@ from app.services.product_service import (
     update_product as update_product_service,
     get_product_availability,
 )
+from app.utils.snapshots import read_through_snapshot, mark_stale
 
 def _parse_datetime_str(dt_str: str) -> datetime:
     """ISO形式の文字列をdatetimeオブジェクトに変換"""
@@ -37,10 +38,13 @@ def _parse_datetime_str(dt_str: str) -> datetime:
 router = APIRouter(prefix="/api/products", tags=["products"])
 
 @router.get("", response_model=List[ProductResponse])
-async def get_products():
+async def get_products(response: Response):
     """商品一覧を取得"""
     try:
-        products = await get_all_products(include_inactive=False)
+        products, snapshot_at = await read_through_snapshot(
+            "products_active", lambda: get_all_products(include_inactive=False)
+        )
+        mark_stale(response, snapshot_at)
         # 日付文字列をdatetimeオブジェクトに変換
         for product in products:
             if product.get("order_start_date"):
@@ -52,6 +56,8 @@ async def get_products():
             if product.get("updated_at"):
                 product["updated_at"] = _parse_datetime_str(product["updated_at"])
         return products
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"商品一覧の取得に失敗しました: {str(e)}")
 
@@ -128,6 +134,8 @@ async def create_product_api(product: ProductCreate):
         return result
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"商品の登録に失敗しました: {str(e)}")
 
@@ -1,16 +1,22 @@
 # 予約関連API
-from fastapi import APIRouter, HTTPException, Query
-from typing import List, Optional
-from datetime import date
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from typing import List, Literal, Optional
+from datetime import date, datetime
 from app.schemas.reservation import (
-    ReservationCreate, ReservationUpdate, ReservationResponse
+    ReservationCreate, ReservationUpdate, ReservationResponse, ReservationBulkComplete
 )
 from app.services.reservation_service import (
     create_reservation, get_reservation, get_reservation_by_number,
-    get_reservations_by_email, get_all_reservations, update_reservation,
-    cancel_reservation, search_reservations, complete_reservation,
-    get_reservation_with_products
+    get_reservations_by_email, get_all_reservations, BookingInProgressError, DuplicateBookingError
 )
+from app.services.reservation_update_service import update_reservation, cancel_reservation
+from app.services.reservation_query_service import search_reservations, get_reservation_with_products
+from app.services.reservation_complete_service import complete_reservation, complete_reservations
+from app.services.import_service import parse_import_rows, import_reservations
+from app.services.export_service import iter_reservations, iter_csv, iter_ndjson, iter_gzip
+from app.services.product_service import get_product_catalog
+from app.services.search_service import search_reservation_index, SearchIndexNotReadyError
 
 router = APIRouter(prefix="/api/reservations", tags=["reservations"])
 
@@ -28,8 +34,12 @@ async def create_reservation_api(reservation: ReservationCreate):
         }
         result = await create_reservation(reservation_data)
         return result
+    except (BookingInProgressError, DuplicateBookingError) as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"予約の作成に失敗しました: {str(e)}")
 
@@ -86,6 +96,8 @@ async def get_reservations_api(
             # 全予約一覧（管理者用）
             reservations = await get_all_reservations(limit)
         return reservations
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"予約一覧の取得に失敗しました: {str(e)}")
 
@@ -111,6 +123,8 @@ async def update_reservation_api(
         if not result:
             raise HTTPException(status_code=404, detail="予約が見つかりません")
         return result
+    except DuplicateBookingError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except HTTPException:
@@ -147,3 +161,118 @@ async def complete_reservation_api(reservation_id: str):
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"予約の完了処理に失敗しました: {str(e)}")
+
+# 管理者用API
+admin_router = APIRouter(prefix="/api/admin/reservations", tags=["admin-reservations"])
+
+@admin_router.get("/export")
+async def export_reservations_api(
+    format: Literal["csv", "ndjson"] = Query("csv", description="出力形式"),
+    start_date: Optional[date] = Query(None, description="来店日（開始）"),
+    end_date: Optional[date] = Query(None, description="来店日（終了）"),
+    status: Optional[str] = Query(None, description="予約ステータス"),
+    gzip: bool = Query(False, description="gzip圧縮して出力する"),
+):
+    """予約一覧をCSV/NDJSONでストリーミング出力（管理者）"""
+    if start_date and end_date and end_date < start_date:
+        raise HTTPException(status_code=400, detail="end_date は start_date 以降の日付を指定してください")
+    
+    try:
+        # 商品名はキャッシュ済みのカタログから結合する
+        catalog = await get_product_catalog()
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"商品情報の取得に失敗しました: {str(e)}")
+    
+    reservations = iter_reservations(start_date=start_date, end_date=end_date, status=status)
+    if format == "csv":
+        body = iter_csv(reservations, catalog)
+        media_type = "text/csv"
+    else:
+        body = iter_ndjson(reservations, catalog)
+        media_type = "application/x-ndjson"
+    
+    filename = f"reservations_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{format}"
+    if gzip:
+        body = iter_gzip(body)
+        media_type = "application/gzip"
+        filename += ".gz"
+    
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+@admin_router.get("/search", response_model=List[ReservationResponse])
+async def search_reservations_admin(
+    user_name: Optional[str] = Query(None, description="予約者名（部分一致、空白・全角半角は区別しない）"),
+    user_phone: Optional[str] = Query(None, description="電話番号（部分一致、3桁以上）"),
+    user_email: Optional[str] = Query(None, description="メールアドレス（部分一致、3文字以上）"),
+    reservation_number: Optional[str] = Query(None, description="予約番号（部分一致、3文字以上）"),
+    visit_date: Optional[date] = Query(None, description="来店日"),
+    status: Optional[str] = Query(None, description="予約ステータス"),
+    limit: int = Query(100, ge=1, le=1000, description="取得件数上限"),
+):
+    """予約を複数の条件で検索（管理者）
+    
+    プロセス内の検索インデックスを使用するため、条件の組み合わせごとの複合インデックスは不要。
+    """
+    try:
+        return search_reservation_index(
+            user_name=user_name,
+            user_phone=user_phone,
+            user_email=user_email,
+            reservation_number=reservation_number,
+            visit_date=visit_date,
+            status=status,
+            limit=limit,
+        )
+    except SearchIndexNotReadyError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"予約の検索に失敗しました: {str(e)}")
+
+@admin_router.post("/complete")
+async def complete_reservations_api(request: ReservationBulkComplete):
+    """複数の予約をまとめて完了状態に更新（管理者）
+    
+    予約ごとの成否を results に指定順で返す。完了できない予約があっても他の予約は完了する。
+    """
+    try:
+        return await complete_reservations(
+            reservation_ids=request.reservation_ids,
+            reservation_numbers=request.reservation_numbers,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"予約の一括完了処理に失敗しました: {str(e)}")
+
+@admin_router.post("/import")
+async def import_reservations_api(
+    request: Request,
+    format: Literal["csv", "ndjson"] = Query("ndjson", description="入力形式"),
+    dry_run: bool = Query(False, description="検証のみ行い、書き込まない"),
+):
+    """予約を一括インポート（管理者）
+    
+    リクエストボディにNDJSONまたはCSVをそのまま送信する。
+    CSVの列: user_email, user_name, user_phone, visit_date, visit_time, products（例: "商品ID:2;商品ID:1"）, reservation_number（任意）
+    """
+    try:
+        rows = parse_import_rows(await request.body(), format)
+        return await import_reservations(rows, dry_run=dry_run)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"予約のインポートに失敗しました: {str(e)}")
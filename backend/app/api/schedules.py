@@ -0,0 +1,61 @@
+# 定期スケジュール関連API
+from fastapi import APIRouter, HTTPException
+from typing import List
+from app.schemas.schedule import (
+    ScheduleRuleCreate, ScheduleRuleUpdate, ScheduleRuleResponse
+)
+from app.services.schedule_service import (
+    create_schedule_rule, get_schedule_rules, update_schedule_rule, delete_schedule_rule
+)
+
+# 管理者用API
+admin_router = APIRouter(prefix="/api/admin/schedules", tags=["admin-schedules"])
+
+@admin_router.get("", response_model=List[ScheduleRuleResponse])
+async def get_schedule_rules_admin():
+    """定期スケジュール一覧を取得（管理者）"""
+    try:
+        return await get_schedule_rules(include_inactive=True)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"定期スケジュールの取得に失敗しました: {str(e)}")
+
+@admin_router.post("", response_model=ScheduleRuleResponse)
+async def create_schedule_rule_admin(rule: ScheduleRuleCreate):
+    """定期スケジュールを作成（管理者）"""
+    try:
+        return await create_schedule_rule(rule.model_dump())
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"定期スケジュールの作成に失敗しました: {str(e)}")
+
+@admin_router.put("/{rule_id}", response_model=ScheduleRuleResponse)
+async def update_schedule_rule_admin(rule_id: str, rule_update: ScheduleRuleUpdate):
+    """定期スケジュールを更新（管理者）"""
+    try:
+        update_data = rule_update.model_dump(exclude_none=True)
+        result = await update_schedule_rule(rule_id, update_data)
+        if not result:
+            raise HTTPException(status_code=404, detail="定期スケジュールが見つかりません")
+        return result
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"定期スケジュールの更新に失敗しました: {str(e)}")
+
+@admin_router.delete("/{rule_id}")
+async def delete_schedule_rule_admin(rule_id: str):
+    """定期スケジュールを削除（管理者）"""
+    try:
+        success = await delete_schedule_rule(rule_id)
+        if not success:
+            raise HTTPException(status_code=404, detail="定期スケジュールが見つかりません")
+        return {"message": "定期スケジュールを削除しました"}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"定期スケジュールの削除に失敗しました: {str(e)}")
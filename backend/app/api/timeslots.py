@@ -1,25 +1,37 @@
 # 予約枠関連API
-from fastapi import APIRouter, HTTPException, Query, Body
-from typing import List
+import json
+from fastapi import APIRouter, HTTPException, Query, Body, Response
+from fastapi.responses import StreamingResponse
+from typing import List, Optional
 from datetime import date
 from app.schemas.timeslot import (
-    TimeSlotCreate, TimeSlotUpdate, TimeSlotResponse, AvailabilityResponse
+    TimeSlotCreate, TimeSlotBulkCreate, TimeSlotBulkResult,
+    TimeSlotUpdate, TimeSlotResponse, AvailabilityResponse, SlotReservationsResponse
 )
 from app.services.timeslot_service import (
     create_timeslot, get_timeslot, get_timeslots_by_date,
-    update_timeslot, delete_timeslot, generate_slot_id, get_timeslot_stats
+    update_timeslot, delete_timeslot, generate_slot_id, get_timeslot_stats, slot_availability
 )
+from app.services.timeslot_bulk_service import bulk_create_timeslots
+from app.services.reservation_query_service import get_reservations_by_slot
+from app.utils.snapshots import read_through_snapshot, mark_stale
 
 router = APIRouter(prefix="/api/timeslots", tags=["timeslots"])
 
 @router.get("", response_model=List[TimeSlotResponse])
 async def get_timeslots(
+    response: Response,
     date_param: date = Query(..., alias="date", description="日付"),
 ):
     """指定日の予約可能枠を取得"""
     try:
-        timeslots = await get_timeslots_by_date(date_param)
+        timeslots, snapshot_at = await read_through_snapshot(
+            f"timeslots_{date_param.isoformat()}", lambda: get_timeslots_by_date(date_param)
+        )
+        mark_stale(response, snapshot_at)
         return timeslots
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"予約可能枠の取得に失敗しました: {str(e)}")
 
@@ -32,25 +44,9 @@ async def check_availability(
     try:
         slot_id = generate_slot_id(date_param, time)
         timeslot = await get_timeslot(slot_id)
-        
-        if not timeslot:
-            return AvailabilityResponse(
-                available=False,
-                available_count=0,
-                capacity=0,
-                reserved_count=0,
-            )
-        
-        capacity = timeslot.get("capacity", 0)
-        reserved = timeslot.get("reserved_count", 0)
-        available_count = max(0, capacity - reserved)
-        
-        return AvailabilityResponse(
-            available=timeslot.get("is_available", False) and available_count > 0,
-            available_count=available_count,
-            capacity=capacity,
-            reserved_count=reserved,
-        )
+        return AvailabilityResponse(**slot_availability(timeslot))
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"空き状況の確認に失敗しました: {str(e)}")
 
@@ -67,9 +63,53 @@ async def create_timeslot_admin(timeslot: TimeSlotCreate):
             timeslot.capacity,
         )
         return result
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"予約枠の作成に失敗しました: {str(e)}")
 
+@admin_router.post("/bulk", response_model=TimeSlotBulkResult)
+async def bulk_create_timeslots_admin(
+    request: TimeSlotBulkCreate,
+    stream: bool = Query(False, description="進捗をNDJSONでストリーミングする"),
+):
+    """予約枠を期間指定で一括作成（管理者）"""
+    events = bulk_create_timeslots(
+        request.start_date,
+        request.end_date,
+        request.times,
+        request.capacity,
+        exclude_dates=request.exclude_dates,
+        overwrite=request.overwrite,
+    )
+    
+    if stream:
+        async def progress_lines():
+            # 200応答のヘッダー送信後は例外を送出できないため、エラーは最終行として出力する
+            try:
+                async for event in events:
+                    yield json.dumps(event, ensure_ascii=False) + "\n"
+            except HTTPException as e:
+                yield json.dumps({"event": "error", "status_code": e.status_code, "error": e.detail}, ensure_ascii=False) + "\n"
+            except Exception as e:
+                yield json.dumps({
+                    "event": "error",
+                    "status_code": 500,
+                    "error": f"予約枠の一括作成に失敗しました: {str(e)}",
+                }, ensure_ascii=False) + "\n"
+        
+        return StreamingResponse(progress_lines(), media_type="application/x-ndjson")
+    
+    try:
+        result = None
+        async for event in events:
+            result = event
+        return result
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"予約枠の一括作成に失敗しました: {str(e)}")
+
 @admin_router.put("/{slot_id}", response_model=TimeSlotResponse)
 async def update_timeslot_admin(
     slot_id: str,
@@ -105,12 +145,30 @@ async def delete_timeslot_admin(slot_id: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"予約枠の削除に失敗しました: {str(e)}")
 
+@admin_router.get("/{slot_id}/reservations", response_model=SlotReservationsResponse)
+async def get_slot_reservations_admin(
+    slot_id: str,
+    limit: int = Query(50, ge=1, le=200, description="1ページあたりの件数"),
+    cursor: Optional[str] = Query(None, description="前のページの next_cursor"),
+):
+    """予約枠の予約者リストを取得（管理者）"""
+    try:
+        return await get_reservations_by_slot(slot_id, limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"予約者リストの取得に失敗しました: {str(e)}")
+
 @admin_router.get("/stats")
 async def get_timeslot_stats_api():
     """予約状況統計を取得（管理者）"""
     try:
         stats = await get_timeslot_stats()
         return stats
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"統計データの取得に失敗しました: {str(e)}")
 
@@ -1,11 +1,21 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+import asyncio
 import os
 import logging
 from dotenv import load_dotenv
 
 # APIルーターをインポート
-from app.api import calendar, timeslots, reservations, products
+from app.api import calendar, timeslots, reservations, products, schedules, maintenance, checkin, availability, batch
+from app.utils.firestore_indexes import check_query_indexes, get_index_check_results
+from app.utils.metrics import get_metrics
+from app.utils.coalesce import get_coalescing_stats
+from app.utils.storage import set_request_deadline, reset_request_deadline, circuit_breaker
+from app.utils.rate_limit import RateLimitMiddleware
+from app.utils.concurrency import set_request_lane, reset_request_lane, lane_for_request, lane_limiter
+from app.services.search_service import (
+    SEARCH_INDEX_ENABLED, start_search_index, stop_search_index, reservation_index
+)
 
 load_dotenv()
 
@@ -21,6 +31,9 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# レート制限（ルート処理・Firestore呼び出しの前に判定。429応答にもCORSヘッダーが付くようCORSより先に登録）
+app.add_middleware(RateLimitMiddleware)
+
 # CORS設定
 origins = os.getenv("CORS_ORIGINS", "http://localhost:3000").split(",")
 app.add_middleware(
@@ -31,13 +44,73 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# リクエストの処理期限（秒）
+# クライアントは X-Request-Timeout ヘッダーで期限を指定でき、Firestoreの再試行はこの期限内でのみ行う
+# 管理者向けAPI（一括作成・インポートなど長時間の処理を含む）はヘッダー指定時のみ期限を設ける
+REQUEST_DEADLINE = float(os.getenv("REQUEST_DEADLINE_SECONDS", "15"))
+MAX_REQUEST_DEADLINE = float(os.getenv("MAX_REQUEST_DEADLINE_SECONDS", "60"))
+
+@app.middleware("http")
+async def request_context_middleware(request: Request, call_next):
+    """リクエストごとの処理期限と、Firestore呼び出しの優先レーンを設定"""
+    timeout = None if request.url.path.startswith("/api/admin/") else REQUEST_DEADLINE
+    header_value = request.headers.get("x-request-timeout")
+    if header_value:
+        try:
+            timeout = max(0.1, min(float(header_value), MAX_REQUEST_DEADLINE))
+        except ValueError:
+            pass
+
+    deadline_token = set_request_deadline(timeout)
+    lane_token = set_request_lane(lane_for_request(request.method, request.url.path))
+    try:
+        return await call_next(request)
+    finally:
+        reset_request_lane(lane_token)
+        reset_request_deadline(deadline_token)
+
 # APIルーターを登録
 app.include_router(calendar.router)
 app.include_router(timeslots.router)
 app.include_router(timeslots.admin_router)
 app.include_router(reservations.router)
+app.include_router(reservations.admin_router)
 app.include_router(products.router)
+app.include_router(availability.router)
+app.include_router(batch.router)
 app.include_router(products.admin_router)
+app.include_router(schedules.admin_router)
+app.include_router(maintenance.admin_router)
+app.include_router(checkin.admin_router)
+
+@app.on_event("startup")
+async def start_index_self_check():
+    """起動時にFirestoreの複合インデックスを検証（FIRESTORE_INDEX_CHECK=0 で無効化）"""
+    if os.getenv("FIRESTORE_INDEX_CHECK", "1") == "0":
+        return
+
+    async def run_check():
+        try:
+            await check_query_indexes()
+        except Exception as e:
+            logging.getLogger(__name__).warning(f"インデックス検証を実行できませんでした: {e}")
+
+    # 起動をブロックしないようバックグラウンドで実行
+    app.state.index_check_task = asyncio.create_task(run_check())
+
+@app.on_event("startup")
+def start_reservation_search_index():
+    """予約の検索インデックスを構築し、変更通知の購読を開始（SEARCH_INDEX_ENABLED=1 の場合）"""
+    if not SEARCH_INDEX_ENABLED:
+        return
+    try:
+        start_search_index()
+    except Exception as e:
+        logging.getLogger(__name__).warning(f"検索インデックスを開始できませんでした: {e}")
+
+@app.on_event("shutdown")
+def stop_reservation_search_index():
+    stop_search_index()
 
 @app.get("/")
 def read_root():
@@ -47,3 +120,33 @@ def read_root():
 def health_check():
     return {"status": "ok"}
 
+@app.get("/api/health/indexes")
+def index_health_check():
+    results = get_index_check_results()
+    missing = [r["name"] for r in results if r.get("missing_index")]
+    return {
+        "status": "ok" if not missing else "missing_indexes",
+        "checked": len(results),
+        "missing": missing,
+    }
+
+@app.get("/api/health/storage")
+def storage_health_check():
+    """Firestore呼び出しのサーキットブレーカーの状態"""
+    state = circuit_breaker.state
+    return {
+        "status": "ok" if state == "closed" else "degraded",
+        "circuit": state,
+        "lanes": lane_limiter.stats(),
+        "search_index": reservation_index.stats(),
+    }
+
+@app.get("/api/metrics")
+def metrics():
+    """Firestore呼び出しの回数・再試行・中断などの集計値"""
+    return get_metrics()
+
+@app.get("/api/metrics/coalescing")
+def coalescing_metrics():
+    """同一の読み取りの合流状況（読み取りごとの合流率）"""
+    return get_coalescing_stats()
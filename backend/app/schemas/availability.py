@@ -0,0 +1,38 @@
+# 空き状況の一括確認のPydanticスキーマ
+from pydantic import BaseModel, Field, model_validator
+from typing import List
+from datetime import date
+from app.schemas.timeslot import AvailabilityResponse
+from app.schemas.product import ProductAvailabilityResponse
+
+# 予約枠の指定（日付と時間）
+class SlotKey(BaseModel):
+    date: date
+    time: str = Field(pattern=r"^\d{2}:\d{2}$", description="時間形式: HH:MM")
+
+# 空き状況一括確認リクエスト
+class AvailabilityBatchRequest(BaseModel):
+    slots: List[SlotKey] = Field(default_factory=list, max_length=100)
+    product_ids: List[str] = Field(default_factory=list, max_length=100)
+
+    @model_validator(mode="after")
+    def validate_not_empty(self):
+        if not self.slots and not self.product_ids:
+            raise ValueError("slots または product_ids を指定してください")
+        return self
+
+# 予約枠ごとの空き状況
+class SlotAvailability(AvailabilityResponse):
+    slot_id: str
+    date: date
+    time: str
+
+# 商品ごとの購入可能数
+class ProductAvailabilityItem(ProductAvailabilityResponse):
+    product_id: str
+    found: bool  # 商品が存在しない場合はFalse
+
+# 空き状況一括確認レスポンス（リクエストと同じ順）
+class AvailabilityBatchResponse(BaseModel):
+    slots: List[SlotAvailability]
+    products: List[ProductAvailabilityItem]
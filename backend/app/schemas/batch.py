@@ -0,0 +1,24 @@
+# 一括リクエスト（/api/batch）のPydanticスキーマ
+from pydantic import BaseModel, Field
+from typing import Any, Dict, List, Literal, Optional
+
+# サブリクエスト（既存のGET APIのパスとクエリ文字列）
+class BatchSubRequest(BaseModel):
+    id: Optional[str] = None  # レスポンスとの対応付け用（省略時はリクエストの順番で対応付ける）
+    method: Literal["GET"] = "GET"
+    path: str = Field(pattern=r"^/api/", description="例: /api/timeslots?date=2024-12-01")
+
+# 一括リクエスト
+class BatchRequest(BaseModel):
+    requests: List[BatchSubRequest] = Field(min_length=1, max_length=10)
+
+# サブリクエストの結果
+class BatchSubResponse(BaseModel):
+    id: Optional[str] = None
+    status: int
+    headers: Dict[str, str]
+    body: Any
+
+# 一括リクエストのレスポンス（リクエストと同じ順）
+class BatchResponse(BaseModel):
+    responses: List[BatchSubResponse]
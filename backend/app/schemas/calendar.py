@@ -1,11 +1,37 @@
 # カレンダー関連のPydanticスキーマ
-from pydantic import BaseModel
-from typing import Dict
+from pydantic import BaseModel, Field
+from typing import Dict, List, Optional
+from datetime import date, datetime
 
 # カレンダーデータレスポンス
 class CalendarDataResponse(BaseModel):
     year: int
     month: int
     data: Dict[int, dict]  # 日付をキー、予約状況を値とする辞書
+    degraded: bool = False  # 日別フォールバックで取得した場合はTrue
+    missing_dates: List[date] = Field(default_factory=list)  # フォールバック時に取得できなかった日付
+    stale: bool = False  # Firestore障害時にスナップショットで応答した場合はTrue
+    snapshot_at: Optional[datetime] = None  # スナップショットの保存日時
 
+# 日別の予約枠の空き状況
+class CalendarDaySlot(BaseModel):
+    slot_id: str
+    time: str
+    available: bool
+    available_count: int
+    capacity: int
+    reserved_count: int
 
+# 複数月カレンダーの1か月分
+class CalendarMonthData(BaseModel):
+    year: int
+    month: int
+    data: Dict[int, dict]  # 日付をキー、予約状況を値とする辞書
+    slots: Optional[Dict[int, List[CalendarDaySlot]]] = None  # include_slots=true の場合のみ（日付をキー）
+    degraded: bool = False
+    missing_dates: List[date] = Field(default_factory=list)
+
+# 複数月カレンダーデータレスポンス
+class CalendarRangeResponse(BaseModel):
+    months: List[CalendarMonthData]
+    degraded: bool = False  # いずれかの月を日別フォールバックで取得した場合はTrue
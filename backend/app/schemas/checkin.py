@@ -0,0 +1,13 @@
+# チェックイン関連のPydanticスキーマ
+from pydantic import BaseModel, Field
+from typing import List, Optional
+from datetime import datetime
+
+# 受付端末で記録した来店（完了）1件
+class CheckinCompletion(BaseModel):
+    reservation_id: str
+    checked_in_at: Optional[datetime] = None  # 端末で受付した日時（省略時は同期時刻）
+
+# 受付端末からの一括同期リクエスト
+class CheckinSyncRequest(BaseModel):
+    completions: List[CheckinCompletion] = Field(min_length=1, max_length=500)
@@ -1,5 +1,5 @@
 # 予約関連のPydanticスキーマ
-from pydantic import BaseModel, EmailStr, Field
+from pydantic import BaseModel, EmailStr, Field, model_validator
 from typing import List, Optional
 from datetime import datetime, date
 from enum import Enum
@@ -16,6 +16,12 @@ class ProductItem(BaseModel):
     product_id: str
     quantity: int = Field(gt=0, description="購入数量")
 
+# 予約内の商品明細（予約時点の商品名・価格・小計を含む）
+class ReservationProductItem(ProductItem):
+    name: Optional[str] = None
+    price: Optional[float] = None
+    line_total: Optional[float] = None
+
 # 予約作成リクエスト
 class ReservationCreate(BaseModel):
     user_email: EmailStr
@@ -31,6 +37,20 @@ class ReservationUpdate(BaseModel):
     visit_time: Optional[str] = Field(None, pattern=r"^\d{2}:\d{2}$")
     products: Optional[List[ProductItem]] = None
 
+# 予約一括完了リクエスト（予約IDと予約番号は混在可）
+class ReservationBulkComplete(BaseModel):
+    reservation_ids: List[str] = Field(default_factory=list)
+    reservation_numbers: List[str] = Field(default_factory=list)
+
+    @model_validator(mode="after")
+    def validate_count(self):
+        total = len(self.reservation_ids) + len(self.reservation_numbers)
+        if total == 0:
+            raise ValueError("reservation_ids または reservation_numbers を指定してください")
+        if total > 500:
+            raise ValueError("一度に完了できる予約は500件までです")
+        return self
+
 # 商品詳細情報（予約確認用）
 class ProductDetail(BaseModel):
     product_id: str
@@ -48,8 +68,9 @@ class ReservationResponse(BaseModel):
     user_phone: str
     visit_date: date
     visit_time: str
+    slot_id: Optional[str] = None
     status: ReservationStatus
-    products: List[ProductItem]
+    products: List[ReservationProductItem]
     created_at: datetime
     updated_at: datetime
     product_details: Optional[List[ProductDetail]] = None
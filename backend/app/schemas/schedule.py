@@ -0,0 +1,62 @@
+# 定期スケジュール関連のPydanticスキーマ
+from pydantic import BaseModel, Field, model_validator
+from typing import List, Optional
+from datetime import date, datetime
+
+# 定期スケジュール作成リクエスト
+class ScheduleRuleCreate(BaseModel):
+    name: str = Field("", max_length=100)
+    start_date: date
+    end_date: Optional[date] = None
+    weekdays: List[int] = Field(min_length=1, description="適用する曜日（0=月曜〜6=日曜）")
+    start_time: str = Field(pattern=r"^\d{2}:\d{2}$", description="受付開始時刻: HH:MM")
+    end_time: str = Field(pattern=r"^\d{2}:\d{2}$", description="受付終了時刻: HH:MM（この時刻の枠は含まない）")
+    interval_minutes: int = Field(gt=0, le=1440, description="予約枠の間隔（分）")
+    capacity: int = Field(gt=0, description="定員数")
+    exclude_dates: List[date] = Field(default_factory=list, description="例外日（予約枠を生成しない日）")
+    is_active: bool = True
+
+    @model_validator(mode="after")
+    def validate_rule(self):
+        if any(d < 0 or d > 6 for d in self.weekdays):
+            raise ValueError("weekdays は 0（月曜）〜6（日曜）で指定してください")
+        if self.end_time <= self.start_time:
+            raise ValueError("end_time は start_time より後の時刻を指定してください")
+        if self.end_date and self.end_date < self.start_date:
+            raise ValueError("end_date は start_date 以降の日付を指定してください")
+        return self
+
+# 定期スケジュール更新リクエスト
+class ScheduleRuleUpdate(BaseModel):
+    name: Optional[str] = Field(None, max_length=100)
+    end_date: Optional[date] = None
+    weekdays: Optional[List[int]] = Field(None, min_length=1)
+    capacity: Optional[int] = Field(None, gt=0)
+    exclude_dates: Optional[List[date]] = None
+    is_active: Optional[bool] = None
+
+    @model_validator(mode="after")
+    def validate_rule(self):
+        # end_date と start_date の前後関係は、保存済みのルールとマージした内容で update_schedule_rule が確認する
+        if self.weekdays is not None and any(d < 0 or d > 6 for d in self.weekdays):
+            raise ValueError("weekdays は 0（月曜）〜6（日曜）で指定してください")
+        return self
+
+# 定期スケジュールレスポンス
+class ScheduleRuleResponse(BaseModel):
+    rule_id: str
+    name: str
+    start_date: date
+    end_date: Optional[date]
+    weekdays: List[int]
+    start_time: str
+    end_time: str
+    interval_minutes: int
+    capacity: int
+    exclude_dates: List[date]
+    is_active: bool
+    created_at: datetime
+    updated_at: datetime
+
+    class Config:
+        from_attributes = True
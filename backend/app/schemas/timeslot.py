@@ -1,7 +1,8 @@
 # 予約枠関連のPydanticスキーマ
-from pydantic import BaseModel, Field
-from typing import Optional
+from pydantic import BaseModel, Field, model_validator
+from typing import List, Optional
 from datetime import date, datetime
+from app.schemas.reservation import ReservationResponse
 
 # 予約枠作成リクエスト
 class TimeSlotCreate(BaseModel):
@@ -9,6 +10,35 @@ class TimeSlotCreate(BaseModel):
     time: str = Field(pattern=r"^\d{2}:\d{2}$", description="時間形式: HH:MM")
     capacity: int = Field(gt=0, description="定員数")
 
+# 予約枠一括作成リクエスト
+class TimeSlotBulkCreate(BaseModel):
+    start_date: date
+    end_date: date
+    times: List[str] = Field(min_length=1, max_length=96, description="毎日の開始時刻（HH:MM形式）")
+    capacity: int = Field(gt=0, description="定員数")
+    exclude_dates: List[date] = Field(default_factory=list, description="作成しない日付")
+    overwrite: bool = Field(False, description="既存の予約枠の定員・公開状態を上書きする")
+
+    @model_validator(mode="after")
+    def validate_range(self):
+        if self.end_date < self.start_date:
+            raise ValueError("end_date は start_date 以降の日付を指定してください")
+        if (self.end_date - self.start_date).days >= 366:
+            raise ValueError("一括作成できる期間は366日までです")
+        for time in self.times:
+            if not (len(time) == 5 and time[2] == ":" and time[:2].isdigit() and time[3:].isdigit()):
+                raise ValueError(f"時間形式が正しくありません: {time}（HH:MM形式）")
+        return self
+
+# 予約枠一括作成結果
+class TimeSlotBulkResult(BaseModel):
+    total: int
+    processed: int
+    batches: int
+    created: int
+    updated: int
+    skipped: int
+
 # 予約枠更新リクエスト
 class TimeSlotUpdate(BaseModel):
     capacity: Optional[int] = Field(None, gt=0)
@@ -22,6 +52,7 @@ class TimeSlotResponse(BaseModel):
     capacity: int
     reserved_count: int
     is_available: bool
+    is_virtual: bool = False  # 定期スケジュールから生成され、まだ保存されていない予約枠
     created_at: datetime
     updated_at: datetime
 
@@ -35,4 +66,8 @@ class AvailabilityResponse(BaseModel):
     capacity: int
     reserved_count: int
 
-
+# 予約枠の予約者一覧レスポンス
+class SlotReservationsResponse(BaseModel):
+    slot_id: str
+    reservations: List[ReservationResponse]
+    next_cursor: Optional[str] = None  # 次のページがある場合のカーソル
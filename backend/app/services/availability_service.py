@@ -0,0 +1,62 @@
+# 予約枠・商品の空き状況の一括確認サービス
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+from app.utils.firebase import get_firestore_db
+from app.utils.storage import run_storage
+from app.services.timeslot_service import generate_slot_id, slot_availability
+from app.services.product_service import get_cached_product_catalog, missing_products, product_availability
+
+def _get_all_documents(refs: list) -> Dict[str, dict]:
+    """予約枠・商品をまとめて1回の get_all で取得（同期処理、キー: ドキュメントのパス）"""
+    db = get_firestore_db()
+    return {doc.reference.path: doc.to_dict() for doc in db.get_all(refs) if doc.exists}
+
+async def get_batch_availability(slots: List[Tuple[date, str]], product_ids: List[str]) -> dict:
+    """複数の予約枠と商品の空き状況をまとめて取得（リクエストと同じ順で返す）
+
+    商品はキャッシュ済みの商品カタログを優先し、存在しないことが分かっている商品は読み取らない。
+    残りの予約枠・商品は1回の get_all で取得し、保存されていない予約枠は
+    キャッシュ済みの定期スケジュールから仮想予約枠として求める。
+    """
+    from app.services.schedule_service import get_schedule_rules, find_virtual_timeslot
+
+    db = get_firestore_db()
+    slot_ids = [generate_slot_id(date_obj, time) for date_obj, time in slots]
+    slot_refs = {slot_id: db.collection("timeslots").document(slot_id) for slot_id in dict.fromkeys(slot_ids)}
+
+    catalog = get_cached_product_catalog() or {}
+    products: Dict[str, Optional[dict]] = {}
+    product_refs = {}
+    if any(product_id not in catalog for product_id in product_ids):
+        await missing_products.refresh()
+    for product_id in dict.fromkeys(product_ids):
+        if product_id in catalog:
+            products[product_id] = catalog[product_id]
+        elif missing_products.is_missing(product_id):
+            products[product_id] = None
+        else:
+            product_refs[product_id] = db.collection("products").document(product_id)
+
+    refs = list(slot_refs.values()) + list(product_refs.values())
+    documents = await run_storage("availability.get_all", _get_all_documents, refs) if refs else {}
+    for product_id, ref in product_refs.items():
+        products[product_id] = documents.get(ref.path)
+        if products[product_id] is None:
+            missing_products.mark_missing(product_id)
+
+    rules = None
+    slot_results = []
+    for (date_obj, time), slot_id in zip(slots, slot_ids):
+        timeslot = documents.get(slot_refs[slot_id].path)
+        if timeslot is None:
+            if rules is None:
+                rules = await get_schedule_rules()
+            timeslot = find_virtual_timeslot(rules, slot_id)
+        slot_results.append(dict(slot_availability(timeslot), slot_id=slot_id, date=date_obj, time=time))
+
+    product_results = []
+    for product_id in product_ids:
+        product = products[product_id]
+        product_results.append(dict(product_availability(product), product_id=product_id, found=product is not None))
+
+    return {"slots": slot_results, "products": product_results}
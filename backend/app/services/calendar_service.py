@@ -0,0 +1,171 @@
+# カレンダー集計サービス（月次・複数月の予約状況）
+import asyncio
+import logging
+import os
+from datetime import date
+from typing import Dict, Iterable, List, Tuple
+from app.utils.cache import TTLCache
+from app.utils.coalesce import coalesced
+from app.utils.request_cache import request_cached
+
+logger = logging.getLogger(__name__)
+
+# 月次カレンダー集計のキャッシュ（キー: (年, 月)）
+CALENDAR_CACHE_TTL = float(os.getenv("CALENDAR_CACHE_TTL", "10"))
+_calendar_cache = TTLCache(ttl=CALENDAR_CACHE_TTL)
+
+def invalidate_calendar_cache(dates: Iterable[date]) -> None:
+    """指定日を含む月のカレンダー集計キャッシュを破棄"""
+    months = {(d.year, d.month) for d in dates if d is not None}
+    for month_key in months:
+        _calendar_cache.invalidate(month_key)
+
+def clear_calendar_cache() -> None:
+    """カレンダー集計キャッシュをすべて破棄"""
+    _calendar_cache.clear()
+
+def _summarize_day(timeslots: List[dict]) -> dict:
+    """1日分の予約枠から予約状況を集計"""
+    if not timeslots:
+        return {"status": "unavailable", "availableSlots": 0}
+    
+    # 予約可能枠数を計算
+    available_slots = 0
+    for slot in timeslots:
+        if slot.get("is_available", False):
+            capacity = slot.get("capacity", 0)
+            reserved = slot.get("reserved_count", 0)
+            available_slots += max(0, capacity - reserved)
+    
+    # ステータスを決定
+    if available_slots == 0:
+        status = "full"
+    elif available_slots <= 2:
+        status = "limited"
+    else:
+        status = "available"
+    
+    return {
+        "status": status,
+        "availableSlots": available_slots,
+    }
+
+def _build_calendar_month(year: int, month: int, timeslots_by_date: Dict[str, List[dict]], status: dict) -> dict:
+    """月次カレンダーの集計と日別の予約枠の空き状況を作成（カレンダー集計キャッシュの値）"""
+    from calendar import monthrange
+    from app.services.timeslot_service import slot_availability
+    
+    calendar_data = {}
+    day_slots = {}
+    for day in range(1, monthrange(year, month)[1] + 1):
+        timeslots = timeslots_by_date.get(date(year, month, day).isoformat(), [])
+        calendar_data[day] = _summarize_day(timeslots)
+        day_slots[day] = [
+            {"slot_id": slot.get("slot_id"), "time": slot.get("time"), **slot_availability(slot)}
+            for slot in timeslots
+        ]
+    return {"data": calendar_data, "status": status, "slots": day_slots}
+
+def _month_index(month_key: Tuple[int, int]) -> int:
+    """(年, 月) を連続した月番号に変換"""
+    return month_key[0] * 12 + month_key[1] - 1
+
+async def _load_calendar_months(months: List[Tuple[int, int]]) -> Dict[Tuple[int, int], dict]:
+    """連続した複数月のカレンダー集計を1回の範囲クエリで作成し、キャッシュに登録"""
+    from calendar import monthrange
+    from app.services.timeslot_service import get_timeslots_by_date_range_with_status
+    
+    first_year, first_month = months[0]
+    last_year, last_month = months[-1]
+    start_date = date(first_year, first_month, 1)
+    end_date = date(last_year, last_month, monthrange(last_year, last_month)[1])
+    try:
+        all_timeslots, range_status = await get_timeslots_by_date_range_with_status(start_date, end_date)
+    except Exception as e:
+        logger.error(f"get_calendar_dataエラー: {str(e)}")
+        raise
+    
+    # 日付ごとにグループ化
+    timeslots_by_date: Dict[str, List[dict]] = {}
+    for slot in all_timeslots:
+        slot_date = slot.get("date")
+        if not slot_date:
+            continue
+        date_key = slot_date.isoformat() if isinstance(slot_date, date) else slot_date
+        timeslots_by_date.setdefault(date_key, []).append(slot)
+    
+    entries = {}
+    for year, month in months:
+        status = {
+            "degraded": range_status["degraded"],
+            "missing_dates": [d for d in range_status["missing_dates"] if (d.year, d.month) == (year, month)],
+        }
+        entry = _build_calendar_month(year, month, timeslots_by_date, status)
+        # 縮退時の結果は欠損を含む可能性があるためキャッシュしない
+        if not status["degraded"]:
+            _calendar_cache.set((year, month), entry)
+        entries[(year, month)] = entry
+    return entries
+
+async def _get_calendar_months(months: List[Tuple[int, int]]) -> Dict[Tuple[int, int], dict]:
+    """複数月のカレンダー集計を取得
+    
+    months は昇順の (年, 月) の一覧。戻り値のキーは (年, 月)。
+    キャッシュにない月は連続する月ごとに1回の範囲クエリで取得し、キャッシュ済みの月は読み直さない。
+    """
+    entries = {}
+    runs: List[List[Tuple[int, int]]] = []
+    for month_key in months:
+        cached = _calendar_cache.get(month_key)
+        if cached is not None:
+            entries[month_key] = cached
+        elif runs and _month_index(runs[-1][-1]) + 1 == _month_index(month_key):
+            runs[-1].append(month_key)
+        else:
+            runs.append([month_key])
+    
+    for loaded in await asyncio.gather(*(_load_calendar_months(run) for run in runs)):
+        entries.update(loaded)
+    return entries
+
+@request_cached
+@coalesced("calendar")
+async def get_calendar_data_with_status(year: int, month: int) -> Tuple[dict, dict]:
+    """カレンダーデータと縮退運転の状況を取得（月次）
+    
+    戻り値は (カレンダーデータ, {"degraded": bool, "missing_dates": List[date]})
+    """
+    entry = (await _get_calendar_months([(year, month)]))[(year, month)]
+    return entry["data"], entry["status"]
+
+@request_cached
+@coalesced("calendar_range")
+async def get_calendar_range(year: int, month: int, months: int, include_slots: bool = False) -> List[dict]:
+    """指定月から複数月分のカレンダーデータを取得
+    
+    各月は {"year", "month", "data", "degraded", "missing_dates"} で、
+    include_slots=True の場合は日ごとの予約枠の空き状況（slots）も含める。
+    """
+    start_index = _month_index((year, month))
+    month_keys = [((start_index + offset) // 12, (start_index + offset) % 12 + 1) for offset in range(months)]
+    
+    entries = await _get_calendar_months(month_keys)
+    result = []
+    for entry_year, entry_month in month_keys:
+        entry = entries[(entry_year, entry_month)]
+        month_data = {
+            "year": entry_year,
+            "month": entry_month,
+            "data": entry["data"],
+            "degraded": entry["status"]["degraded"],
+            "missing_dates": entry["status"]["missing_dates"],
+        }
+        if include_slots:
+            month_data["slots"] = entry["slots"]
+        result.append(month_data)
+    return result
+
+async def get_calendar_data(year: int, month: int) -> dict:
+    """カレンダーデータを取得（月次）- パフォーマンス最適化版"""
+    calendar_data, _ = await get_calendar_data_with_status(year, month)
+    return calendar_data
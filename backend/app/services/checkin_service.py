@@ -0,0 +1,149 @@
+# 来店受付（チェックイン）サービス
+import hashlib
+import json
+import logging
+from datetime import date, datetime
+from typing import Dict, List
+from google.api_core.exceptions import FailedPrecondition
+from google.cloud.firestore_v1 import FieldFilter
+from app.utils.firebase import get_firestore_db
+from app.utils.storage import run_storage
+from app.services.product_service import get_product_catalog
+
+logger = logging.getLogger(__name__)
+
+# マニフェストの形式バージョン（列構成を変更した場合に上げる）
+MANIFEST_FORMAT_VERSION = 1
+
+# マニフェストに含める予約ステータス（完了済みも含め、二重受付を端末で判定できるようにする）
+MANIFEST_STATUSES = ("confirmed", "completed")
+
+# マニフェストの1予約あたりの列（entries の各要素はこの順の配列）
+MANIFEST_COLUMNS = ["reservation_number", "reservation_id", "user_name", "visit_time", "status", "items"]
+
+# 同期の書き込みが他の更新と競合した場合の再試行回数
+SYNC_MAX_ATTEMPTS = 3
+
+# マニフェストに必要なフィールドのみ取得する
+_MANIFEST_FIELDS = ["reservation_number", "reservation_id", "user_name", "visit_time", "status", "products"]
+
+def _load_day_reservations(visit_date: date) -> List[dict]:
+    """来店日の予約を1回のクエリで取得（同期処理）"""
+    db = get_firestore_db()
+    query = (
+        db.collection("reservations")
+        .where(filter=FieldFilter("visit_date", "==", visit_date.isoformat()))
+        .select(_MANIFEST_FIELDS)
+    )
+    return [doc.to_dict() for doc in query.stream()]
+
+async def build_checkin_manifest(visit_date: date) -> dict:
+    """来店日の受付用マニフェストを作成
+
+    entries は予約番号の昇順に並んだ配列のため、端末側では二分探索で照会できる。
+    商品（予約時点の商品名・価格ごと）は products に1回だけ出力し、各予約の items は [products のインデックス, 数量] で参照する。
+    version は内容のハッシュで、内容が変わらなければ同じ値になる。
+    """
+    reservations = await run_storage("checkin.manifest", _load_day_reservations, visit_date)
+
+    reservations = [r for r in reservations if r.get("status") in MANIFEST_STATUSES]
+    reservations.sort(key=lambda r: r.get("reservation_number", ""))
+
+    # 予約時点の商品名・価格を使用する（保存されていない過去の予約のみ商品カタログから補う）
+    items = [item for r in reservations for item in r.get("products", [])]
+    catalog = await get_product_catalog() if any("price" not in item for item in items) else {}
+
+    def product_row(item: dict) -> tuple:
+        product = item if "price" in item else catalog.get(item["product_id"], {})
+        return item["product_id"], product.get("name", "商品情報が見つかりません"), product.get("price", 0)
+
+    # 同じ商品でも予約時点の商品名・価格が異なる場合は別の行にする
+    rows = sorted({product_row(item) for item in items}, key=lambda row: (row[0], str(row[1]), row[2]))
+    product_index = {row: i for i, row in enumerate(rows)}
+    products = [list(row) for row in rows]
+
+    entries = [
+        [
+            r.get("reservation_number", ""),
+            r.get("reservation_id", ""),
+            r.get("user_name", ""),
+            r.get("visit_time", ""),
+            r.get("status", ""),
+            [[product_index[product_row(item)], item.get("quantity", 0)] for item in r.get("products", [])],
+        ]
+        for r in reservations
+    ]
+
+    body = json.dumps([products, entries], ensure_ascii=False, separators=(",", ":"))
+    return {
+        "format_version": MANIFEST_FORMAT_VERSION,
+        "visit_date": visit_date.isoformat(),
+        "version": hashlib.sha256(body.encode("utf-8")).hexdigest()[:16],
+        "generated_at": datetime.now().isoformat(),
+        "count": len(entries),
+        "product_columns": ["product_id", "name", "price"],
+        "products": products,
+        "columns": MANIFEST_COLUMNS,
+        "entries": entries,
+    }
+
+def _apply_checkins(visit_date: date, completions: Dict[str, str]) -> dict:
+    """受付済みの予約をまとめて完了に更新（同期処理）
+
+    予約を get_all で1回取得し、更新は読み取り時点から変更されていないことを前提条件に
+    1回のバッチで書き込む。競合した場合は読み直して再試行する。
+    """
+    db = get_firestore_db()
+    refs = [db.collection("reservations").document(reservation_id) for reservation_id in completions]
+
+    for _ in range(SYNC_MAX_ATTEMPTS):
+        result = {"completed": [], "already_completed": [], "errors": []}
+        batch = db.batch()
+        now = datetime.now().isoformat()
+        for doc in db.get_all(refs):
+            if not doc.exists:
+                result["errors"].append({"reservation_id": doc.id, "error": "予約が見つかりません"})
+                continue
+
+            data = doc.to_dict()
+            if data.get("visit_date") != visit_date.isoformat():
+                result["errors"].append({"reservation_id": doc.id, "error": "来店日が異なる予約です"})
+            elif data.get("status") == "cancelled":
+                result["errors"].append({"reservation_id": doc.id, "error": "キャンセル済みの予約は完了できません"})
+            elif data.get("status") == "completed":
+                result["already_completed"].append(doc.id)
+            else:
+                batch.update(doc.reference, {
+                    "status": "completed",
+                    "checked_in_at": completions[doc.id] or now,
+                    "updated_at": now,
+                }, option=db.write_option(last_update_time=doc.update_time))
+                result["completed"].append(doc.id)
+
+        if not result["completed"]:
+            return result
+        try:
+            batch.commit()
+            return result
+        except FailedPrecondition:
+            # 読み取り後に他の更新（キャンセル・個別の完了など）が入ったため、読み直して再試行
+            continue
+
+    raise ValueError("他の更新と競合したため同期できませんでした。もう一度お試しください")
+
+async def sync_checkins(visit_date: date, completions: List[dict]) -> dict:
+    """受付端末で記録した来店を一括で反映"""
+    # 同じ予約が複数回送られた場合は最初の受付日時を採用
+    checkins: Dict[str, str] = {}
+    for completion in completions:
+        checked_in_at = completion.get("checked_in_at")
+        if isinstance(checked_in_at, datetime):
+            checked_in_at = checked_in_at.isoformat()
+        checkins.setdefault(completion["reservation_id"], checked_in_at)
+
+    result = await run_storage("checkin.sync", _apply_checkins, visit_date, checkins)
+    logger.info(
+        f"受付を同期しました ({visit_date.isoformat()}): 完了={len(result['completed'])}, "
+        f"完了済み={len(result['already_completed'])}, エラー={len(result['errors'])}"
+    )
+    return result
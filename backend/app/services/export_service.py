@@ -0,0 +1,128 @@
+# 予約データのエクスポートサービス
+import csv
+import io
+import json
+import zlib
+from datetime import date
+from typing import AsyncIterable, AsyncIterator, Dict, List, Optional
+from google.cloud.firestore_v1 import FieldFilter
+from app.utils.firebase import get_firestore_db
+from app.utils.storage import run_storage
+
+# 1回のクエリで取得する件数（メモリ使用量はこの件数分で一定）
+EXPORT_PAGE_SIZE = 500
+
+# CSVの列定義
+CSV_COLUMNS = [
+    "reservation_number",
+    "visit_date",
+    "visit_time",
+    "status",
+    "user_name",
+    "user_email",
+    "user_phone",
+    "products",
+    "total_quantity",
+    "total_amount",
+    "created_at",
+    "reservation_id",
+]
+
+async def iter_reservations(
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    status: Optional[str] = None,
+    page_size: int = EXPORT_PAGE_SIZE,
+    fields: Optional[List[str]] = None,
+) -> AsyncIterator[dict]:
+    """条件に一致する予約をカーソルでページングしながら順に返す
+
+    来店日の昇順で返す。全件をリストに保持しないため、件数が増えてもメモリ使用量は一定。
+    各ページの取得は run_storage で行う（再試行・同時実行数の制限つき）。
+    fields を指定した場合は、そのフィールドのみ取得する（visit_date は常に含める）。
+    """
+    db = get_firestore_db()
+    query = db.collection("reservations")
+    if status:
+        query = query.where(filter=FieldFilter("status", "==", status))
+    if start_date:
+        query = query.where(filter=FieldFilter("visit_date", ">=", start_date.isoformat()))
+    if end_date:
+        query = query.where(filter=FieldFilter("visit_date", "<=", end_date.isoformat()))
+    if fields:
+        query = query.select(sorted(set(fields) | {"visit_date"}))
+    query = query.order_by("visit_date").limit(page_size)
+
+    last_doc = None
+    while True:
+        page = query.start_after(last_doc) if last_doc is not None else query
+        docs = await run_storage("reservations.export_page", lambda: list(page.stream()))
+        for doc in docs:
+            yield doc.to_dict()
+        if len(docs) < page_size:
+            break
+        last_doc = docs[-1]
+
+def _product_lines(reservation: dict, catalog: Dict[str, dict]) -> list:
+    """予約の商品明細に商品名・価格を付与（予約時点の商品名・価格が保存されている場合はそちらを使用）"""
+    lines = []
+    for item in reservation.get("products", []):
+        product = item if "price" in item else catalog.get(item.get("product_id"), {})
+        price = product.get("price", 0)
+        quantity = item.get("quantity", 0)
+        lines.append({
+            "product_id": item.get("product_id"),
+            "name": product.get("name", "商品情報が見つかりません"),
+            "price": price,
+            "quantity": quantity,
+            "line_total": price * quantity,
+        })
+    return lines
+
+async def iter_csv(reservations: AsyncIterable[dict], catalog: Dict[str, dict]) -> AsyncIterator[str]:
+    """予約をCSV形式で1行ずつ出力（Excelで文字化けしないようBOM付き）"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def flush() -> str:
+        value = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+        return value
+
+    writer.writerow(CSV_COLUMNS)
+    yield "\ufeff" + flush()
+
+    async for reservation in reservations:
+        lines = _product_lines(reservation, catalog)
+        writer.writerow([
+            reservation.get("reservation_number", ""),
+            reservation.get("visit_date", ""),
+            reservation.get("visit_time", ""),
+            reservation.get("status", ""),
+            reservation.get("user_name", ""),
+            reservation.get("user_email", ""),
+            reservation.get("user_phone", ""),
+            " / ".join(f"{line['name']} x {line['quantity']}" for line in lines),
+            sum(line["quantity"] for line in lines),
+            sum(line["line_total"] for line in lines),
+            reservation.get("created_at", ""),
+            reservation.get("reservation_id", ""),
+        ])
+        yield flush()
+
+async def iter_ndjson(reservations: AsyncIterable[dict], catalog: Dict[str, dict]) -> AsyncIterator[str]:
+    """予約をNDJSON形式（1行1予約）で出力"""
+    async for reservation in reservations:
+        row = dict(reservation)
+        row["products"] = _product_lines(reservation, catalog)
+        yield json.dumps(row, ensure_ascii=False, default=str) + "\n"
+
+async def iter_gzip(chunks: AsyncIterable[str]) -> AsyncIterator[bytes]:
+    """文字列のストリームをgzip圧縮しながら出力"""
+    compressor = zlib.compressobj(wbits=31)  # 31: gzipヘッダー付き
+    async for chunk in chunks:
+        data = compressor.compress(chunk.encode("utf-8"))
+        if data:
+            yield data
+    yield compressor.flush()
@@ -0,0 +1,302 @@
+# 予約データの一括インポートサービス
+import asyncio
+import csv
+import io
+import json
+import logging
+import uuid
+from collections import defaultdict
+from datetime import date, datetime
+from typing import Dict, List, Optional, Tuple
+from google.cloud import firestore
+from pydantic import ValidationError
+from app.schemas.reservation import ReservationCreate
+from app.utils.firebase import get_firestore_db
+from app.utils.storage import run_storage
+from app.services.calendar_service import invalidate_calendar_cache
+from app.services.timeslot_service import generate_slot_id
+from app.services.product_service import adjust_cached_order_counts
+from app.services.reservation_service import (
+    email_hash, generate_reservation_number, missing_reservation_numbers, product_snapshot, validate_product_rules,
+)
+from app.services.reservation_complete_service import find_reservation_ids_by_number
+
+logger = logging.getLogger(__name__)
+
+# 1回のインポートで受け付ける最大行数
+MAX_IMPORT_ROWS = 5000
+
+# 1バッチあたりの書き込み件数（Firestoreの上限は500）
+IMPORT_BATCH_SIZE = 500
+
+# get_all 1回あたりの取得件数
+_GET_ALL_CHUNK_SIZE = 300
+
+def _parse_products_cell(value: str) -> List[dict]:
+    """CSVの商品列（例: "商品ID:2;商品ID:1"）を商品リストに変換"""
+    products = []
+    for part in (value or "").split(";"):
+        part = part.strip()
+        if not part:
+            continue
+        product_id, _, quantity = part.partition(":")
+        products.append({"product_id": product_id.strip(), "quantity": quantity.strip() or "1"})
+    return products
+
+def parse_import_rows(content: bytes, format: str) -> List[dict]:
+    """NDJSON/CSVの内容を行ごとの辞書に変換"""
+    text = content.decode("utf-8-sig")
+    rows = []
+
+    if format == "ndjson":
+        for line_number, line in enumerate(text.splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                rows.append(json.loads(line))
+            except json.JSONDecodeError as e:
+                rows.append({"_parse_error": f"{line_number}行目のJSONが不正です: {e}"})
+    else:
+        for row in csv.DictReader(io.StringIO(text)):
+            row = {key: value for key, value in row.items() if key}
+            row["products"] = _parse_products_cell(row.get("products", ""))
+            rows.append(row)
+
+    if len(rows) > MAX_IMPORT_ROWS:
+        raise ValueError(f"1回のインポートは{MAX_IMPORT_ROWS}行までです（{len(rows)}行）")
+    return rows
+
+def _validate_row(row: dict) -> Tuple[Optional[dict], List[str]]:
+    """1行をReservationCreateスキーマで検証"""
+    if "_parse_error" in row:
+        return None, [row["_parse_error"]]
+    try:
+        reservation = ReservationCreate.model_validate(row)
+    except ValidationError as e:
+        return None, [
+            f"{'.'.join(str(loc) for loc in error['loc'])}: {error['msg']}" for error in e.errors()
+        ]
+
+    data = reservation.model_dump()
+    data["reservation_number"] = row.get("reservation_number") or None
+    return data, []
+
+def _get_all_dicts(collection: str, doc_ids: List[str]) -> Dict[str, dict]:
+    """ドキュメントをget_allでまとめて取得（同期処理）"""
+    db = get_firestore_db()
+    result = {}
+    for i in range(0, len(doc_ids), _GET_ALL_CHUNK_SIZE):
+        refs = [db.collection(collection).document(doc_id) for doc_id in doc_ids[i:i + _GET_ALL_CHUNK_SIZE]]
+        for doc in db.get_all(refs):
+            if doc.exists:
+                result[doc.id] = doc.to_dict()
+    return result
+
+async def import_reservations(rows: List[dict], dry_run: bool = False) -> dict:
+    """予約を一括インポート
+
+    1. 全行をスキーマ検証
+    2. 参照される予約枠・商品を get_all でまとめて取得（並行実行）
+    3. 定員・購入制限・1人1日1件・予約番号の重複をメモリ上で累積しながら確認
+    4. 予約と1日1件のキー、予約済み数・受注数の加算（バッチ内で予約枠・商品ごとに集計）を同じバッチで書き込む
+    """
+    from app.services.schedule_service import get_virtual_timeslot, materialize_timeslot
+
+    errors = []
+    valid_rows = []
+    for index, row in enumerate(rows, start=1):
+        data, row_errors = _validate_row(row)
+        if row_errors:
+            errors.append({"row": index, "errors": row_errors})
+        else:
+            valid_rows.append((index, data))
+
+    # 参照される予約枠と商品をまとめて取得
+    slot_ids = sorted({generate_slot_id(data["visit_date"], data["visit_time"]) for _, data in valid_rows})
+    product_ids = sorted({p["product_id"] for _, data in valid_rows for p in data["products"]})
+    user_day_ids = sorted({f"{email_hash(data['user_email'])}_{data['visit_date'].isoformat()}" for _, data in valid_rows})
+    timeslots, products, user_days = await asyncio.gather(
+        run_storage("timeslots.get_all", _get_all_dicts, "timeslots", slot_ids),
+        run_storage("products.get_all", _get_all_dicts, "products", product_ids),
+        run_storage("user_day.get_all", _get_all_dicts, "user_day", user_day_ids),
+    )
+    virtual_slot_ids = set()
+    for slot_id in slot_ids:
+        if slot_id not in timeslots:
+            virtual_slot = await get_virtual_timeslot(slot_id)
+            if virtual_slot:
+                timeslots[slot_id] = virtual_slot
+                virtual_slot_ids.add(slot_id)
+
+    # 指定された予約番号が既存の予約で使われていないか確認
+    provided_numbers = sorted({data["reservation_number"] for _, data in valid_rows if data["reservation_number"]})
+    existing_numbers = (
+        await run_storage("reservations.query", find_reservation_ids_by_number, provided_numbers)
+        if provided_numbers else {}
+    )
+
+    # メモリ上で定員・購入制限を確認しながら、加算量を集計
+    slot_deltas: Dict[str, int] = defaultdict(int)
+    product_deltas: Dict[str, int] = defaultdict(int)
+    accepted = []
+    booked_user_days = set(user_days)
+    booked_numbers = set(existing_numbers)
+    for index, data in valid_rows:
+        slot_id = generate_slot_id(data["visit_date"], data["visit_time"])
+        user_day_id = f"{email_hash(data['user_email'])}_{data['visit_date'].isoformat()}"
+        timeslot = timeslots.get(slot_id)
+        row_errors = []
+        reservation_number = data["reservation_number"]
+        if reservation_number in booked_numbers:
+            if reservation_number in existing_numbers:
+                row_errors.append(f"予約番号 {reservation_number} は既に使用されています")
+            else:
+                row_errors.append(f"予約番号 {reservation_number} がファイル内で重複しています")
+        if user_day_id in booked_user_days:
+            row_errors.append("同じ日の予約は1人1件までです")
+        if not timeslot:
+            row_errors.append("指定された日時の予約枠が存在しません")
+        elif not timeslot.get("is_available", False):
+            row_errors.append("この予約枠は利用できません")
+        elif timeslot.get("reserved_count", 0) + slot_deltas[slot_id] >= timeslot.get("capacity", 0):
+            row_errors.append("この時間帯は満席です")
+
+        for item in data["products"]:
+            product = products.get(item["product_id"])
+            if not product:
+                row_errors.append(f"商品ID {item['product_id']} が見つかりません")
+                continue
+            try:
+                validate_product_rules(
+                    product, item["product_id"], item["quantity"],
+                    pending_quantity=product_deltas[item["product_id"]],
+                )
+            except ValueError as e:
+                row_errors.append(str(e))
+
+        if row_errors:
+            errors.append({"row": index, "errors": row_errors})
+            continue
+
+        slot_deltas[slot_id] += 1
+        for item in data["products"]:
+            product_deltas[item["product_id"]] += item["quantity"]
+        booked_user_days.add(user_day_id)
+        if reservation_number:
+            booked_numbers.add(reservation_number)
+        accepted.append((index, slot_id, user_day_id, data))
+
+    result = {
+        "total": len(rows),
+        "imported": 0,
+        "valid": len(accepted),
+        "failed": len(errors),
+        "dry_run": dry_run,
+        "errors": errors,
+        "reservation_numbers": [],
+    }
+    if dry_run or not accepted:
+        result["errors"] = sorted(errors, key=lambda x: x["row"])
+        return result
+
+    # 仮想予約枠は加算前に実体化する
+    for slot_id in virtual_slot_ids & set(slot_deltas):
+        await materialize_timeslot(slot_id)
+
+    # 予約・1日1件のキー・予約済み数と受注数の加算を同じバッチで書き込む
+    # （バッチ単位で全件反映または全件未反映となり、失敗したバッチの行はエラーとして返す）
+    db = get_firestore_db()
+    now = datetime.now().isoformat()
+    imported_slots = set()
+    for group in _group_into_batches(accepted):
+        batch = db.batch()
+        group_slot_deltas: Dict[str, int] = defaultdict(int)
+        group_product_deltas: Dict[str, int] = defaultdict(int)
+        numbers = []
+        for index, slot_id, user_day_id, data in group:
+            reservation_id = str(uuid.uuid4())
+            reservation_number = data["reservation_number"] or generate_reservation_number()
+            batch.create(db.collection("reservations").document(reservation_id), {
+                "reservation_id": reservation_id,
+                "reservation_number": reservation_number,
+                "user_email": data["user_email"],
+                "user_name": data["user_name"],
+                "user_phone": data["user_phone"],
+                "visit_date": data["visit_date"].isoformat(),
+                "visit_time": data["visit_time"],
+                "slot_id": slot_id,
+                "status": "confirmed",
+                "products": [
+                    product_snapshot(p["product_id"], p["quantity"], products[p["product_id"]]) for p in data["products"]
+                ],
+                "created_at": now,
+                "updated_at": now,
+            })
+            batch.create(db.collection("user_day").document(user_day_id), {
+                "reservation_id": reservation_id,
+                "visit_date": data["visit_date"].isoformat(),
+                "created_at": now,
+            })
+            group_slot_deltas[slot_id] += 1
+            for item in data["products"]:
+                group_product_deltas[item["product_id"]] += item["quantity"]
+            numbers.append({"row": index, "reservation_number": reservation_number})
+
+        counter_updates = [("timeslots", doc_id, "reserved_count", delta) for doc_id, delta in group_slot_deltas.items()]
+        counter_updates += [("products", doc_id, "current_order_count", delta) for doc_id, delta in group_product_deltas.items()]
+        for collection, doc_id, field, delta in counter_updates:
+            batch.update(db.collection(collection).document(doc_id), {
+                field: firestore.Increment(delta),
+                "updated_at": now,
+            })
+
+        try:
+            await run_storage("reservations.import_commit", batch.commit, idempotent=False)
+        except Exception as e:
+            logger.warning(f"予約のインポートでバッチの書き込みに失敗しました（{len(group)}件）: {e}")
+            detail = getattr(e, "detail", None) or str(e)
+            errors.extend({"row": index, "errors": [f"書き込みに失敗しました: {detail}"]} for index, _, _, _ in group)
+            continue
+
+        result["imported"] += len(group)
+        result["reservation_numbers"].extend(numbers)
+        imported_slots.update(group_slot_deltas)
+        adjust_cached_order_counts(group_product_deltas)
+        for item in numbers:
+            missing_reservation_numbers.mark_exists(item["reservation_number"])
+
+    result["failed"] = len(errors)
+    result["errors"] = sorted(errors, key=lambda x: x["row"])
+    invalidate_calendar_cache(date.fromisoformat(slot_id.split("_", 1)[0]) for slot_id in imported_slots)
+    logger.info(
+        f"予約を一括インポートしました: 取込={result['imported']}, 失敗={len(errors)}, "
+        f"予約枠={len(imported_slots)}"
+    )
+    return result
+
+def _group_into_batches(accepted: List[tuple]) -> List[List[tuple]]:
+    """1バッチの書き込み件数が上限を超えないよう、取り込む行をまとめる
+
+    1行あたり予約と1日1件のキーの2件に加え、バッチ内で初めて出てくる予約枠・商品ごとに1件の加算を書き込む。
+    """
+    groups = []
+    group = []
+    writes = 0
+    counters = set()
+    for row in accepted:
+        _, slot_id, _, data = row
+        new_counters = ({("timeslots", slot_id)} | {("products", p["product_id"]) for p in data["products"]}) - counters
+        row_writes = 2 + len(new_counters)
+        if group and writes + row_writes > IMPORT_BATCH_SIZE:
+            groups.append(group)
+            group = []
+            writes = 0
+            counters = set()
+            new_counters = {("timeslots", slot_id)} | {("products", p["product_id"]) for p in data["products"]}
+            row_writes = 2 + len(new_counters)
+        group.append(row)
+        writes += row_writes
+        counters |= new_counters
+    if group:
+        groups.append(group)
+    return groups
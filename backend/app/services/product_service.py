@@ -1,9 +1,62 @@
 # 商品管理サービス
+import os
 import uuid
 from datetime import datetime, date
 from typing import List, Optional, Dict
 from google.cloud.firestore_v1 import FieldFilter
+from app.utils.cache import TTLCache
 from app.utils.firebase import get_firestore_db
+from app.utils.firestore_write import update_document, update_existing
+from app.utils.storage import run_storage
+from app.utils.coalesce import coalesced
+from app.utils.request_cache import request_cached
+from app.utils.negative_cache import NegativeCache
+
+# 商品カタログ（商品名・価格などの表示用情報）のキャッシュ
+# 受注数はこのプロセスでの予約・変更・キャンセルの増減のみ反映するため（他のインスタンスの増減は
+# 有効期限まで反映されない）、空き状況の表示には使用できるが購入制限の判定には使用しないこと
+PRODUCT_CATALOG_CACHE_TTL = float(os.getenv("PRODUCT_CATALOG_CACHE_TTL", "60"))
+_catalog_cache = TTLCache(ttl=PRODUCT_CATALOG_CACHE_TTL)
+
+def invalidate_product_catalog() -> None:
+    """商品カタログのキャッシュを破棄"""
+    _catalog_cache.clear()
+
+def _list_product_ids() -> List[str]:
+    """商品IDを一覧取得（同期処理）"""
+    db = get_firestore_db()
+    return [doc.id for doc in db.collection("products").select([]).stream()]
+
+# 存在しない商品ID（存在しない商品の照会で読み取りを省略する）
+missing_products = NegativeCache("products", loader=_list_product_ids)
+
+def _load_product_catalog() -> Dict[str, dict]:
+    """全商品（非公開を含む）をFirestoreから取得（同期処理）"""
+    db = get_firestore_db()
+    return {doc.id: doc.to_dict() for doc in db.collection("products").stream()}
+
+def get_cached_product_catalog() -> Optional[Dict[str, dict]]:
+    """キャッシュ済みの商品カタログを取得（キャッシュがない場合は読み込まずに None）"""
+    return _catalog_cache.get("all")
+
+def adjust_cached_order_counts(deltas: Dict[str, int]) -> None:
+    """このプロセスで確定した受注数の増減を、キャッシュ済みの商品カタログに反映"""
+    catalog = _catalog_cache.get("all")
+    if catalog is None:
+        return
+    for product_id, delta in deltas.items():
+        product = catalog.get(product_id)
+        if product is not None and delta:
+            product["current_order_count"] = max(0, product.get("current_order_count", 0) + delta)
+
+@request_cached
+async def get_product_catalog() -> Dict[str, dict]:
+    """商品カタログを取得（キー: 商品ID、キャッシュ済みの場合はFirestoreにアクセスしない）"""
+    catalog = _catalog_cache.get("all")
+    if catalog is None:
+        catalog = await run_storage("products.catalog", _load_product_catalog)
+        _catalog_cache.set("all", catalog)
+    return catalog
 
 async def create_product(product_data: dict) -> dict:
     """商品を作成"""
@@ -29,19 +82,29 @@ async def create_product(product_data: dict) -> dict:
     }
     
     # Firestoreに保存
-    db.collection("products").document(product_id).set(product_doc)
+    await run_storage("products.set", db.collection("products").document(product_id).set, product_doc)
+    missing_products.mark_exists(product_id)
+    invalidate_product_catalog()
     
     return product_doc
 
+@request_cached
 async def get_product(product_id: str) -> Optional[dict]:
     """商品を取得"""
+    await missing_products.refresh()
+    if missing_products.is_missing(product_id):
+        return None
+    
     db = get_firestore_db()
-    doc = db.collection("products").document(product_id).get()
+    doc = await run_storage("products.get", db.collection("products").document(product_id).get)
     
     if doc.exists:
         return doc.to_dict()
+    missing_products.mark_missing(product_id)
     return None
 
+@request_cached
+@coalesced("products")
 async def get_all_products(include_inactive: bool = False) -> List[dict]:
     """商品一覧を取得"""
     db = get_firestore_db()
@@ -51,7 +114,7 @@ async def get_all_products(include_inactive: bool = False) -> List[dict]:
     if not include_inactive:
         query = query.where(filter=FieldFilter("is_active", "==", True))
     
-    docs = query.stream()
+    docs = await run_storage("products.query", lambda: list(query.stream()))
     
     products = []
     for doc in docs:
@@ -65,10 +128,6 @@ async def update_product(product_id: str, update_data: dict) -> Optional[dict]:
     """商品を更新"""
     db = get_firestore_db()
     doc_ref = db.collection("products").document(product_id)
-    doc = doc_ref.get()
-    
-    if not doc.exists:
-        return None
     
     # datetime オブジェクトは文字列に変換
     if "order_start_date" in update_data and isinstance(update_data["order_start_date"], datetime):
@@ -77,65 +136,33 @@ async def update_product(product_id: str, update_data: dict) -> Optional[dict]:
         update_data["order_end_date"] = update_data["order_end_date"].isoformat()
     
     update_data["updated_at"] = datetime.now().isoformat()
-    doc_ref.update(update_data)
+    result = await run_storage("products.update", update_document, doc_ref, update_data)
+    if result is None:
+        return None
     
-    return doc_ref.get().to_dict()
+    invalidate_product_catalog()
+    return result
 
 async def delete_product(product_id: str) -> bool:
     """商品を削除（論理削除：is_activeをFalseにする）"""
     db = get_firestore_db()
     doc_ref = db.collection("products").document(product_id)
-    doc = doc_ref.get()
     
-    if not doc.exists:
-        return False
-    
-    doc_ref.update({
+    if not await run_storage("products.update", update_existing, doc_ref, {
         "is_active": False,
         "updated_at": datetime.now().isoformat(),
-    })
-    
-    return True
-
-async def increment_order_count(product_id: str, quantity: int) -> bool:
-    """商品の受注数を増やす"""
-    db = get_firestore_db()
-    doc_ref = db.collection("products").document(product_id)
-    doc = doc_ref.get()
-    
-    if not doc.exists:
-        return False
-    
-    current_count = doc.to_dict().get("current_order_count", 0)
-    doc_ref.update({
-        "current_order_count": current_count + quantity,
-        "updated_at": datetime.now().isoformat(),
-    })
-    
-    return True
-
-async def decrement_order_count(product_id: str, quantity: int) -> bool:
-    """商品の受注数を減らす"""
-    db = get_firestore_db()
-    doc_ref = db.collection("products").document(product_id)
-    doc = doc_ref.get()
-    
-    if not doc.exists:
+    }):
         return False
     
-    current_count = doc.to_dict().get("current_order_count", 0)
-    new_count = max(0, current_count - quantity)
-    doc_ref.update({
-        "current_order_count": new_count,
-        "updated_at": datetime.now().isoformat(),
-    })
-    
+    invalidate_product_catalog()
     return True
 
 async def get_product_availability(product_id: str) -> Dict:
     """商品の購入可能数を取得"""
-    product = await get_product(product_id)
-    
+    return product_availability(await get_product(product_id))
+
+def product_availability(product: Optional[dict]) -> Dict:
+    """商品データから購入可能数を求める"""
     if not product:
         return {
             "available": False,
@@ -163,12 +190,12 @@ async def get_product_availability(product_id: str) -> Dict:
     
     is_in_period = True
     if order_start:
-        start_date = date.fromisoformat(order_start) if isinstance(order_start, str) else order_start
+        start_date = date.fromisoformat(order_start[:10]) if isinstance(order_start, str) else order_start
         if today < start_date:
             is_in_period = False
     
     if order_end:
-        end_date = date.fromisoformat(order_end) if isinstance(order_end, str) else order_end
+        end_date = date.fromisoformat(order_end[:10]) if isinstance(order_end, str) else order_end
         if today > end_date:
             is_in_period = False
     
@@ -208,7 +235,7 @@ async def check_user_purchase_limit(product_id: str, user_email: str, requested_
     )
     
     total_purchased = 0
-    for res_doc in query.stream():
+    for res_doc in await run_storage("reservations.query", lambda: list(query.stream())):
         res_data = res_doc.to_dict()
         for p in res_data.get("products", []):
             if p.get("product_id") == product_id:
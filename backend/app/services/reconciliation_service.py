@@ -0,0 +1,309 @@
+# 予約済み数・受注数の整合性チェック（カウンターの再集計）サービス
+import logging
+from collections import Counter
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from google.api_core.exceptions import FailedPrecondition
+from google.cloud.firestore_v1 import FieldFilter
+from app.utils.firebase import get_firestore_db
+from app.utils.storage import run_storage
+from app.services.export_service import iter_reservations
+from app.services.calendar_service import invalidate_calendar_cache
+from app.services.timeslot_service import generate_slot_id
+from app.services.product_service import invalidate_product_catalog
+
+logger = logging.getLogger(__name__)
+
+# 予約済み数・受注数に計上されるステータス（キャンセル時のみカウンターを戻す）
+COUNTED_STATUSES = ("pending", "confirmed", "completed")
+
+# 1バッチあたりの書き込み件数（Firestoreの上限は500）
+RECONCILE_BATCH_SIZE = 500
+
+# 集計に必要なフィールドのみ取得する
+_RESERVATION_FIELDS = ["visit_date", "visit_time", "status", "products"]
+
+# slot_id の補完で1回のクエリで取得する件数
+BACKFILL_PAGE_SIZE = 500
+
+def _read_counters(collection: str, field: str, start_date: Optional[date] = None,
+                   end_date: Optional[date] = None) -> Dict[str, Tuple[int, object]]:
+    """保存済みのカウンター値と更新時刻を取得（同期処理）
+
+    戻り値は {ドキュメントID: (カウンター値, update_time)}
+    """
+    db = get_firestore_db()
+    query = db.collection(collection)
+    if start_date:
+        query = query.where(filter=FieldFilter("date", ">=", start_date.isoformat()))
+    if end_date:
+        query = query.where(filter=FieldFilter("date", "<=", end_date.isoformat()))
+    return {doc.id: (doc.to_dict().get(field, 0), doc.update_time) for doc in query.stream()}
+
+async def _aggregate_reservations(start_date: Optional[date], end_date: Optional[date],
+                                  include_products: bool) -> Tuple[Counter, Counter, int]:
+    """予約を1回のストリーミングで走査し、予約枠・商品ごとの実数をハッシュ集計"""
+    slot_counts = Counter()
+    product_counts = Counter()
+    scanned = 0
+    async for reservation in iter_reservations(start_date=start_date, end_date=end_date, fields=_RESERVATION_FIELDS):
+        scanned += 1
+        if reservation.get("status") not in COUNTED_STATUSES:
+            continue
+        try:
+            slot_id = generate_slot_id(date.fromisoformat(reservation["visit_date"]), reservation["visit_time"])
+        except (KeyError, TypeError, ValueError):
+            continue
+        slot_counts[slot_id] += 1
+        if include_products:
+            for item in reservation.get("products") or []:
+                product_counts[item.get("product_id")] += item.get("quantity", 0)
+    return slot_counts, product_counts, scanned
+
+def _diff_counters(stored: Dict[str, Tuple[int, object]], actual: Counter) -> List[dict]:
+    """保存済みのカウンターと実数の差分を抽出"""
+    discrepancies = []
+    for doc_id in sorted(set(stored) | set(actual)):
+        stored_value = stored[doc_id][0] if doc_id in stored else None
+        actual_value = actual.get(doc_id, 0)
+        if stored_value == actual_value:
+            continue
+        discrepancies.append({
+            "id": doc_id,
+            "stored": stored_value,
+            "actual": actual_value,
+            "missing_document": doc_id not in stored,
+        })
+    return discrepancies
+
+def _apply_fix_chunk(collection: str, field: str, chunk: List[dict],
+                     stored: Dict[str, Tuple[int, object]], now: str) -> Tuple[int, int]:
+    """1バッチ分の差分を修正（同期処理）
+
+    読み取り後に更新されたカウンターは集計と食い違う可能性があるため、
+    更新時刻の前提条件を付けて書き込み、競合したものは修正しない。
+    戻り値は (修正件数, 競合によりスキップした件数)
+    """
+    db = get_firestore_db()
+    batch = db.batch()
+    for item in chunk:
+        batch.update(
+            db.collection(collection).document(item["id"]),
+            {field: item["actual"], "updated_at": now},
+            option=db.write_option(last_update_time=stored[item["id"]][1]),
+        )
+    try:
+        batch.commit()
+        return len(chunk), 0
+    except FailedPrecondition:
+        pass
+
+    # バッチ内に競合があった場合は1件ずつ書き込む
+    fixed = 0
+    conflicts = 0
+    for item in chunk:
+        try:
+            db.collection(collection).document(item["id"]).update(
+                {field: item["actual"], "updated_at": now},
+                option=db.write_option(last_update_time=stored[item["id"]][1]),
+            )
+            fixed += 1
+        except FailedPrecondition:
+            conflicts += 1
+    return fixed, conflicts
+
+async def _apply_fixes(collection: str, field: str, discrepancies: List[dict],
+                       stored: Dict[str, Tuple[int, object]]) -> Tuple[int, int]:
+    """差分をバッチ書き込みで修正
+
+    戻り値は (修正件数, 競合によりスキップした件数)
+    """
+    targets = [d for d in discrepancies if not d["missing_document"]]
+    fixed = 0
+    conflicts = 0
+    now = datetime.now().isoformat()
+
+    for i in range(0, len(targets), RECONCILE_BATCH_SIZE):
+        chunk_fixed, chunk_conflicts = await run_storage(
+            f"{collection}.reconcile_fix", _apply_fix_chunk,
+            collection, field, targets[i:i + RECONCILE_BATCH_SIZE], stored, now,
+        )
+        fixed += chunk_fixed
+        conflicts += chunk_conflicts
+    return fixed, conflicts
+
+async def _reconcile_partition(start_date: Optional[date], end_date: Optional[date],
+                               include_products: bool, fix: bool) -> dict:
+    """1区間分の整合性チェック"""
+    # カウンターを先に読み取り、その後に予約を集計する（修正時は更新時刻で競合を検出）
+    stored_slots = await run_storage(
+        "timeslots.reconcile_read", _read_counters, "timeslots", "reserved_count", start_date, end_date
+    )
+    stored_products = (
+        await run_storage("products.reconcile_read", _read_counters, "products", "current_order_count")
+        if include_products else {}
+    )
+    slot_counts, product_counts, scanned = await _aggregate_reservations(start_date, end_date, include_products)
+
+    slot_diffs = _diff_counters(stored_slots, slot_counts)
+    product_diffs = _diff_counters(stored_products, product_counts) if include_products else []
+
+    result = {
+        "start_date": start_date,
+        "end_date": end_date,
+        "reservations_scanned": scanned,
+        "timeslots_checked": len(set(stored_slots) | set(slot_counts)),
+        "timeslot_discrepancies": slot_diffs,
+        "products_checked": len(set(stored_products) | set(product_counts)) if include_products else 0,
+        "product_discrepancies": product_diffs,
+        "fixed": 0,
+        "conflicts": 0,
+    }
+
+    if fix:
+        for collection, field, diffs, stored in (
+            ("timeslots", "reserved_count", slot_diffs, stored_slots),
+            ("products", "current_order_count", product_diffs, stored_products),
+        ):
+            if diffs:
+                fixed, conflicts = await _apply_fixes(collection, field, diffs, stored)
+                result["fixed"] += fixed
+                result["conflicts"] += conflicts
+    return result
+
+async def reconcile_counters(
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    partition_days: int = 7,
+    fix: bool = False,
+) -> dict:
+    """予約済み数・受注数を予約データから再集計し、保存済みのカウンターとの差分を報告
+
+    期間を指定した場合は予約枠のカウンターのみを partition_days 日ごとの区間で順に処理する。
+    商品の受注数は全期間の予約から集計されるため、期間を指定しない全件チェックでのみ確認する。
+    fix=True の場合は差分をバッチ書き込みで修正する。
+    """
+    if start_date is None and end_date is None:
+        partitions = [(None, None)]
+        include_products = True
+    else:
+        if start_date is None or end_date is None:
+            raise ValueError("start_date と end_date は両方指定してください")
+        if end_date < start_date:
+            raise ValueError("end_date は start_date 以降の日付を指定してください")
+        partitions = []
+        current_date = start_date
+        while current_date <= end_date:
+            partition_end = min(end_date, current_date + timedelta(days=max(1, partition_days) - 1))
+            partitions.append((current_date, partition_end))
+            current_date = partition_end + timedelta(days=1)
+        include_products = False
+
+    results = []
+    for partition_start, partition_end in partitions:
+        result = await _reconcile_partition(partition_start, partition_end, include_products, fix)
+        results.append(result)
+        if result["timeslot_discrepancies"] or result["product_discrepancies"]:
+            logger.warning(
+                f"カウンターの不整合を検出しました ({partition_start}〜{partition_end}): "
+                f"予約枠={len(result['timeslot_discrepancies'])}件, 商品={len(result['product_discrepancies'])}件, "
+                f"修正={result['fixed']}件, 競合={result['conflicts']}件"
+            )
+
+    if fix:
+        changed_dates = [
+            date.fromisoformat(d["id"].split("_", 1)[0])
+            for result in results for d in result["timeslot_discrepancies"]
+        ]
+        invalidate_calendar_cache(changed_dates)
+        if include_products:
+            invalidate_product_catalog()
+
+    return {
+        "fix": fix,
+        "include_products": include_products,
+        "reservations_scanned": sum(r["reservations_scanned"] for r in results),
+        "timeslot_discrepancies": sum(len(r["timeslot_discrepancies"]) for r in results),
+        "product_discrepancies": sum(len(r["product_discrepancies"]) for r in results),
+        "fixed": sum(r["fixed"] for r in results),
+        "conflicts": sum(r["conflicts"] for r in results),
+        "partitions": results,
+    }
+
+def _backfill_slot_id_page(docs: list, dry_run: bool) -> Tuple[int, int, int]:
+    """1ページ分の予約に slot_id を書き込む（同期処理）
+
+    読み取り後に来店日時が変更された予約は誤った slot_id になるため、
+    更新時刻の前提条件を付けて書き込み、競合したものはスキップする。
+    戻り値は (補完が必要な件数, 書き込んだ件数, 競合によりスキップした件数)
+    """
+    db = get_firestore_db()
+    targets = []
+    for doc in docs:
+        data = doc.to_dict()
+        try:
+            slot_id = generate_slot_id(date.fromisoformat(data["visit_date"]), data["visit_time"])
+        except (KeyError, TypeError, ValueError):
+            continue
+        if data.get("slot_id") != slot_id:
+            targets.append((doc, slot_id))
+
+    if dry_run or not targets:
+        return len(targets), 0, 0
+
+    batch = db.batch()
+    for doc, slot_id in targets:
+        batch.update(doc.reference, {"slot_id": slot_id}, option=db.write_option(last_update_time=doc.update_time))
+    try:
+        batch.commit()
+        return len(targets), len(targets), 0
+    except FailedPrecondition:
+        pass
+
+    # バッチ内に競合があった場合は1件ずつ書き込む
+    written = 0
+    conflicts = 0
+    for doc, slot_id in targets:
+        try:
+            doc.reference.update({"slot_id": slot_id}, option=db.write_option(last_update_time=doc.update_time))
+            written += 1
+        except FailedPrecondition:
+            conflicts += 1
+    return len(targets), written, conflicts
+
+async def _backfill_slot_ids(dry_run: bool) -> dict:
+    """全予約を来店日順に走査し、slot_id がない・食い違う予約を補完"""
+    db = get_firestore_db()
+    query = (
+        db.collection("reservations")
+        .select(["visit_date", "visit_time", "slot_id"])
+        .order_by("visit_date")
+        .limit(BACKFILL_PAGE_SIZE)
+    )
+    result = {"scanned": 0, "missing": 0, "updated": 0, "conflicts": 0, "dry_run": dry_run}
+    last_doc = None
+    while True:
+        page = query.start_after(last_doc) if last_doc is not None else query
+        docs = await run_storage("reservations.backfill_page", lambda: list(page.stream()))
+        if not docs:
+            break
+        missing, written, conflicts = await run_storage(
+            "reservations.backfill_write", _backfill_slot_id_page, docs, dry_run
+        )
+        result["scanned"] += len(docs)
+        result["missing"] += missing
+        result["updated"] += written
+        result["conflicts"] += conflicts
+        last_doc = docs[-1]
+        if len(docs) < BACKFILL_PAGE_SIZE:
+            break
+    return result
+
+async def backfill_slot_ids(dry_run: bool = False) -> dict:
+    """既存の予約に予約枠ID（slot_id）を補完"""
+    result = await _backfill_slot_ids(dry_run)
+    logger.info(
+        f"予約の slot_id を補完しました: 走査={result['scanned']}件, 対象={result['missing']}件, "
+        f"更新={result['updated']}件, 競合={result['conflicts']}件"
+    )
+    return result
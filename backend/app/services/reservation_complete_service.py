@@ -0,0 +1,143 @@
+# 予約の来店完了（1件・一括）サービス
+from datetime import datetime
+from typing import Dict, List, Optional
+from google.cloud import firestore
+from google.cloud.firestore_v1 import FieldFilter
+from app.utils.firebase import get_firestore_db
+from app.utils.firestore_write import update_document
+from app.utils.storage import run_storage, run_transaction
+
+def _check_completable(reservation_data: dict) -> None:
+    """完了可能かチェック"""
+    # 既に完了済みの場合はエラー
+    if reservation_data.get("status") == "completed":
+        raise ValueError("この予約は既に完了済みです")
+    
+    # キャンセル済みの予約は完了不可
+    if reservation_data.get("status") == "cancelled":
+        raise ValueError("キャンセル済みの予約は完了できません")
+
+async def complete_reservation(reservation_id: str) -> Optional[dict]:
+    """予約を完了状態に更新"""
+    db = get_firestore_db()
+    doc_ref = db.collection("reservations").document(reservation_id)
+    
+    # ステータスを完了に更新
+    return await run_storage("reservations.complete", update_document, doc_ref, {
+        "status": "completed",
+        "updated_at": datetime.now().isoformat(),
+    }, check=_check_completable, idempotent=False)
+
+# 一括完了で1トランザクションあたりに処理する予約数
+COMPLETE_BATCH_SIZE = 100
+
+# Firestoreの in 条件に指定できる値の上限
+_IN_QUERY_LIMIT = 30
+
+_DUPLICATE_ERROR = "同じ予約が重複して指定されています"
+
+def find_reservation_ids_by_number(reservation_numbers: List[str]) -> Dict[str, str]:
+    """予約番号から予約IDを取得（in 条件でまとめて検索、同期処理）"""
+    db = get_firestore_db()
+    result = {}
+    for i in range(0, len(reservation_numbers), _IN_QUERY_LIMIT):
+        query = db.collection("reservations").where(
+            filter=FieldFilter("reservation_number", "in", reservation_numbers[i:i + _IN_QUERY_LIMIT])
+        ).select(["reservation_number"])
+        for doc in query.stream():
+            result[doc.to_dict()["reservation_number"]] = doc.id
+    return result
+
+@firestore.transactional
+def _complete_reservations_in_transaction(transaction, db, reservation_ids: List[str]) -> Dict[str, dict]:
+    """予約をまとめて完了に更新（完了できない予約はスキップし、理由を返す）"""
+    refs = [db.collection("reservations").document(reservation_id) for reservation_id in reservation_ids]
+    now = datetime.now().isoformat()
+    results = {}
+    for doc in db.get_all(refs, transaction=transaction):
+        if not doc.exists:
+            results[doc.id] = {"success": False, "error": "予約が見つかりません"}
+            continue
+        
+        data = doc.to_dict()
+        try:
+            _check_completable(data)
+        except ValueError as e:
+            results[doc.id] = {"success": False, "reservation_number": data.get("reservation_number"), "error": str(e)}
+            continue
+        
+        transaction.update(doc.reference, {"status": "completed", "updated_at": now})
+        results[doc.id] = {"success": True, "reservation_number": data.get("reservation_number")}
+    return results
+
+def _is_valid_document_id(reservation_id: str) -> bool:
+    """Firestoreのドキュメントとして参照できるIDかチェック"""
+    return (
+        bool(reservation_id)
+        and "/" not in reservation_id
+        and reservation_id not in (".", "..")
+        and not (reservation_id.startswith("__") and reservation_id.endswith("__"))
+        and len(reservation_id.encode("utf-8")) <= 1500
+    )
+
+async def complete_reservations(
+    reservation_ids: Optional[List[str]] = None,
+    reservation_numbers: Optional[List[str]] = None,
+) -> dict:
+    """複数の予約をまとめて完了状態に更新（予約ごとの結果を指定順に返す）
+    
+    同じ予約が重複して指定された場合は最初の指定のみ処理し、以降は重複として返す。
+    """
+    db = get_firestore_db()
+    
+    # 予約番号は予約IDに変換（見つからない番号はエラーとして返す）
+    items = [{"reservation_id": reservation_id} for reservation_id in reservation_ids or []]
+    numbers = list(dict.fromkeys(reservation_numbers or []))
+    if numbers:
+        ids_by_number = await run_storage("reservations.query", find_reservation_ids_by_number, numbers)
+        for reservation_number in reservation_numbers:
+            items.append({
+                "reservation_id": ids_by_number.get(reservation_number),
+                "reservation_number": reservation_number,
+            })
+    
+    # 参照できないIDは書き込み前にエラーとし、同じ予約は1回だけ処理する
+    errors: List[Optional[str]] = []
+    unique_ids: List[str] = []
+    for item in items:
+        reservation_id = item["reservation_id"]
+        if reservation_id is None:
+            errors.append("予約が見つかりません")
+        elif not _is_valid_document_id(reservation_id):
+            errors.append("予約IDが正しくありません")
+        elif reservation_id in unique_ids:
+            errors.append(_DUPLICATE_ERROR)
+        else:
+            errors.append(None)
+            unique_ids.append(reservation_id)
+    
+    outcomes: Dict[str, dict] = {}
+    for i in range(0, len(unique_ids), COMPLETE_BATCH_SIZE):
+        outcomes.update(await run_transaction(
+            "reservations.complete_bulk", _complete_reservations_in_transaction, db, unique_ids[i:i + COMPLETE_BATCH_SIZE]
+        ))
+    
+    results = []
+    duplicates = 0
+    for item, error in zip(items, errors):
+        if error is None:
+            results.append(dict(item, **outcomes[item["reservation_id"]]))
+        elif error == _DUPLICATE_ERROR:
+            duplicates += 1
+            results.append(dict(item, success=False, duplicate=True, error=error))
+        else:
+            results.append(dict(item, success=False, error=error))
+    
+    completed = sum(1 for result in results if result["success"])
+    return {
+        "total": len(results),
+        "completed": completed,
+        "failed": len(results) - completed - duplicates,
+        "duplicates": duplicates,
+        "results": results,
+    }
@@ -0,0 +1,134 @@
+# 予約の一覧・検索・詳細取得サービス
+import base64
+import json
+from datetime import date
+from typing import List, Optional
+from google.cloud.firestore_v1 import FieldFilter
+from app.utils.firebase import get_firestore_db
+from app.utils.storage import run_storage
+from app.services.product_service import get_product_catalog
+from app.services.reservation_service import get_reservation, get_reservation_by_number
+
+def _encode_cursor(reservation: dict) -> str:
+    """ページの最後の予約から次のページのカーソルを作成"""
+    return base64.urlsafe_b64encode(
+        json.dumps([reservation.get("status"), reservation.get("reservation_number")]).encode()
+    ).decode()
+
+def _decode_cursor(cursor: str) -> list:
+    """カーソルを [ステータス, 予約番号] に復元（形式が正しくない場合は ValueError）"""
+    try:
+        last = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+    except (ValueError, TypeError):
+        raise ValueError("cursor が正しくありません")
+    if not (isinstance(last, list) and len(last) == 2 and all(v is None or isinstance(v, str) for v in last)):
+        raise ValueError("cursor が正しくありません")
+    return last
+
+async def get_reservations_by_slot(slot_id: str, limit: int = 50, cursor: Optional[str] = None) -> dict:
+    """予約枠の予約者一覧を取得（ステータス・予約番号の順、カーソルでページング）
+    
+    cursor には前のページの next_cursor を指定する。
+    """
+    db = get_firestore_db()
+    query = (
+        db.collection("reservations")
+        .where(filter=FieldFilter("slot_id", "==", slot_id))
+        .order_by("status")
+        .order_by("reservation_number")
+        .limit(limit)
+    )
+    if cursor:
+        last = _decode_cursor(cursor)
+        query = query.start_after({"status": last[0], "reservation_number": last[1]})
+    
+    docs = await run_storage("reservations.query", lambda: list(query.stream()))
+    reservations = [doc.to_dict() for doc in docs]
+    
+    next_cursor = None
+    if len(reservations) == limit:
+        last = reservations[-1]
+        next_cursor = _encode_cursor(last)
+    return {"slot_id": slot_id, "reservations": reservations, "next_cursor": next_cursor}
+
+async def search_reservations(
+    reservation_number: Optional[str] = None,
+    user_name: Optional[str] = None,
+    visit_date: Optional[date] = None,
+    status: Optional[str] = None,
+    limit: int = 100
+) -> List[dict]:
+    """予約を検索"""
+    db = get_firestore_db()
+    query = db.collection("reservations")
+    
+    # 検索条件を適用
+    if reservation_number:
+        query = query.where(filter=FieldFilter("reservation_number", "==", reservation_number))
+    if user_name:
+        query = query.where(filter=FieldFilter("user_name", "==", user_name))
+    if visit_date:
+        date_str = visit_date.isoformat() if isinstance(visit_date, date) else visit_date
+        query = query.where(filter=FieldFilter("visit_date", "==", date_str))
+    if status:
+        query = query.where(filter=FieldFilter("status", "==", status))
+    
+    query = query.limit(limit)
+    docs = await run_storage("reservations.query", lambda: list(query.stream()))
+    
+    reservations = []
+    for doc in docs:
+        reservations.append(doc.to_dict())
+    
+    # 作成日時の降順でソート
+    reservations.sort(key=lambda x: x.get("created_at", ""), reverse=True)
+    return reservations
+
+async def get_reservation_with_products(reservation_id: Optional[str] = None, reservation_number: Optional[str] = None) -> Optional[dict]:
+    """予約詳細を取得（商品情報を含む）
+    
+    商品明細に予約時点の商品名・説明・価格が保存されている場合は商品を参照しない。
+    保存されていない過去の予約のみ、キャッシュ済みの商品カタログから補う。
+    """
+    # 予約情報を取得
+    if reservation_id:
+        reservation = await get_reservation(reservation_id)
+    elif reservation_number:
+        reservation = await get_reservation_by_number(reservation_number)
+    else:
+        return None
+    
+    if not reservation:
+        return None
+    
+    products = [item for item in reservation.get("products", []) if item.get("product_id")]
+    needs_catalog = any("price" not in item or "description" not in item for item in products)
+    catalog = await get_product_catalog() if needs_catalog else {}
+    
+    product_details = []
+    for product_item in products:
+        product_info = product_item if "price" in product_item else catalog.get(product_item["product_id"])
+        if product_info:
+            description = product_item["description"] if "description" in product_item else (
+                catalog.get(product_item["product_id"], {}).get("description")
+            )
+            product_details.append({
+                "product_id": product_item["product_id"],
+                "name": product_info.get("name", ""),
+                "description": description,
+                "price": product_info.get("price", 0),
+                "quantity": product_item.get("quantity", 0),
+            })
+        else:
+            # 商品情報が取得できない場合は基本情報のみ
+            product_details.append({
+                "product_id": product_item["product_id"],
+                "name": "商品情報が見つかりません",
+                "description": "",
+                "price": 0,
+                "quantity": product_item.get("quantity", 0),
+            })
+    
+    # 予約情報に商品詳細を追加
+    reservation["product_details"] = product_details
+    return reservation
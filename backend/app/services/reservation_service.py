@@ -1,16 +1,40 @@
 # 予約管理サービス
+import hashlib
+import json
+import os
 import uuid
-from datetime import datetime, date, timedelta
-from typing import List, Optional, Dict, Tuple
+from datetime import datetime, date
+from typing import List, Optional, Dict
+from google.cloud import firestore
 from google.cloud.firestore_v1 import FieldFilter
 from app.utils.firebase import get_firestore_db
-from app.services.timeslot_service import (
-    increment_reserved_count, decrement_reserved_count,
-    generate_slot_id, get_timeslot
-)
-from app.services.product_service import (
-    increment_order_count, decrement_order_count
-)
+from app.utils.lease import acquire_lease, release_lease
+from app.utils.negative_cache import NegativeCache
+from app.utils.singleflight import InFlightConflictError, SingleFlight
+from app.utils.storage import run_storage, run_transaction
+from app.services.calendar_service import invalidate_calendar_cache
+from app.services.timeslot_service import generate_slot_id, missing_timeslots
+from app.services.product_service import adjust_cached_order_counts
+
+# 複数プロセス間でも同じユーザーの予約作成を1件に制限する場合は1（Firestoreのリースを使用）
+BOOKING_LEASE_ENABLED = os.getenv("BOOKING_LEASE_ENABLED", "0") == "1"
+BOOKING_LEASE_TTL = float(os.getenv("BOOKING_LEASE_TTL", "30"))
+
+# ユーザーごとの予約作成のシングルフライト（キー: 正規化したメールアドレス）
+_booking_flights = SingleFlight()
+
+# 存在しない予約番号（予約番号はどのインスタンスでも頻繁に作成されるため、作成済みキーのブルームフィルタは使わない）
+missing_reservation_numbers = NegativeCache("reservation_numbers")
+
+class BookingInProgressError(Exception):
+    """同じユーザーの別の予約作成が処理中の場合のエラー"""
+
+class DuplicateBookingError(ValueError):
+    """同じ日に同じユーザーの予約が既にある場合のエラー"""
+
+def email_hash(user_email: str) -> str:
+    """メールアドレスを正規化してハッシュ化（ドキュメントIDに使用）"""
+    return hashlib.sha256(user_email.strip().lower().encode("utf-8")).hexdigest()
 
 def generate_reservation_number() -> str:
     """予約番号を生成（例: JJS-2024-XXXXXX）"""
@@ -18,64 +42,136 @@ def generate_reservation_number() -> str:
     random_part = str(uuid.uuid4().hex[:6]).upper()
     return f"JJS-{year}-{random_part}"
 
-async def check_product_limits(products: List[dict], user_email: str) -> None:
-    """購入制限をチェック"""
-    db = get_firestore_db()
+def _to_date(value) -> date:
+    """日付または日時（ISO形式の文字列を含む）から日付を取り出す"""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+def validate_product_rules(product_data: dict, product_id: str, quantity: int,
+                           added_quantity: Optional[int] = None, pending_quantity: int = 0) -> None:
+    """商品1件の購入制限をチェック（違反時は ValueError）
+    
+    quantity は予約内の数量、added_quantity は今回の操作で受注数に加算される数量
+    （省略時は quantity）、pending_quantity はまだ受注数に反映されていない加算予定の数量
+    """
+    name = product_data.get("name", product_id)
+    if added_quantity is None:
+        added_quantity = quantity
+    
+    # 1予約あたりの最大購入数チェック
+    max_per_reservation = product_data.get("max_per_reservation", 0)
+    if max_per_reservation > 0 and quantity > max_per_reservation:
+        raise ValueError(f"商品 {name} は1予約あたり最大{max_per_reservation}個まで購入可能です")
+    
+    # 受注期間チェック
+    order_start = product_data.get("order_start_date")
+    order_end = product_data.get("order_end_date")
+    today = date.today()
     
-    for product_item in products:
-        product_id = product_item["product_id"]
-        quantity = product_item["quantity"]
-        
-        # 商品情報を取得
-        product_doc = db.collection("products").document(product_id).get()
-        if not product_doc.exists:
-            raise ValueError(f"商品ID {product_id} が見つかりません")
-        
-        product_data = product_doc.to_dict()
-        
-        # 1予約あたりの最大購入数チェック
-        max_per_reservation = product_data.get("max_per_reservation", 0)
-        if max_per_reservation > 0 and quantity > max_per_reservation:
-            raise ValueError(f"商品 {product_data.get('name', product_id)} は1予約あたり最大{max_per_reservation}個まで購入可能です")
-        
-        # 受注期間チェック
-        order_start = product_data.get("order_start_date")
-        order_end = product_data.get("order_end_date")
-        today = date.today()
-        
-        if order_start:
-            start_date = date.fromisoformat(order_start) if isinstance(order_start, str) else order_start
-            if today < start_date:
-                raise ValueError(f"商品 {product_data.get('name', product_id)} の受注期間はまだ開始していません")
-        
-        if order_end:
-            end_date = date.fromisoformat(order_end) if isinstance(order_end, str) else order_end
-            if today > end_date:
-                raise ValueError(f"商品 {product_data.get('name', product_id)} の受注期間は終了しています")
+    if order_start and today < _to_date(order_start):
+        raise ValueError(f"商品 {name} の受注期間はまだ開始していません")
+    
+    if order_end and today > _to_date(order_end):
+        raise ValueError(f"商品 {name} の受注期間は終了しています")
+    
+    # 総受注数の上限チェック
+    total_order_limit = product_data.get("total_order_limit")
+    if total_order_limit and total_order_limit > 0 and added_quantity > 0:
+        # current_order_countを使用（予約作成時に更新される）
+        current_count = product_data.get("current_order_count", 0) + pending_quantity
         
-        # 総受注数の上限チェック
-        total_order_limit = product_data.get("total_order_limit")
-        if total_order_limit and total_order_limit > 0:
-            # current_order_countを使用（予約作成時に更新される）
-            current_count = product_data.get("current_order_count", 0)
-            
-            if current_count + quantity > total_order_limit:
-                raise ValueError(f"商品 {product_data.get('name', product_id)} の受注上限に達しています（残り{total_order_limit - current_count}個）")
+        if current_count + added_quantity > total_order_limit:
+            raise ValueError(f"商品 {name} の受注上限に達しています（残り{max(0, total_order_limit - current_count)}個）")
+
+def _booking_fingerprint(reservation_data: dict) -> str:
+    """予約内容の同一性を判定するための文字列"""
+    visit_date = reservation_data["visit_date"]
+    return json.dumps({
+        "user_name": reservation_data.get("user_name"),
+        "user_phone": reservation_data.get("user_phone"),
+        "visit_date": visit_date.isoformat() if isinstance(visit_date, date) else visit_date,
+        "visit_time": reservation_data["visit_time"],
+        "products": sorted(sum_quantities(reservation_data.get("products", [])).items()),
+    }, sort_keys=True)
 
 async def create_reservation(reservation_data: dict) -> dict:
-    """予約を作成"""
-    db = get_firestore_db()
+    """予約を作成（同じユーザーの予約作成は同時に1件のみ）
+    
+    同じユーザーの同じ内容の予約作成が処理中の場合は、その結果を共有する。
+    内容が異なる場合は BookingInProgressError を送出する。
+    """
+    key = email_hash(reservation_data["user_email"])
+    try:
+        return await _booking_flights.run(
+            key, _booking_fingerprint(reservation_data),
+            lambda: _create_reservation_with_lease(key, reservation_data),
+        )
+    except InFlightConflictError:
+        raise BookingInProgressError("別の予約を処理中です。完了してから再度お試しください")
+
+async def _create_reservation_with_lease(key: str, reservation_data: dict) -> dict:
+    """複数プロセス間のリースを取得して予約を作成（リースが無効の場合はそのまま作成）"""
+    if not BOOKING_LEASE_ENABLED:
+        return await _create_reservation(reservation_data)
+    
+    lease_name = f"booking_{key}"
+    token = await run_storage("leases.acquire", acquire_lease, lease_name, BOOKING_LEASE_TTL, idempotent=False)
+    if token is None:
+        raise BookingInProgressError("別の予約を処理中です。完了してから再度お試しください")
+    try:
+        return await _create_reservation(reservation_data)
+    finally:
+        await run_storage("leases.release", release_lease, lease_name, token)
+
+def product_snapshot(product_id: str, quantity: int, product_data: Optional[dict]) -> dict:
+    """予約時点の商品名・説明・価格・小計を含む商品明細（予約後に商品情報が変わっても変更しない）"""
+    if not product_data:
+        return {"product_id": product_id, "quantity": quantity}
+    price = product_data.get("price", 0)
+    snapshot = {
+        "product_id": product_id,
+        "quantity": quantity,
+        "name": product_data.get("name", ""),
+        "price": price,
+        "line_total": price * quantity,
+    }
+    # 説明を保存していない過去の明細は、表示時に商品カタログから補う
+    if "description" in product_data:
+        snapshot["description"] = product_data["description"]
+    return snapshot
+
+def get_user_day_ref(db, user_email: str, visit_date: str):
+    """1人1日1件の予約を保証するキードキュメント（user_day/{メールアドレスのハッシュ}_{来店日}）"""
+    return db.collection("user_day").document(f"{email_hash(user_email)}_{visit_date}")
+
+def check_user_day(user_day_doc, reservation_id: Optional[str] = None) -> None:
+    """同じ日に別の予約がないかチェック"""
+    if user_day_doc.exists and user_day_doc.to_dict().get("reservation_id") != reservation_id:
+        raise DuplicateBookingError("同じ日の予約は1人1件までです")
+
+@firestore.transactional
+def _create_reservation_in_transaction(transaction, db, reservation_doc: dict,
+                                       schedule_rules: List[dict]) -> dict:
+    """予約・1日1件のキー・予約済み数・受注数を1トランザクションで作成（読み取りはすべて書き込みより前に行う）"""
+    from app.services.schedule_service import find_virtual_timeslot
     
-    # 予約番号を生成
-    reservation_number = generate_reservation_number()
+    slot_id = reservation_doc["slot_id"]
+    quantities = sum_quantities(reservation_doc["products"])
     
-    # 予約枠の確認
-    visit_date = reservation_data["visit_date"]
-    if isinstance(visit_date, str):
-        visit_date = date.fromisoformat(visit_date)
+    # キードキュメント・予約枠・商品をまとめて取得
+    user_day_ref = get_user_day_ref(db, reservation_doc["user_email"], reservation_doc["visit_date"])
+    slot_ref = db.collection("timeslots").document(slot_id)
+    refs = [user_day_ref, slot_ref] + [db.collection("products").document(product_id) for product_id in sorted(quantities)]
+    snapshots = {snapshot.reference.path: snapshot for snapshot in db.get_all(refs, transaction=transaction)}
     
-    slot_id = generate_slot_id(visit_date, reservation_data["visit_time"])
-    timeslot = await get_timeslot(slot_id)
+    check_user_day(snapshots[user_day_ref.path])
+    
+    # 予約枠の確認
+    slot_doc = snapshots.get(slot_ref.path)
+    timeslot = slot_doc.to_dict() if slot_doc and slot_doc.exists else find_virtual_timeslot(schedule_rules, slot_id)
     
     if not timeslot:
         raise ValueError("指定された日時の予約枠が存在しません")
@@ -90,42 +186,88 @@ async def create_reservation(reservation_data: dict) -> dict:
         raise ValueError("この時間帯は満席です")
     
     # 購入制限チェック
-    products = reservation_data.get("products", [])
-    if products:
-        await check_product_limits(products, reservation_data["user_email"])
+    products = {}
+    for product_id, quantity in quantities.items():
+        product_doc = snapshots.get(db.collection("products").document(product_id).path)
+        if not product_doc or not product_doc.exists:
+            raise ValueError(f"商品ID {product_id} が見つかりません")
+        products[product_id] = product_doc.to_dict()
+        validate_product_rules(products[product_id], product_id, quantity)
+    
+    # 商品明細に予約時点の商品名・説明・価格を保存（トランザクション内で読み取った商品情報を使用）
+    reservation_doc["products"] = [
+        product_snapshot(item["product_id"], item["quantity"], products[item["product_id"]])
+        for item in reservation_doc["products"]
+    ]
+    
+    now = reservation_doc["created_at"]
+    transaction.create(db.collection("reservations").document(reservation_doc["reservation_id"]), reservation_doc)
+    transaction.create(user_day_ref, {
+        "reservation_id": reservation_doc["reservation_id"],
+        "visit_date": reservation_doc["visit_date"],
+        "created_at": now,
+    })
+    
+    # 予約枠の予約済み数を増やす（仮想予約枠は最初の予約時に実体化する）
+    if slot_doc and slot_doc.exists:
+        transaction.update(slot_ref, {"reserved_count": reserved + 1, "updated_at": now})
+    else:
+        materialized = {key: value for key, value in timeslot.items() if key != "is_virtual"}
+        materialized.update({"reserved_count": 1, "created_at": now, "updated_at": now})
+        transaction.create(slot_ref, materialized)
+    
+    # 商品の受注数を増やす
+    for product_id, quantity in quantities.items():
+        transaction.update(db.collection("products").document(product_id), {
+            "current_order_count": products[product_id].get("current_order_count", 0) + quantity,
+            "updated_at": now,
+        })
+    
+    return reservation_doc
+
+async def _create_reservation(reservation_data: dict) -> dict:
+    """予約を作成（予約枠の定員・購入制限・1人1日1件を1トランザクションで確認）"""
+    from app.services.schedule_service import get_schedule_rules
+    
+    db = get_firestore_db()
+    
+    visit_date = reservation_data["visit_date"]
+    if isinstance(visit_date, str):
+        visit_date = date.fromisoformat(visit_date)
     
     # 予約データを作成
+    products = reservation_data.get("products", [])
     reservation_id = str(uuid.uuid4())
     reservation_doc = {
         "reservation_id": reservation_id,
-        "reservation_number": reservation_number,
+        "reservation_number": generate_reservation_number(),
         "user_email": reservation_data["user_email"],
         "user_name": reservation_data["user_name"],
         "user_phone": reservation_data["user_phone"],
         "visit_date": visit_date.isoformat(),
         "visit_time": reservation_data["visit_time"],
+        "slot_id": generate_slot_id(visit_date, reservation_data["visit_time"]),
         "status": "confirmed",
         "products": [{"product_id": p["product_id"], "quantity": p["quantity"]} for p in products],
         "created_at": datetime.now().isoformat(),
         "updated_at": datetime.now().isoformat(),
     }
     
-    # Firestoreに保存
-    db.collection("reservations").document(reservation_id).set(reservation_doc)
-    
-    # 予約枠の予約済み数を増やす
-    await increment_reserved_count(slot_id)
-    
-    # 商品の受注数を増やす
-    for product_item in products:
-        await increment_order_count(product_item["product_id"], product_item["quantity"])
-    
-    return reservation_doc
+    # 仮想予約枠の判定用にルールを先に取得（通常はキャッシュ済みのためFirestoreへのアクセスなし）
+    schedule_rules = await get_schedule_rules()
+    result = await run_transaction(
+        "reservations.create", _create_reservation_in_transaction, db, reservation_doc, schedule_rules
+    )
+    missing_reservation_numbers.mark_exists(reservation_doc["reservation_number"])
+    missing_timeslots.mark_exists(reservation_doc["slot_id"])
+    adjust_cached_order_counts(sum_quantities(result["products"]))
+    invalidate_calendar_cache([visit_date])
+    return result
 
 async def get_reservation(reservation_id: str) -> Optional[dict]:
     """予約を取得（IDで）"""
     db = get_firestore_db()
-    doc = db.collection("reservations").document(reservation_id).get()
+    doc = await run_storage("reservations.get", db.collection("reservations").document(reservation_id).get)
     
     if doc.exists:
         return doc.to_dict()
@@ -133,14 +275,18 @@ async def get_reservation(reservation_id: str) -> Optional[dict]:
 
 async def get_reservation_by_number(reservation_number: str) -> Optional[dict]:
     """予約を取得（予約番号で）"""
+    if missing_reservation_numbers.is_missing(reservation_number):
+        return None
+    
     db = get_firestore_db()
     query = db.collection("reservations").where(
         filter=FieldFilter("reservation_number", "==", reservation_number)
     ).limit(1)
-    docs = list(query.stream())
+    docs = await run_storage("reservations.query", lambda: list(query.stream()))
     
     if docs:
         return docs[0].to_dict()
+    missing_reservation_numbers.mark_missing(reservation_number)
     return None
 
 async def get_reservations_by_email(user_email: str) -> List[dict]:
@@ -149,7 +295,7 @@ async def get_reservations_by_email(user_email: str) -> List[dict]:
     query = db.collection("reservations").where(
         filter=FieldFilter("user_email", "==", user_email)
     )
-    docs = query.stream()
+    docs = await run_storage("reservations.query", lambda: list(query.stream()))
     
     reservations = []
     for doc in docs:
@@ -164,7 +310,7 @@ async def get_all_reservations(limit: int = 100) -> List[dict]:
     db = get_firestore_db()
     # order_byはインデックスが必要なため、簡易実装では作成日時の降順で取得
     query = db.collection("reservations").limit(limit)
-    docs = query.stream()
+    docs = await run_storage("reservations.query", lambda: list(query.stream()))
     
     reservations = []
     for doc in docs:
@@ -174,235 +320,11 @@ async def get_all_reservations(limit: int = 100) -> List[dict]:
     reservations.sort(key=lambda x: x.get("created_at", ""), reverse=True)
     return reservations
 
-async def can_modify_reservation(visit_date: date) -> bool:
-    """予約変更が可能かチェック（来店日の前日まで変更可能）"""
-    today = date.today()
-    # 来店日の前日まで変更可能
-    return visit_date > today + timedelta(days=1)
-
-async def update_reservation(reservation_id: str, update_data: dict) -> Optional[dict]:
-    """予約を更新"""
-    db = get_firestore_db()
-    doc_ref = db.collection("reservations").document(reservation_id)
-    doc = doc_ref.get()
-    
-    if not doc.exists:
-        return None
-    
-    old_data = doc.to_dict()
-    
-    # キャンセル済みの予約は変更不可
-    if old_data.get("status") == "cancelled":
-        raise ValueError("キャンセル済みの予約は変更できません")
-    
-    # 日時変更の制約チェック
-    if "visit_date" in update_data or "visit_time" in update_data:
-        old_visit_date = date.fromisoformat(old_data["visit_date"])
-        if not await can_modify_reservation(old_visit_date):
-            raise ValueError("予約変更は来店日の前日まで可能です")
-        
-        # 新しい予約枠の確認
-        new_date = update_data.get("visit_date", old_data["visit_date"])
-        new_time = update_data.get("visit_time", old_data["visit_time"])
-        if isinstance(new_date, str):
-            new_date = date.fromisoformat(new_date)
-        
-        new_slot_id = generate_slot_id(new_date, new_time)
-        new_timeslot = await get_timeslot(new_slot_id)
-        
-        if not new_timeslot:
-            raise ValueError("変更先の予約枠が存在しません")
-        
-        if not new_timeslot.get("is_available", False):
-            raise ValueError("変更先の予約枠は利用できません")
-        
-        capacity = new_timeslot.get("capacity", 0)
-        reserved = new_timeslot.get("reserved_count", 0)
-        
-        if reserved >= capacity:
-            raise ValueError("変更先の時間帯は満席です")
-        
-        # 古い予約枠の予約済み数を減らす
-        old_slot_id = generate_slot_id(
-            date.fromisoformat(old_data["visit_date"]),
-            old_data["visit_time"]
-        )
-        await decrement_reserved_count(old_slot_id)
-        
-        # 新しい予約枠の予約済み数を増やす
-        await increment_reserved_count(new_slot_id)
-        
-        # 古い商品の受注数を減らす
-        old_products = old_data.get("products", [])
-        for product_item in old_products:
-            await decrement_order_count(product_item["product_id"], product_item["quantity"])
-        
-        # 新しい商品の受注数を増やす
-        new_products = update_data.get("products", [])
-        for product_item in new_products:
-            await increment_order_count(product_item["product_id"], product_item["quantity"])
-    
-    # 商品変更時の購入制限チェック
-    if "products" in update_data:
-        products = update_data["products"]
-        if isinstance(products, list) and len(products) > 0:
-            # 辞書形式に変換
-            product_list = []
-            for p in products:
-                if isinstance(p, dict):
-                    product_list.append(p)
-                else:
-                    product_list.append({"product_id": p.product_id, "quantity": p.quantity})
-            await check_product_limits(product_list, old_data["user_email"])
-    
-    update_data["updated_at"] = datetime.now().isoformat()
-    doc_ref.update(update_data)
-    
-    return doc_ref.get().to_dict()
-
-async def cancel_reservation(reservation_id: str) -> Optional[dict]:
-    """予約をキャンセル"""
-    db = get_firestore_db()
-    doc_ref = db.collection("reservations").document(reservation_id)
-    doc = doc_ref.get()
-    
-    if not doc.exists:
-        return None
-    
-    reservation_data = doc.to_dict()
-    
-    # 既にキャンセル済みの場合はエラー
-    if reservation_data.get("status") == "cancelled":
-        raise ValueError("この予約は既にキャンセル済みです")
-    
-    # 予約枠の予約済み数を減らす
-    slot_id = generate_slot_id(
-        date.fromisoformat(reservation_data["visit_date"]),
-        reservation_data["visit_time"]
-    )
-    await decrement_reserved_count(slot_id)
-    
-    # 商品の受注数を減らす
-    products = reservation_data.get("products", [])
-    for product_item in products:
-        await decrement_order_count(product_item["product_id"], product_item["quantity"])
-    
-    # ステータスをキャンセルに更新
-    doc_ref.update({
-        "status": "cancelled",
-        "updated_at": datetime.now().isoformat(),
-    })
-    
-    return doc_ref.get().to_dict()
-
-async def search_reservations(
-    reservation_number: Optional[str] = None,
-    user_name: Optional[str] = None,
-    visit_date: Optional[date] = None,
-    status: Optional[str] = None,
-    limit: int = 100
-) -> List[dict]:
-    """予約を検索"""
-    db = get_firestore_db()
-    query = db.collection("reservations")
-    
-    # 検索条件を適用
-    if reservation_number:
-        query = query.where(filter=FieldFilter("reservation_number", "==", reservation_number))
-    if user_name:
-        query = query.where(filter=FieldFilter("user_name", "==", user_name))
-    if visit_date:
-        date_str = visit_date.isoformat() if isinstance(visit_date, date) else visit_date
-        query = query.where(filter=FieldFilter("visit_date", "==", date_str))
-    if status:
-        query = query.where(filter=FieldFilter("status", "==", status))
-    
-    query = query.limit(limit)
-    docs = query.stream()
-    
-    reservations = []
-    for doc in docs:
-        reservations.append(doc.to_dict())
-    
-    # 作成日時の降順でソート
-    reservations.sort(key=lambda x: x.get("created_at", ""), reverse=True)
-    return reservations
-
-async def get_product_details(product_id: str) -> Optional[dict]:
-    """商品詳細情報を取得"""
-    db = get_firestore_db()
-    product_doc = db.collection("products").document(product_id).get()
-    
-    if product_doc.exists:
-        return product_doc.to_dict()
-    return None
-
-async def get_reservation_with_products(reservation_id: Optional[str] = None, reservation_number: Optional[str] = None) -> Optional[dict]:
-    """予約詳細を取得（商品情報を含む）"""
-    # 予約情報を取得
-    if reservation_id:
-        reservation = await get_reservation(reservation_id)
-    elif reservation_number:
-        reservation = await get_reservation_by_number(reservation_number)
-    else:
-        return None
-    
-    if not reservation:
-        return None
-    
-    # 商品情報を取得して追加
-    products = reservation.get("products", [])
-    product_details = []
-    
-    for product_item in products:
-        product_id = product_item.get("product_id")
-        if product_id:
-            product_info = await get_product_details(product_id)
-            if product_info:
-                product_details.append({
-                    "product_id": product_id,
-                    "name": product_info.get("name", ""),
-                    "description": product_info.get("description", ""),
-                    "price": product_info.get("price", 0),
-                    "quantity": product_item.get("quantity", 0),
-                })
-            else:
-                # 商品情報が取得できない場合は基本情報のみ
-                product_details.append({
-                    "product_id": product_id,
-                    "name": "商品情報が見つかりません",
-                    "description": "",
-                    "price": 0,
-                    "quantity": product_item.get("quantity", 0),
-                })
-    
-    # 予約情報に商品詳細を追加
-    reservation["product_details"] = product_details
-    return reservation
-
-async def complete_reservation(reservation_id: str) -> Optional[dict]:
-    """予約を完了状態に更新"""
-    db = get_firestore_db()
-    doc_ref = db.collection("reservations").document(reservation_id)
-    doc = doc_ref.get()
-    
-    if not doc.exists:
-        return None
-    
-    reservation_data = doc.to_dict()
-    
-    # 既に完了済みの場合はエラー
-    if reservation_data.get("status") == "completed":
-        raise ValueError("この予約は既に完了済みです")
-    
-    # キャンセル済みの予約は完了不可
-    if reservation_data.get("status") == "cancelled":
-        raise ValueError("キャンセル済みの予約は完了できません")
-    
-    # ステータスを完了に更新
-    doc_ref.update({
-        "status": "completed",
-        "updated_at": datetime.now().isoformat(),
-    })
-    
-    return doc_ref.get().to_dict()
+def sum_quantities(products: List[dict]) -> Dict[str, int]:
+    """商品リストを商品IDごとの数量に集計"""
+    quantities: Dict[str, int] = {}
+    for item in products or []:
+        product_id = item["product_id"] if isinstance(item, dict) else item.product_id
+        quantity = item["quantity"] if isinstance(item, dict) else item.quantity
+        quantities[product_id] = quantities.get(product_id, 0) + quantity
+    return quantities
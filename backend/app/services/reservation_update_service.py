@@ -0,0 +1,274 @@
+# 予約の変更・キャンセルサービス
+from datetime import datetime, date, timedelta
+from typing import List, Optional, Tuple
+from google.cloud import firestore
+from app.utils.firebase import get_firestore_db
+from app.utils.storage import run_transaction
+from app.services.calendar_service import invalidate_calendar_cache
+from app.services.timeslot_service import generate_slot_id, missing_timeslots
+from app.services.product_service import adjust_cached_order_counts
+from app.services.reservation_service import (
+    check_user_day, get_user_day_ref, product_snapshot, sum_quantities, validate_product_rules,
+)
+
+def _can_modify(visit_date: date) -> bool:
+    """予約変更が可能かチェック（来店日の前日まで変更可能）"""
+    today = date.today()
+    # 来店日の前日まで変更可能
+    return visit_date > today + timedelta(days=1)
+
+@firestore.transactional
+def _update_reservation_in_transaction(transaction, db, reservation_id: str, update_data: dict,
+                                       schedule_rules: List[dict]) -> Optional[Tuple[dict, dict]]:
+    """予約の変更差分を1トランザクションで適用（読み取りはすべて書き込みより前に行う）
+    
+    戻り値は (変更後の予約, 変更前の予約)
+    """
+    from app.services.schedule_service import find_virtual_timeslot
+    
+    reservation_ref = db.collection("reservations").document(reservation_id)
+    doc = reservation_ref.get(transaction=transaction)
+    
+    if not doc.exists:
+        return None
+    
+    old_data = doc.to_dict()
+    
+    # キャンセル済みの予約は変更不可
+    if old_data.get("status") == "cancelled":
+        raise ValueError("キャンセル済みの予約は変更できません")
+    
+    old_date = date.fromisoformat(old_data["visit_date"])
+    old_slot_id = generate_slot_id(old_date, old_data["visit_time"])
+    new_date = update_data.get("visit_date", old_data["visit_date"])
+    if isinstance(new_date, str):
+        new_date = date.fromisoformat(new_date)
+    new_slot_id = generate_slot_id(new_date, update_data.get("visit_time", old_data["visit_time"]))
+    slot_changed = new_slot_id != old_slot_id
+    date_changed = new_date != old_date and bool(old_data.get("user_email"))
+    
+    # 日時変更の制約チェック
+    if slot_changed and not _can_modify(old_date):
+        raise ValueError("予約変更は来店日の前日まで可能です")
+    
+    # 商品ごとの数量差分（変更のない商品は触らない）
+    old_quantities = sum_quantities(old_data.get("products", []))
+    new_quantities = sum_quantities(update_data["products"]) if "products" in update_data else old_quantities
+    product_deltas = {
+        product_id: new_quantities.get(product_id, 0) - old_quantities.get(product_id, 0)
+        for product_id in set(old_quantities) | set(new_quantities)
+    }
+    product_deltas = {product_id: delta for product_id, delta in product_deltas.items() if delta != 0}
+    
+    # 変更対象の予約枠・商品をまとめて取得
+    refs = []
+    if slot_changed:
+        refs.append(db.collection("timeslots").document(old_slot_id))
+        refs.append(db.collection("timeslots").document(new_slot_id))
+    if date_changed:
+        # 1人1日1件のキーを変更先の日付に移す
+        old_user_day_ref = get_user_day_ref(db, old_data["user_email"], old_data["visit_date"])
+        new_user_day_ref = get_user_day_ref(db, old_data["user_email"], new_date.isoformat())
+        refs += [old_user_day_ref, new_user_day_ref]
+    refs += [db.collection("products").document(product_id) for product_id in sorted(product_deltas)]
+    snapshots = {}
+    if refs:
+        for snapshot in db.get_all(refs, transaction=transaction):
+            snapshots[snapshot.reference.path] = snapshot
+    
+    now = datetime.now().isoformat()
+    writes = []
+    
+    if slot_changed:
+        # 新しい予約枠の確認
+        new_slot_ref = db.collection("timeslots").document(new_slot_id)
+        new_slot_doc = snapshots.get(new_slot_ref.path)
+        if new_slot_doc and new_slot_doc.exists:
+            new_timeslot = new_slot_doc.to_dict()
+        else:
+            new_timeslot = find_virtual_timeslot(schedule_rules, new_slot_id)
+        
+        if not new_timeslot:
+            raise ValueError("変更先の予約枠が存在しません")
+        
+        if not new_timeslot.get("is_available", False):
+            raise ValueError("変更先の予約枠は利用できません")
+        
+        if new_timeslot.get("reserved_count", 0) >= new_timeslot.get("capacity", 0):
+            raise ValueError("変更先の時間帯は満席です")
+        
+        if new_slot_doc and new_slot_doc.exists:
+            writes.append((new_slot_ref, {
+                "reserved_count": new_timeslot.get("reserved_count", 0) + 1,
+                "updated_at": now,
+            }))
+        else:
+            # 仮想予約枠は最初の予約時に実体化する
+            materialized = {key: value for key, value in new_timeslot.items() if key != "is_virtual"}
+            materialized.update({"reserved_count": 1, "created_at": now, "updated_at": now})
+            transaction.create(new_slot_ref, materialized)
+        
+        old_slot_ref = db.collection("timeslots").document(old_slot_id)
+        old_slot_doc = snapshots.get(old_slot_ref.path)
+        if old_slot_doc and old_slot_doc.exists:
+            writes.append((old_slot_ref, {
+                "reserved_count": max(0, old_slot_doc.to_dict().get("reserved_count", 0) - 1),
+                "updated_at": now,
+            }))
+    
+    # 商品の受注数を差分だけ更新（購入制限は変更後の合計でチェック）
+    product_sources = {}
+    for product_id, delta in sorted(product_deltas.items()):
+        product_ref = db.collection("products").document(product_id)
+        product_doc = snapshots.get(product_ref.path)
+        if not product_doc or not product_doc.exists:
+            if delta > 0:
+                raise ValueError(f"商品ID {product_id} が見つかりません")
+            continue
+        
+        product_data = product_doc.to_dict()
+        product_sources[product_id] = product_data
+        if delta > 0:
+            validate_product_rules(product_data, product_id, new_quantities[product_id], added_quantity=delta)
+        writes.append((product_ref, {
+            "current_order_count": max(0, product_data.get("current_order_count", 0) + delta),
+            "updated_at": now,
+        }))
+    
+    if date_changed:
+        check_user_day(snapshots[new_user_day_ref.path], reservation_id)
+        old_user_day_doc = snapshots[old_user_day_ref.path]
+        if old_user_day_doc.exists and old_user_day_doc.to_dict().get("reservation_id") == reservation_id:
+            transaction.delete(old_user_day_ref)
+        transaction.set(new_user_day_ref, {
+            "reservation_id": reservation_id,
+            "visit_date": new_date.isoformat(),
+            "created_at": now,
+        })
+    
+    reservation_update = dict(update_data)
+    if "products" in update_data:
+        # 予約済みの商品は予約時点の商品名・価格を引き継ぎ、追加された商品は現在の商品情報を保存する
+        booked = {item["product_id"]: item for item in old_data.get("products", []) if "price" in item}
+        reservation_update["products"] = [
+            product_snapshot(
+                item["product_id"], item["quantity"],
+                booked.get(item["product_id"]) or product_sources.get(item["product_id"]),
+            )
+            for item in update_data["products"]
+        ]
+    if slot_changed:
+        reservation_update["slot_id"] = new_slot_id
+    reservation_update["updated_at"] = now
+    transaction.update(reservation_ref, reservation_update)
+    for ref, data in writes:
+        transaction.update(ref, data)
+    
+    merged = dict(old_data)
+    merged.update(reservation_update)
+    return merged, old_data
+
+async def update_reservation(reservation_id: str, update_data: dict) -> Optional[dict]:
+    """予約を更新（予約枠・商品の受注数の差分を1トランザクションで適用）"""
+    from app.services.schedule_service import get_schedule_rules
+    
+    db = get_firestore_db()
+    
+    # 仮想予約枠の判定用にルールを先に取得（通常はキャッシュ済みのためFirestoreへのアクセスなし）
+    schedule_rules = await get_schedule_rules() if ("visit_date" in update_data or "visit_time" in update_data) else []
+    
+    result = await run_transaction(
+        "reservations.update", _update_reservation_in_transaction, db, reservation_id, update_data, schedule_rules
+    )
+    if not result:
+        return None
+    
+    merged, old_data = result
+    old_quantities = sum_quantities(old_data.get("products", []))
+    new_quantities = sum_quantities(merged.get("products", []))
+    adjust_cached_order_counts({
+        product_id: new_quantities.get(product_id, 0) - old_quantities.get(product_id, 0)
+        for product_id in set(old_quantities) | set(new_quantities)
+    })
+    if (merged["visit_date"], merged["visit_time"]) != (old_data["visit_date"], old_data["visit_time"]):
+        missing_timeslots.mark_exists(generate_slot_id(date.fromisoformat(merged["visit_date"]), merged["visit_time"]))
+        invalidate_calendar_cache([
+            date.fromisoformat(old_data["visit_date"]),
+            date.fromisoformat(merged["visit_date"]),
+        ])
+    return merged
+
+def _check_cancellable(reservation_data: dict) -> None:
+    """キャンセル可能かチェック"""
+    # 既にキャンセル済みの場合はエラー
+    if reservation_data.get("status") == "cancelled":
+        raise ValueError("この予約は既にキャンセル済みです")
+
+@firestore.transactional
+def _cancel_reservation_in_transaction(transaction, db, reservation_id: str) -> Optional[dict]:
+    """予約のキャンセル・予約済み数と受注数の減算・1日1件のキーの解放を1トランザクションで行う"""
+    reservation_ref = db.collection("reservations").document(reservation_id)
+    doc = reservation_ref.get(transaction=transaction)
+    
+    if not doc.exists:
+        return None
+    
+    reservation_data = doc.to_dict()
+    _check_cancellable(reservation_data)
+    
+    # 予約枠・商品・1日1件のキーをまとめて取得
+    slot_ref = db.collection("timeslots").document(generate_slot_id(
+        date.fromisoformat(reservation_data["visit_date"]), reservation_data["visit_time"]
+    ))
+    quantities = sum_quantities(reservation_data.get("products", []))
+    product_refs = [db.collection("products").document(product_id) for product_id in sorted(quantities)]
+    refs = [slot_ref] + product_refs
+    user_day_ref = None
+    if reservation_data.get("user_email"):
+        user_day_ref = get_user_day_ref(db, reservation_data["user_email"], reservation_data["visit_date"])
+        refs.append(user_day_ref)
+    snapshots = {snapshot.reference.path: snapshot for snapshot in db.get_all(refs, transaction=transaction)}
+    
+    now = datetime.now().isoformat()
+    update_data = {"status": "cancelled", "updated_at": now}
+    transaction.update(reservation_ref, update_data)
+    
+    # 削除済みの予約枠・商品のカウンターは戻さない（0未満にはしない）
+    slot_doc = snapshots[slot_ref.path]
+    if slot_doc.exists:
+        transaction.update(slot_ref, {
+            "reserved_count": max(0, (slot_doc.get("reserved_count") or 0) - 1),
+            "updated_at": now,
+        })
+    for product_ref in product_refs:
+        product_doc = snapshots[product_ref.path]
+        if product_doc.exists:
+            transaction.update(product_ref, {
+                "current_order_count": max(0, (product_doc.get("current_order_count") or 0) - quantities[product_ref.id]),
+                "updated_at": now,
+            })
+    
+    # 同じ日に再び予約できるよう1日1件のキーを解放（別の予約のキーは削除しない）
+    if user_day_ref is not None:
+        user_day_doc = snapshots[user_day_ref.path]
+        if user_day_doc.exists and user_day_doc.to_dict().get("reservation_id") == reservation_id:
+            transaction.delete(user_day_ref)
+    
+    reservation_data.update(update_data)
+    return reservation_data
+
+async def cancel_reservation(reservation_id: str) -> Optional[dict]:
+    """予約をキャンセル（ステータス・予約済み数・受注数・1日1件のキーを1トランザクションで更新）"""
+    db = get_firestore_db()
+    reservation_data = await run_transaction(
+        "reservations.cancel", _cancel_reservation_in_transaction, db, reservation_id
+    )
+    
+    if reservation_data is None:
+        return None
+    
+    adjust_cached_order_counts({
+        product_id: -quantity for product_id, quantity in sum_quantities(reservation_data.get("products", [])).items()
+    })
+    invalidate_calendar_cache([date.fromisoformat(reservation_data["visit_date"])])
+    return reservation_data
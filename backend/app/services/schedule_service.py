@@ -0,0 +1,232 @@
+# 定期スケジュール（予約枠の生成ルール）管理サービス
+import uuid
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+from google.api_core.exceptions import Conflict, NotFound
+from app.utils.cache import TTLCache
+from app.utils.firebase import get_firestore_db
+from app.utils.firestore_write import update_document
+from app.utils.storage import run_storage
+from app.utils.request_cache import request_cached
+from app.services.calendar_service import clear_calendar_cache
+from app.services.timeslot_service import generate_slot_id, missing_timeslots
+
+# ルール一覧は件数が少なく参照頻度が高いため、短時間キャッシュする
+RULES_CACHE_TTL = 30
+_rules_cache = TTLCache(ttl=RULES_CACHE_TTL)
+
+def _to_minutes(time_str: str) -> int:
+    """HH:MM形式の時刻を0時からの分数に変換"""
+    hours, minutes = time_str.split(":")
+    return int(hours) * 60 + int(minutes)
+
+def _serialize_rule_fields(data: dict) -> dict:
+    """日付フィールドを文字列に変換"""
+    result = dict(data)
+    for field in ("start_date", "end_date"):
+        if isinstance(result.get(field), date):
+            result[field] = result[field].isoformat()
+    if "exclude_dates" in result and result["exclude_dates"] is not None:
+        result["exclude_dates"] = sorted(
+            d.isoformat() if isinstance(d, date) else d for d in result["exclude_dates"]
+        )
+    return result
+
+def _on_rules_changed() -> None:
+    """ルール変更時にキャッシュを破棄"""
+    _rules_cache.clear()
+    clear_calendar_cache()
+
+async def create_schedule_rule(rule_data: dict) -> dict:
+    """定期スケジュールを作成"""
+    db = get_firestore_db()
+    rule_id = str(uuid.uuid4())
+
+    rule_doc = _serialize_rule_fields({
+        "rule_id": rule_id,
+        "name": rule_data.get("name", ""),
+        "start_date": rule_data["start_date"],
+        "end_date": rule_data.get("end_date"),
+        "weekdays": sorted(set(rule_data["weekdays"])),
+        "start_time": rule_data["start_time"],
+        "end_time": rule_data["end_time"],
+        "interval_minutes": rule_data["interval_minutes"],
+        "capacity": rule_data["capacity"],
+        "exclude_dates": rule_data.get("exclude_dates", []),
+        "is_active": rule_data.get("is_active", True),
+        "created_at": datetime.now().isoformat(),
+        "updated_at": datetime.now().isoformat(),
+    })
+
+    await run_storage("schedule_rules.create", db.collection("schedule_rules").document(rule_id).set, rule_doc)
+    _on_rules_changed()
+    return rule_doc
+
+@request_cached
+async def get_schedule_rules(include_inactive: bool = False) -> List[dict]:
+    """定期スケジュール一覧を取得（作成日時の昇順）"""
+    rules = _rules_cache.get("all")
+    if rules is None:
+        db = get_firestore_db()
+        rules = await run_storage(
+            "schedule_rules.query", lambda: [doc.to_dict() for doc in db.collection("schedule_rules").stream()]
+        )
+        rules.sort(key=lambda x: x.get("created_at", ""))
+        _rules_cache.set("all", rules)
+
+    if include_inactive:
+        return list(rules)
+    return [rule for rule in rules if rule.get("is_active", False)]
+
+async def get_schedule_rule(rule_id: str) -> Optional[dict]:
+    """定期スケジュールを取得"""
+    db = get_firestore_db()
+    doc = await run_storage("schedule_rules.get", db.collection("schedule_rules").document(rule_id).get)
+
+    if doc.exists:
+        return doc.to_dict()
+    return None
+
+async def update_schedule_rule(rule_id: str, update_data: dict) -> Optional[dict]:
+    """定期スケジュールを更新"""
+    db = get_firestore_db()
+    doc_ref = db.collection("schedule_rules").document(rule_id)
+
+    update_data = _serialize_rule_fields(update_data)
+    if "weekdays" in update_data:
+        update_data["weekdays"] = sorted(set(update_data["weekdays"]))
+    update_data["updated_at"] = datetime.now().isoformat()
+
+    def check_date_range(rule: dict) -> None:
+        # 一部の項目のみの更新でも、マージ後の期間が逆転しないことを確認する
+        merged = dict(rule, **update_data)
+        if merged.get("end_date") and merged["end_date"] < merged["start_date"]:
+            raise ValueError("end_date は start_date 以降の日付を指定してください")
+
+    # 更新後の再読み取りは行わず、更新前の内容にマージした結果を返す
+    result = await run_storage("schedule_rules.update", update_document, doc_ref, update_data, check=check_date_range)
+    if result is None:
+        return None
+    _on_rules_changed()
+    return result
+
+async def delete_schedule_rule(rule_id: str) -> bool:
+    """定期スケジュールを削除（実体化済みの予約枠はそのまま残る）"""
+    db = get_firestore_db()
+    doc_ref = db.collection("schedule_rules").document(rule_id)
+
+    # 存在確認と削除を1回の書き込みで行う（存在しない場合はNotFound）
+    try:
+        await run_storage("schedule_rules.delete", doc_ref.delete, option=db.write_option(exists=True))
+    except NotFound:
+        return False
+    _on_rules_changed()
+    return True
+
+def _rule_times(rule: dict) -> List[str]:
+    """ルールの1日分の開始時刻一覧（終了時刻は含まない）"""
+    start = _to_minutes(rule["start_time"])
+    end = _to_minutes(rule["end_time"])
+    interval = rule.get("interval_minutes", 0)
+    if interval <= 0:
+        return []
+    return [f"{m // 60:02d}:{m % 60:02d}" for m in range(start, end, interval)]
+
+def _rule_applies(rule: dict, date_obj: date) -> bool:
+    """ルールが指定日に適用されるかどうか"""
+    date_str = date_obj.isoformat()
+    if date_str < rule.get("start_date", ""):
+        return False
+    if rule.get("end_date") and date_str > rule["end_date"]:
+        return False
+    if date_obj.weekday() not in rule.get("weekdays", []):
+        return False
+    return date_str not in rule.get("exclude_dates", [])
+
+def build_virtual_timeslots(rules: List[dict], start_date: date, end_date: date) -> Dict[str, dict]:
+    """ルールから指定期間の仮想予約枠を生成（キー: 予約枠ID）
+
+    複数のルールが同じ予約枠を生成する場合は、先に作成されたルールを優先する。
+    """
+    virtual_slots = {}
+    if not rules:
+        return virtual_slots
+
+    rule_times = [(rule, _rule_times(rule)) for rule in rules]
+    current_date = start_date
+    while current_date <= end_date:
+        for rule, times in rule_times:
+            if not _rule_applies(rule, current_date):
+                continue
+            for time in times:
+                slot_id = generate_slot_id(current_date, time)
+                if slot_id in virtual_slots:
+                    continue
+                virtual_slots[slot_id] = {
+                    "slot_id": slot_id,
+                    "date": current_date.isoformat(),
+                    "time": time,
+                    "capacity": rule["capacity"],
+                    "reserved_count": 0,
+                    "is_available": True,
+                    "is_virtual": True,
+                    "rule_id": rule["rule_id"],
+                    "created_at": rule.get("created_at"),
+                    "updated_at": rule.get("updated_at"),
+                }
+        current_date += timedelta(days=1)
+    return virtual_slots
+
+def find_virtual_timeslot(rules: List[dict], slot_id: str) -> Optional[dict]:
+    """ルール一覧から予約枠IDに対応する仮想予約枠を求める"""
+    try:
+        date_obj = date.fromisoformat(slot_id.split("_", 1)[0])
+    except ValueError:
+        return None
+    return build_virtual_timeslots(rules, date_obj, date_obj).get(slot_id)
+
+async def get_virtual_timeslots(start_date: date, end_date: date) -> Dict[str, dict]:
+    """有効なルールから指定期間の仮想予約枠を生成（キー: 予約枠ID）"""
+    return build_virtual_timeslots(await get_schedule_rules(), start_date, end_date)
+
+async def get_virtual_timeslot(slot_id: str) -> Optional[dict]:
+    """予約枠IDに対応する仮想予約枠を取得"""
+    return find_virtual_timeslot(await get_schedule_rules(), slot_id)
+
+def merge_virtual_timeslots(stored_slots: List[dict], virtual_slots: Dict[str, dict]) -> List[dict]:
+    """保存済みの予約枠（上書き）と仮想予約枠をマージ"""
+    if not virtual_slots:
+        return stored_slots
+
+    merged = dict(virtual_slots)
+    for slot in stored_slots:
+        merged[slot.get("slot_id")] = slot
+
+    timeslots = list(merged.values())
+    timeslots.sort(key=lambda x: (x.get("date", ""), x.get("time", "")))
+    return timeslots
+
+async def materialize_timeslot(slot_id: str, overrides: Optional[dict] = None) -> Optional[dict]:
+    """仮想予約枠をFirestoreに実体化（既に存在する場合は保存済みの予約枠を返す）"""
+    db = get_firestore_db()
+    doc_ref = db.collection("timeslots").document(slot_id)
+
+    virtual_slot = await get_virtual_timeslot(slot_id)
+    if not virtual_slot:
+        doc = await run_storage("timeslots.get", doc_ref.get)
+        return doc.to_dict() if doc.exists else None
+
+    now = datetime.now().isoformat()
+    timeslot_data = {
+        key: value for key, value in virtual_slot.items() if key != "is_virtual"
+    }
+    timeslot_data.update({"created_at": now, "updated_at": now})
+    timeslot_data.update(overrides or {})
+
+    try:
+        # 同時に実体化された場合に予約済み数を上書きしないよう、作成のみ行う
+        await run_storage("timeslots.create", doc_ref.create, timeslot_data)
+        missing_timeslots.mark_exists(slot_id)
+        return timeslot_data
+    except Conflict:
+        return (await run_storage("timeslots.get", doc_ref.get)).to_dict()
@@ -0,0 +1,81 @@
+# 予約検索サービス（Firestoreの変更通知でプロセス内の検索インデックスを最新に保つ）
+import logging
+import os
+from datetime import date
+from typing import List, Optional
+from app.utils.firebase import get_firestore_db
+from app.utils.search_index import ReservationSearchIndex
+
+logger = logging.getLogger(__name__)
+
+# 起動時に検索インデックスを構築し、予約の変更通知の購読を開始する場合は1
+SEARCH_INDEX_ENABLED = os.getenv("SEARCH_INDEX_ENABLED", "0") == "1"
+
+reservation_index = ReservationSearchIndex()
+
+_watch = None
+
+class SearchIndexNotReadyError(Exception):
+    """検索インデックスの構築が完了していない場合のエラー"""
+
+def _on_reservations_snapshot(docs, changes, read_time) -> None:
+    """予約の変更通知をインデックスに反映（初回の通知で全件が ADDED として届く）
+
+    反映に失敗した場合は stale として検索に使わず、次の通知に含まれる全件から作り直す。
+    """
+    try:
+        if reservation_index.stale:
+            reservation_index.rebuild((doc.id, doc.to_dict()) for doc in docs)
+        else:
+            for change in changes:
+                if change.type.name == "REMOVED":
+                    reservation_index.remove(change.document.id)
+                else:
+                    reservation_index.upsert(change.document.id, change.document.to_dict())
+    except Exception as e:
+        reservation_index.mark_stale()
+        logger.error(f"予約の変更通知を検索インデックスに反映できませんでした: {e}")
+        return
+    if not reservation_index.ready:
+        reservation_index.mark_ready()
+        logger.info(f"予約の検索インデックスを構築しました: {len(docs)}件")
+
+def start_search_index() -> None:
+    """予約の変更通知の購読を開始"""
+    global _watch
+    if _watch is not None:
+        return
+    db = get_firestore_db()
+    _watch = db.collection("reservations").on_snapshot(_on_reservations_snapshot)
+
+def stop_search_index() -> None:
+    """変更通知の購読を停止し、インデックスを破棄"""
+    global _watch
+    if _watch is not None:
+        _watch.unsubscribe()
+        _watch = None
+    reservation_index.clear()
+
+def is_search_index_ready() -> bool:
+    return reservation_index.ready
+
+def search_reservation_index(
+    user_name: Optional[str] = None,
+    user_phone: Optional[str] = None,
+    user_email: Optional[str] = None,
+    reservation_number: Optional[str] = None,
+    visit_date: Optional[date] = None,
+    status: Optional[str] = None,
+    limit: int = 100,
+) -> List[dict]:
+    """検索インデックスから予約を検索（氏名・電話番号・メールアドレス・予約番号は部分一致）"""
+    if not is_search_index_ready():
+        raise SearchIndexNotReadyError("検索インデックスを準備中です。しばらくしてから再度お試しください")
+    return reservation_index.search({
+        "name": user_name,
+        "phone": user_phone,
+        "email": user_email,
+        "number": reservation_number,
+        "visit_date": visit_date.isoformat() if isinstance(visit_date, date) else visit_date,
+        "status": status,
+    }, limit=limit)
@@ -0,0 +1,140 @@
+# 予約枠の一括作成サービス（期間・時刻を指定してバッチ書き込み）
+import logging
+from datetime import date, datetime, timedelta
+from typing import AsyncIterator, List, Optional
+from fastapi import HTTPException
+from google.api_core.exceptions import Conflict
+from app.utils.errors import StorageUnavailableError
+from app.utils.firebase import get_firestore_db
+from app.utils.storage import run_storage
+from app.services.calendar_service import get_calendar_data_with_status, invalidate_calendar_cache
+from app.services.timeslot_service import get_stored_timeslots_by_date_range, generate_slot_id, missing_timeslots
+
+logger = logging.getLogger(__name__)
+
+# 一括作成時の1バッチあたりの書き込み件数（Firestoreの上限は500）
+BULK_WRITE_BATCH_SIZE = 500
+
+async def _commit(batch) -> None:
+    try:
+        await run_storage("timeslots.bulk_commit", batch.commit, idempotent=False)
+    except Conflict:
+        raise HTTPException(
+            status_code=409,
+            detail="一括作成中に他の処理で作成された予約枠があります。もう一度実行してください",
+        )
+
+async def bulk_create_timeslots(
+    start_date: date,
+    end_date: date,
+    times: List[str],
+    capacity: int,
+    exclude_dates: Optional[List[date]] = None,
+    overwrite: bool = False,
+) -> AsyncIterator[dict]:
+    """予約枠を期間指定で一括作成（バッチ書き込み）
+    
+    バッチをコミットするたびに進捗を yield し、最後に結果のサマリーを yield する。
+    既存の予約枠は予約済み数を保持するため、overwrite=True の場合も定員と公開状態のみ更新する。
+    既存の予約枠を確認できない日がある場合は書き込まずに503とし、新規の予約枠は作成のみ行う
+    （確認後に作成された予約枠があればそのバッチは409で失敗し、予約済み数を上書きしない）。
+    """
+    db = get_firestore_db()
+    excluded = set(exclude_dates or [])
+    unique_times = sorted(set(times))
+    
+    # 作成対象の日付一覧
+    target_dates = []
+    current_date = start_date
+    while current_date <= end_date:
+        if current_date not in excluded:
+            target_dates.append(current_date)
+        current_date += timedelta(days=1)
+    
+    # 既存の予約枠は1回の範囲クエリでまとめて確認
+    existing_slots, status = await get_stored_timeslots_by_date_range(start_date, end_date)
+    if status["missing_dates"]:
+        missing = ", ".join(d.isoformat() for d in status["missing_dates"])
+        raise StorageUnavailableError(
+            "timeslots.bulk_existing",
+            detail=f"既存の予約枠を確認できない日があるため一括作成できません: {missing}",
+        )
+    existing_ids = {slot.get("slot_id") for slot in existing_slots}
+    
+    total = len(target_dates) * len(unique_times)
+    created = 0
+    updated = 0
+    skipped = 0
+    committed_batches = 0
+    now = datetime.now().isoformat()
+    
+    batch = db.batch()
+    pending = 0
+    for date_obj in target_dates:
+        for time in unique_times:
+            slot_id = generate_slot_id(date_obj, time)
+            doc_ref = db.collection("timeslots").document(slot_id)
+            
+            if slot_id in existing_ids:
+                if not overwrite:
+                    skipped += 1
+                    continue
+                batch.set(doc_ref, {
+                    "capacity": capacity,
+                    "is_available": True,
+                    "updated_at": now,
+                }, merge=True)
+                updated += 1
+            else:
+                batch.create(doc_ref, {
+                    "slot_id": slot_id,
+                    "date": date_obj.isoformat(),
+                    "time": time,
+                    "capacity": capacity,
+                    "reserved_count": 0,
+                    "is_available": True,
+                    "created_at": now,
+                    "updated_at": now,
+                })
+                missing_timeslots.mark_exists(slot_id)
+                created += 1
+            pending += 1
+            
+            if pending >= BULK_WRITE_BATCH_SIZE:
+                await _commit(batch)
+                committed_batches += 1
+                batch = db.batch()
+                pending = 0
+                yield {
+                    "event": "progress",
+                    "processed": created + updated + skipped,
+                    "total": total,
+                    "batches": committed_batches,
+                }
+    
+    if pending:
+        await _commit(batch)
+        committed_batches += 1
+    
+    # カレンダー集計は最後に一度だけ再構築
+    affected_months = sorted({(d.year, d.month) for d in target_dates})
+    invalidate_calendar_cache(target_dates)
+    for year, month in affected_months:
+        try:
+            await get_calendar_data_with_status(year, month)
+        except Exception as e:
+            logger.warning(f"カレンダー集計の再構築に失敗しました ({year}-{month:02d}): {e}")
+    
+    logger.info(
+        f"予約枠を一括作成しました ({start_date}〜{end_date}): "
+        f"作成={created}, 更新={updated}, スキップ={skipped}, バッチ={committed_batches}"
+    )
+    yield {
+        "event": "done",
+        "processed": created + updated + skipped,
+        "total": total,
+        "batches": committed_batches,
+        "created": created,
+        "updated": updated,
+        "skipped": skipped,
+    }
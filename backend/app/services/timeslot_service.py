@@ -1,8 +1,32 @@
 # 予約枠管理サービス
+import asyncio
+import logging
+import os
 from datetime import date, datetime, timedelta
-from typing import List, Optional
+from typing import List, Optional, Tuple
 from google.cloud.firestore_v1 import FieldFilter
 from app.utils.firebase import get_firestore_db
+from app.utils.firestore_write import update_document
+from app.utils.storage import run_storage
+from app.utils.firestore_indexes import is_index_missing, is_missing_index_error
+from app.utils.coalesce import coalesced
+from app.utils.request_cache import request_cached
+from app.utils.negative_cache import NegativeCache
+from app.services.calendar_service import invalidate_calendar_cache
+
+logger = logging.getLogger(__name__)
+
+# 日別フォールバック時の同時実行数と1日あたりのタイムアウト（秒）
+FALLBACK_CONCURRENCY = int(os.getenv("TIMESLOT_FALLBACK_CONCURRENCY", "8"))
+FALLBACK_DAY_TIMEOUT = float(os.getenv("TIMESLOT_FALLBACK_DAY_TIMEOUT", "5"))
+
+def _list_timeslot_ids() -> List[str]:
+    """保存済みの予約枠IDを一覧取得（同期処理）"""
+    db = get_firestore_db()
+    return [doc.id for doc in db.collection("timeslots").select([]).stream()]
+
+# 保存済みでも定期スケジュールにもない予約枠ID（存在しない予約枠の照会で読み取りを省略する）
+missing_timeslots = NegativeCache("timeslots", loader=_list_timeslot_ids)
 
 def generate_slot_id(date_obj: date, time: str) -> str:
     """予約枠IDを生成"""
@@ -10,6 +34,13 @@ def generate_slot_id(date_obj: date, time: str) -> str:
     time_str = time.replace(":", "")
     return f"{date_str}_{time_str}"
 
+def _slot_date(slot_id: str) -> Optional[date]:
+    """予約枠IDから日付を取り出す"""
+    try:
+        return date.fromisoformat(slot_id.split("_", 1)[0])
+    except ValueError:
+        return None
+
 async def create_timeslot(date_obj: date, time: str, capacity: int) -> dict:
     """予約枠を作成"""
     db = get_firestore_db()
@@ -26,22 +57,50 @@ async def create_timeslot(date_obj: date, time: str, capacity: int) -> dict:
         "updated_at": datetime.now().isoformat(),
     }
     
-    db.collection("timeslots").document(slot_id).set(timeslot_data)
+    await run_storage("timeslots.set", db.collection("timeslots").document(slot_id).set, timeslot_data)
+    missing_timeslots.mark_exists(slot_id)
+    invalidate_calendar_cache([date_obj])
     return timeslot_data
 
+@request_cached
 async def get_timeslot(slot_id: str) -> Optional[dict]:
-    """予約枠を取得"""
+    """予約枠を取得（保存されていない場合は定期スケジュールの仮想予約枠）"""
+    from app.services.schedule_service import get_virtual_timeslot
+    
+    # 定期スケジュールにない予約枠は、存在しないことが分かっていれば読み取りを省略
+    virtual_slot = await get_virtual_timeslot(slot_id)
+    if virtual_slot is None:
+        await missing_timeslots.refresh()
+        if missing_timeslots.is_missing(slot_id):
+            return None
+    
     db = get_firestore_db()
-    doc = db.collection("timeslots").document(slot_id).get()
+    doc = await run_storage("timeslots.get", db.collection("timeslots").document(slot_id).get)
     
     if doc.exists:
         return doc.to_dict()
-    return None
+    if virtual_slot is None:
+        missing_timeslots.mark_missing(slot_id)
+    return virtual_slot
 
-async def get_timeslots_by_date(date_obj: date) -> List[dict]:
-    """指定日の予約枠一覧を取得"""
+def slot_availability(timeslot: Optional[dict]) -> dict:
+    """予約枠データから空き状況を求める"""
+    if not timeslot:
+        return {"available": False, "available_count": 0, "capacity": 0, "reserved_count": 0}
+    
+    capacity = timeslot.get("capacity", 0)
+    reserved = timeslot.get("reserved_count", 0)
+    available_count = max(0, capacity - reserved)
+    return {
+        "available": timeslot.get("is_available", False) and available_count > 0,
+        "available_count": available_count,
+        "capacity": capacity,
+        "reserved_count": reserved,
+    }
+
+def _query_timeslots_by_date(date_str: str) -> List[dict]:
+    """指定日の予約枠をFirestoreから取得（同期処理）"""
     db = get_firestore_db()
-    date_str = date_obj.isoformat()
     
     # 日付でフィルタリング
     query = db.collection("timeslots").where(filter=FieldFilter("date", "==", date_str))
@@ -51,6 +110,16 @@ async def get_timeslots_by_date(date_obj: date) -> List[dict]:
     for doc in docs:
         timeslot_data = doc.to_dict()
         timeslots.append(timeslot_data)
+    return timeslots
+
+@request_cached
+@coalesced("timeslots_by_date")
+async def get_timeslots_by_date(date_obj: date) -> List[dict]:
+    """指定日の予約枠一覧を取得（定期スケジュールの仮想予約枠を含む）"""
+    from app.services.schedule_service import get_virtual_timeslots, merge_virtual_timeslots
+    
+    timeslots = await run_storage("timeslots.query", _query_timeslots_by_date, date_obj.isoformat())
+    timeslots = merge_virtual_timeslots(timeslots, await get_virtual_timeslots(date_obj, date_obj))
     
     # 時間順にソート
     timeslots.sort(key=lambda x: x.get("time", ""))
@@ -58,74 +127,97 @@ async def get_timeslots_by_date(date_obj: date) -> List[dict]:
 
 async def update_timeslot(slot_id: str, capacity: Optional[int] = None, 
                           is_available: Optional[bool] = None) -> Optional[dict]:
-    """予約枠を更新"""
+    """予約枠を更新（仮想予約枠の場合は実体化してから更新）"""
+    from app.services.schedule_service import materialize_timeslot
+    
     db = get_firestore_db()
     doc_ref = db.collection("timeslots").document(slot_id)
     
-    if not doc_ref.get().exists:
-        return None
-    
     update_data = {"updated_at": datetime.now().isoformat()}
     if capacity is not None:
         update_data["capacity"] = capacity
     if is_available is not None:
         update_data["is_available"] = is_available
     
-    doc_ref.update(update_data)
-    return doc_ref.get().to_dict()
+    result = await run_storage("timeslots.update", update_document, doc_ref, update_data)
+    if result is None:
+        if not await materialize_timeslot(slot_id):
+            return None
+        result = await run_storage("timeslots.update", update_document, doc_ref, update_data)
+    
+    invalidate_calendar_cache([_slot_date(slot_id)])
+    return result
 
 async def delete_timeslot(slot_id: str) -> bool:
-    """予約枠を削除"""
+    """予約枠を削除
+    
+    定期スケジュールで生成される予約枠は、削除すると再び仮想予約枠として現れるため、
+    受付停止（is_available=False）の上書きとして保存する
+    """
+    from app.services.schedule_service import get_virtual_timeslot, materialize_timeslot
+    
     db = get_firestore_db()
     doc_ref = db.collection("timeslots").document(slot_id)
     
-    if doc_ref.get().exists:
-        doc_ref.delete()
+    if await get_virtual_timeslot(slot_id):
+        await materialize_timeslot(slot_id, overrides={"is_available": False})
+        await run_storage("timeslots.update", doc_ref.update, {
+            "is_available": False,
+            "updated_at": datetime.now().isoformat(),
+        })
+        invalidate_calendar_cache([_slot_date(slot_id)])
+        return True
+    
+    if (await run_storage("timeslots.get", doc_ref.get)).exists:
+        await run_storage("timeslots.delete", doc_ref.delete)
+        invalidate_calendar_cache([_slot_date(slot_id)])
         return True
     return False
 
-async def increment_reserved_count(slot_id: str) -> bool:
-    """予約済み数を増やす"""
-    db = get_firestore_db()
-    doc_ref = db.collection("timeslots").document(slot_id)
-    doc = doc_ref.get()
+async def _get_timeslots_by_day_concurrently(start_date: date, end_date: date) -> Tuple[List[dict], List[date]]:
+    """日別クエリを並行実行して予約枠を取得（同時実行数とタイムアウトを制限）
     
-    if not doc.exists:
-        return False
+    戻り値は (予約枠一覧, 取得に失敗した日付一覧)
+    """
+    semaphore = asyncio.Semaphore(FALLBACK_CONCURRENCY)
     
-    current_count = doc.to_dict().get("reserved_count", 0)
-    doc_ref.update({
-        "reserved_count": current_count + 1,
-        "updated_at": datetime.now().isoformat(),
-    })
-    return True
-
-async def decrement_reserved_count(slot_id: str) -> bool:
-    """予約済み数を減らす"""
-    db = get_firestore_db()
-    doc_ref = db.collection("timeslots").document(slot_id)
-    doc = doc_ref.get()
+    async def fetch_day(day: date) -> List[dict]:
+        async with semaphore:
+            return await asyncio.wait_for(
+                run_storage("timeslots.query", _query_timeslots_by_date, day.isoformat()),
+                timeout=FALLBACK_DAY_TIMEOUT,
+            )
     
-    if not doc.exists:
-        return False
+    days = [start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1)]
+    results = await asyncio.gather(*(fetch_day(day) for day in days), return_exceptions=True)
     
-    current_count = doc.to_dict().get("reserved_count", 0)
-    new_count = max(0, current_count - 1)
-    doc_ref.update({
-        "reserved_count": new_count,
-        "updated_at": datetime.now().isoformat(),
-    })
-    return True
+    all_timeslots = []
+    failed_dates = []
+    for day, result in zip(days, results):
+        if isinstance(result, BaseException):
+            reason = "タイムアウト" if isinstance(result, asyncio.TimeoutError) else str(result)
+            logger.warning(f"日付 {day} の取得に失敗: {reason}")
+            failed_dates.append(day)
+            continue
+        all_timeslots.extend(result)
+    
+    all_timeslots.sort(key=lambda x: (x.get("date", ""), x.get("time", "")))
+    return all_timeslots, failed_dates
 
-async def get_timeslots_by_date_range(start_date: date, end_date: date) -> List[dict]:
-    """指定期間の予約枠一覧を取得（パフォーマンス最適化）"""
-    import logging
-    logger = logging.getLogger(__name__)
+async def get_stored_timeslots_by_date_range(start_date: date, end_date: date) -> Tuple[List[dict], dict]:
+    """指定期間の保存済み予約枠を取得し、縮退運転の状況もあわせて返す
     
+    戻り値は (予約枠一覧, {"degraded": bool, "missing_dates": List[date]})
+    """
     db = get_firestore_db()
     start_date_str = start_date.isoformat()
     end_date_str = end_date.isoformat()
     
+    # 起動時の検証でインデックス不足が判明している場合は、失敗するクエリを省略
+    if is_index_missing("timeslots_by_date_range"):
+        timeslots, failed_dates = await _get_timeslots_by_day_concurrently(start_date, end_date)
+        return timeslots, {"degraded": True, "missing_dates": failed_dates}
+    
     try:
         # 日付範囲でフィルタリング（一度のクエリで月全体を取得）
         # 同じフィールドに対する範囲クエリ（>= と <=）は通常インデックス不要
@@ -134,112 +226,52 @@ async def get_timeslots_by_date_range(start_date: date, end_date: date) -> List[
         ).where(
             filter=FieldFilter("date", "<=", end_date_str)
         )
-        docs = query.stream()
-        
-        timeslots = []
-        for doc in docs:
-            timeslot_data = doc.to_dict()
-            timeslots.append(timeslot_data)
+        timeslots = await run_storage(
+            "timeslots.query_range", lambda: [doc.to_dict() for doc in query.stream()]
+        )
         
         # 日付順、時間順にソート
         timeslots.sort(key=lambda x: (x.get("date", ""), x.get("time", "")))
-        return timeslots
+        return timeslots, {"degraded": False, "missing_dates": []}
     except Exception as e:
         error_msg = str(e)
         logger.error(f"get_timeslots_by_date_rangeエラー: {error_msg}")
         
         # インデックスエラーの場合は、フォールバック処理を使用
-        if "index" in error_msg.lower() or "requires an index" in error_msg.lower():
-            logger.warning("複合インデックスが必要です。フォールバック処理を使用します。")
-            # フォールバック: 各日ごとにクエリ（以前の実装）
-            all_timeslots = []
-            current_date = start_date
-            while current_date <= end_date:
-                try:
-                    day_timeslots = await get_timeslots_by_date(current_date)
-                    all_timeslots.extend(day_timeslots)
-                except Exception as day_error:
-                    logger.warning(f"日付 {current_date} の取得に失敗: {day_error}")
-                # 次の日へ
-                current_date += timedelta(days=1)
-            return all_timeslots
+        if is_missing_index_error(e):
+            logger.warning(
+                f"複合インデックスが必要です。日別の並行クエリにフォールバックします "
+                f"({start_date_str}〜{end_date_str}, 同時実行数={FALLBACK_CONCURRENCY})"
+            )
+            timeslots, failed_dates = await _get_timeslots_by_day_concurrently(start_date, end_date)
+            return timeslots, {"degraded": True, "missing_dates": failed_dates}
         else:
             # その他のエラーは再スロー
             raise
 
-async def get_calendar_data(year: int, month: int) -> dict:
-    """カレンダーデータを取得（月次）- パフォーマンス最適化版"""
-    import logging
-    from calendar import monthrange
-    
-    logger = logging.getLogger(__name__)
-    
-    days_in_month = monthrange(year, month)[1]
-    calendar_data = {}
+async def get_timeslots_by_date_range_with_status(start_date: date, end_date: date) -> Tuple[List[dict], dict]:
+    """指定期間の予約枠一覧（定期スケジュールの仮想予約枠を含む）と縮退運転の状況を取得
     
-    # 月の開始日と終了日を計算
-    start_date = date(year, month, 1)
-    end_date = date(year, month, days_in_month)
-    
-    try:
-        # 月全体の予約枠を一度のクエリで取得（パフォーマンス改善）
-        all_timeslots = await get_timeslots_by_date_range(start_date, end_date)
-    except Exception as e:
-        logger.error(f"get_calendar_dataエラー: {str(e)}")
-        raise
-    
-    # 日付ごとにグループ化
-    timeslots_by_date = {}
-    for slot in all_timeslots:
-        slot_date_str = slot.get("date")
-        if not slot_date_str:
-            continue
-        
-        slot_date = date.fromisoformat(slot_date_str) if isinstance(slot_date_str, str) else slot_date_str
-        date_key = slot_date.isoformat()
-        
-        if date_key not in timeslots_by_date:
-            timeslots_by_date[date_key] = []
-        timeslots_by_date[date_key].append(slot)
-    
-    # 各日の予約可能枠数を計算
-    for day in range(1, days_in_month + 1):
-        date_obj = date(year, month, day)
-        date_key = date_obj.isoformat()
-        timeslots = timeslots_by_date.get(date_key, [])
-        
-        if not timeslots:
-            calendar_data[day] = {"status": "unavailable", "availableSlots": 0}
-            continue
-        
-        # 予約可能枠数を計算
-        available_slots = 0
-        for slot in timeslots:
-            if slot.get("is_available", False):
-                capacity = slot.get("capacity", 0)
-                reserved = slot.get("reserved_count", 0)
-                available_slots += max(0, capacity - reserved)
-        
-        # ステータスを決定
-        if available_slots == 0:
-            status = "full"
-        elif available_slots <= 2:
-            status = "limited"
-        else:
-            status = "available"
-        
-        calendar_data[day] = {
-            "status": status,
-            "availableSlots": available_slots,
-        }
+    戻り値は (予約枠一覧, {"degraded": bool, "missing_dates": List[date]})
+    """
+    from app.services.schedule_service import get_virtual_timeslots, merge_virtual_timeslots
     
-    return calendar_data
+    stored_slots, status = await get_stored_timeslots_by_date_range(start_date, end_date)
+    virtual_slots = await get_virtual_timeslots(start_date, end_date)
+    if status["missing_dates"]:
+        # 取得に失敗した日は保存済みの上書きが不明なため、仮想予約枠も出さない
+        missing = {d.isoformat() for d in status["missing_dates"]}
+        virtual_slots = {k: v for k, v in virtual_slots.items() if v["date"] not in missing}
+    return merge_virtual_timeslots(stored_slots, virtual_slots), status
 
+async def get_timeslots_by_date_range(start_date: date, end_date: date) -> List[dict]:
+    """指定期間の予約枠一覧を取得（パフォーマンス最適化）"""
+    timeslots, _ = await get_timeslots_by_date_range_with_status(start_date, end_date)
+    return timeslots
+
+@coalesced("timeslot_stats")
 async def get_timeslot_stats() -> dict:
     """予約状況統計を取得"""
-    from datetime import date, timedelta
-    db = get_firestore_db()
-    
     # 今日から30日先までの予約枠を取得
     today = date.today()
     end_date = today + timedelta(days=30)
@@ -253,12 +285,10 @@ async def get_timeslot_stats() -> dict:
         "by_date": {},
     }
     
-    # 予約枠を日付ごとに集計
-    query = db.collection("timeslots")
-    docs = query.stream()
+    # 予約枠を日付ごとに集計（定期スケジュールの仮想予約枠を含む）
+    timeslots = await get_timeslots_by_date_range(today, end_date)
     
-    for doc in docs:
-        timeslot_data = doc.to_dict()
+    for timeslot_data in timeslots:
         slot_date_str = timeslot_data.get("date")
         if not slot_date_str:
             continue
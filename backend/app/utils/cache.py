@@ -0,0 +1,49 @@
+# インメモリキャッシュ
+import threading
+import time
+from typing import Any, Callable, Hashable, Optional
+
+class TTLCache:
+    """有効期限付きのシンプルなインメモリキャッシュ（スレッドセーフ）"""
+
+    def __init__(self, ttl: float, max_entries: int = 1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """キャッシュを取得（期限切れまたは未登録の場合はNone）"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """キャッシュを登録（上限を超えた場合は最も古いエントリを破棄）"""
+        with self._lock:
+            if key not in self._entries and len(self._entries) >= self.max_entries:
+                oldest_key = next(iter(self._entries))
+                del self._entries[oldest_key]
+            self._entries[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+
+    def invalidate(self, key: Hashable) -> None:
+        """指定キーのキャッシュを破棄"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def invalidate_where(self, predicate: Callable[[Hashable], bool]) -> None:
+        """条件に一致するキーのキャッシュをまとめて破棄"""
+        with self._lock:
+            for key in [k for k in self._entries if predicate(k)]:
+                del self._entries[key]
+
+    def clear(self) -> None:
+        """すべてのキャッシュを破棄"""
+        with self._lock:
+            self._entries.clear()
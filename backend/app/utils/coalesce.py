@@ -0,0 +1,66 @@
+# 同時に発生した同一の読み取りの合流（リクエスト・コアレッシング）
+import asyncio
+import copy
+import functools
+from typing import Any, Awaitable, Callable, Dict, Hashable
+from app.utils.metrics import get_metrics, increment
+
+# 実行中の読み取り（キー: イベントループ・名前・引数）
+_in_flight: Dict[Hashable, asyncio.Task] = {}
+
+_METRIC_PREFIX = "coalesce."
+
+def coalesced(name: str) -> Callable[[Callable[..., Awaitable[Any]]], Callable[..., Awaitable[Any]]]:
+    """同じ引数の呼び出しが実行中の場合、新たに実行せずその結果を共有するデコレーター
+
+    読み取りは呼び出し元とは別のタスクで実行するため、最初の呼び出し元が中断されても
+    合流した他の呼び出しには結果が返る。結果は呼び出しごとにコピーして返す。
+    メトリクスは coalesce.{name} に calls（呼び出し）・executed（実行）・coalesced（合流）を記録する。
+    """
+    metric = f"{_METRIC_PREFIX}{name}"
+
+    def decorator(func: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            key = (id(asyncio.get_running_loop()), name, args, tuple(sorted(kwargs.items())))
+            try:
+                task = _in_flight.get(key)
+            except TypeError:
+                # 引数がハッシュできない場合は合流しない
+                return await func(*args, **kwargs)
+
+            increment(metric, "calls")
+            if task is None:
+                increment(metric, "executed")
+                task = asyncio.ensure_future(func(*args, **kwargs))
+                _in_flight[key] = task
+                task.add_done_callback(functools.partial(_on_done, key))
+            else:
+                increment(metric, "coalesced")
+            return copy.deepcopy(await asyncio.shield(task))
+
+        return wrapper
+
+    return decorator
+
+def _on_done(key: Hashable, task: asyncio.Task) -> None:
+    if _in_flight.get(key) is task:
+        del _in_flight[key]
+    # 合流した呼び出しがすべて中断された場合に「例外が取得されなかった」警告を出さない
+    if not task.cancelled():
+        task.exception()
+
+def get_coalescing_stats() -> Dict[str, dict]:
+    """読み取りごとの合流の集計（coalesced_ratio: 呼び出しのうち実行せずに済んだ割合）"""
+    stats = {}
+    for metric, events in get_metrics().items():
+        if not metric.startswith(_METRIC_PREFIX):
+            continue
+        calls = events.get("calls", 0)
+        stats[metric[len(_METRIC_PREFIX):]] = {
+            "calls": calls,
+            "executed": events.get("executed", 0),
+            "coalesced": events.get("coalesced", 0),
+            "coalesced_ratio": round(events.get("coalesced", 0) / calls, 4) if calls else 0.0,
+        }
+    return stats
@@ -0,0 +1,145 @@
+# Firestore呼び出しの同時実行数制限（優先レーンごとの予約枠と待ち行列の上限）
+import asyncio
+import contextvars
+import os
+from collections import deque
+from typing import Deque, Dict, Optional
+from app.utils.metrics import increment
+
+# レーン（優先度の高い順）
+# admin: 管理者・スタッフ操作（受付での来店完了など）、booking: 予約の作成・変更・キャンセル、public: 一般の閲覧
+LANES = ("admin", "booking", "public")
+
+def _parse_reserved(value: str) -> Dict[str, int]:
+    """"admin:4,booking:8,public:8" 形式の設定を解析"""
+    reserved = {lane: 0 for lane in LANES}
+    for part in value.split(","):
+        lane, _, count = part.partition(":")
+        if lane.strip() in reserved and count.strip():
+            reserved[lane.strip()] = int(count)
+    return reserved
+
+# 全体の同時実行数、レーンごとの予約枠、レーンごとの待ち行列の上限と最大待ち時間（秒）
+STORAGE_MAX_CONCURRENCY = int(os.getenv("STORAGE_MAX_CONCURRENCY", "32"))
+STORAGE_LANE_RESERVED = _parse_reserved(os.getenv("STORAGE_LANE_RESERVED", "admin:4,booking:8,public:8"))
+STORAGE_LANE_QUEUE_SIZE = int(os.getenv("STORAGE_LANE_QUEUE_SIZE", "64"))
+STORAGE_QUEUE_TIMEOUT = float(os.getenv("STORAGE_QUEUE_TIMEOUT", "2"))
+
+# 現在のリクエストのレーン
+_request_lane: contextvars.ContextVar[str] = contextvars.ContextVar("request_lane", default="public")
+
+def set_request_lane(lane: str) -> contextvars.Token:
+    return _request_lane.set(lane)
+
+def reset_request_lane(token: contextvars.Token) -> None:
+    _request_lane.reset(token)
+
+def get_request_lane() -> str:
+    return _request_lane.get()
+
+def lane_for_request(method: str, path: str) -> str:
+    """リクエストのメソッドとパスからレーンを決定"""
+    if path.startswith("/api/admin/") or (method == "POST" and path.endswith("/complete")):
+        return "admin"
+    if path.startswith("/api/reservations") and method in ("POST", "PUT", "DELETE"):
+        return "booking"
+    return "public"
+
+class LaneOverloadedError(Exception):
+    """待ち行列が満杯、または待ち時間の上限を超えたため処理を打ち切った場合のエラー"""
+
+    def __init__(self, lane: str):
+        super().__init__(f"レーン {lane} が混雑しています")
+        self.lane = lane
+
+class LaneLimiter:
+    """レーンごとの予約枠と共有枠で同時実行数を制限する（イベントループ内で使用）
+
+    各レーンはまず自レーンの予約枠を使い、埋まっている場合は共有枠を使う。
+    どちらも空いていない場合は上限付きの待ち行列で待機し、上限を超えた分は即座に打ち切る。
+    解放された共有枠は優先度の高いレーンの待機者から割り当てる。
+    """
+
+    def __init__(self, total: int, reserved: Dict[str, int], queue_size: int):
+        self.reserved = dict(reserved)
+        self.shared = max(0, total - sum(reserved.values()))
+        self.queue_size = queue_size
+        self._reserved_in_use = {lane: 0 for lane in LANES}
+        self._shared_in_use = 0
+        self._waiters: Dict[str, Deque[asyncio.Future]] = {lane: deque() for lane in LANES}
+
+    def _try_acquire(self, lane: str) -> Optional[str]:
+        if self._reserved_in_use[lane] < self.reserved.get(lane, 0):
+            self._reserved_in_use[lane] += 1
+            return "reserved"
+        if self._shared_in_use < self.shared:
+            self._shared_in_use += 1
+            return "shared"
+        return None
+
+    async def acquire(self, lane: str, timeout: Optional[float]) -> str:
+        """枠を確保し、確保した枠の種類（"reserved" / "shared"）を返す"""
+        slot = self._try_acquire(lane)
+        if slot:
+            return slot
+
+        waiters = self._waiters[lane]
+        if len(waiters) >= self.queue_size:
+            increment(f"lane.{lane}", "shed")
+            raise LaneOverloadedError(lane)
+
+        future = asyncio.get_running_loop().create_future()
+        waiters.append(future)
+        increment(f"lane.{lane}", "queued")
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            self._release_handed_off(lane, future)
+            increment(f"lane.{lane}", "queue_timeouts")
+            raise LaneOverloadedError(lane)
+        except asyncio.CancelledError:
+            self._release_handed_off(lane, future)
+            raise
+        finally:
+            if future in waiters:
+                waiters.remove(future)
+
+    def _release_handed_off(self, lane: str, future: asyncio.Future) -> None:
+        """枠を引き渡された直後にタイムアウト・キャンセルされた場合は、受け取った枠を解放する"""
+        if future.done() and not future.cancelled():
+            self.release(lane, future.result())
+
+    def _hand_off(self, lane: str, slot: str) -> bool:
+        """待機者に枠をそのまま引き渡す"""
+        waiters = self._waiters[lane]
+        while waiters:
+            future = waiters.popleft()
+            if not future.done():
+                future.set_result(slot)
+                return True
+        return False
+
+    def release(self, lane: str, slot: str) -> None:
+        """枠を解放（待機者がいればそのまま引き渡す）"""
+        if slot == "reserved":
+            if not self._hand_off(lane, "reserved"):
+                self._reserved_in_use[lane] -= 1
+            return
+
+        for waiting_lane in LANES:
+            if self._hand_off(waiting_lane, "shared"):
+                return
+        self._shared_in_use -= 1
+
+    def stats(self) -> Dict[str, dict]:
+        """レーンごとの使用状況"""
+        return {
+            lane: {
+                "reserved": self.reserved.get(lane, 0),
+                "reserved_in_use": self._reserved_in_use[lane],
+                "waiting": len(self._waiters[lane]),
+            }
+            for lane in LANES
+        } | {"shared": {"size": self.shared, "in_use": self._shared_in_use}}
+
+lane_limiter = LaneLimiter(STORAGE_MAX_CONCURRENCY, STORAGE_LANE_RESERVED, STORAGE_LANE_QUEUE_SIZE)
@@ -0,0 +1,24 @@
+# データストア関連の共通エラー（firebase・storage の両方から参照するため独立したモジュールに置く）
+import os
+from fastapi import HTTPException
+
+# 503応答で返す再試行までの目安（秒）
+STORAGE_RETRY_AFTER = int(os.getenv("STORAGE_RETRY_AFTER", "2"))
+
+class StorageUnavailableError(HTTPException):
+    """Firestoreが一時的に利用できない（再試行しても成功しなかった）場合のエラー
+
+    HTTPExceptionのサブクラスのため、ルーターの `except HTTPException: raise` でそのまま503として返る。
+    """
+
+    def __init__(self, operation: str, retry_after: int = STORAGE_RETRY_AFTER,
+                 detail: str = "データストアが一時的に利用できません。しばらくしてから再度お試しください"):
+        super().__init__(
+            status_code=503,
+            detail=detail,
+            headers={"Retry-After": str(retry_after)},
+        )
+        self.operation = operation
+
+    def __str__(self) -> str:
+        return f"{self.detail} ({self.operation})"
@@ -2,16 +2,40 @@
 import os
 os.environ['GRPC_VERBOSITY'] = 'ERROR'
 import json
-from typing import Tuple
+import math
+import time
+from typing import Optional, Tuple
 import firebase_admin  # pyright: ignore[reportMissingImports]
 from firebase_admin import credentials, firestore  # pyright: ignore[reportMissingImports]
 from dotenv import load_dotenv
+from app.utils.errors import StorageUnavailableError
 
 load_dotenv()
 
+# 初期化に失敗した後、再び初期化を試みるまでの秒数（認証情報の修正を再起動なしで反映する）
+FIREBASE_INIT_RETRY_INTERVAL = float(os.getenv("FIREBASE_INIT_RETRY_INTERVAL", "30"))
+
 # Firebase初期化（シングルトンパターン）
 _db = None
 _initialization_error = None
+_initialization_failed_at = 0.0
+
+class FirebaseInitializationError(StorageUnavailableError):
+    """Firebase/Firestoreの初期化に失敗した場合のエラー
+
+    データストアを利用できないため、次に初期化を試みるまでの秒数を Retry-After とした503として返す
+    （詳細はログ用に保持する）。
+    """
+
+    def __init__(self, message: str, retry_after: Optional[int] = None):
+        if retry_after is None:
+            super().__init__("firebase.initialize")
+        else:
+            super().__init__("firebase.initialize", retry_after=retry_after)
+        self.message = message
+
+    def __str__(self) -> str:
+        return self.message
 
 def _validate_service_account_key(key_data: dict) -> Tuple[bool, str]:
     """サービスアカウントキーの検証"""
@@ -56,7 +80,27 @@ def _get_service_account_path(env_path: str) -> str:
     return None
 
 def get_firestore_db():
-    """Firestoreデータベースインスタンスを取得"""
+    """Firestoreデータベースインスタンスを取得
+
+    初期化に失敗した場合は FIREBASE_INIT_RETRY_INTERVAL 秒が経過するまで同じエラーを返し、
+    経過後の呼び出しで再び初期化を試みる。
+    """
+    global _initialization_error, _initialization_failed_at
+
+    now = time.monotonic()
+    if _initialization_error is not None and now - _initialization_failed_at >= FIREBASE_INIT_RETRY_INTERVAL:
+        _initialization_error = None
+    attempted = _initialization_error is None
+    try:
+        return _connect()
+    except FirebaseInitializationError as e:
+        if attempted:
+            _initialization_failed_at = now
+        retry_after = max(1, math.ceil(_initialization_failed_at + FIREBASE_INIT_RETRY_INTERVAL - now))
+        raise FirebaseInitializationError(e.message, retry_after=retry_after) from None
+
+def _connect():
+    """Firebase Admin SDKを初期化してFirestoreクライアントを作成（失敗時はエラー内容を記録する）"""
     global _db, _initialization_error
     
     if _db is None and _initialization_error is None:
@@ -74,7 +118,7 @@ def get_firestore_db():
                         is_valid, error_msg = _validate_service_account_key(key_data)
                         if not is_valid:
                             _initialization_error = f"サービスアカウントキーの検証に失敗しました: {error_msg}"
-                            raise ValueError(_initialization_error)
+                            raise FirebaseInitializationError(_initialization_error)
                         
                         # プロジェクトIDとclient_emailをログに出力（デバッグ用）
                         project_id = key_data.get("project_id", "不明")
@@ -101,13 +145,13 @@ def get_firestore_db():
                                 )
                             else:
                                 _initialization_error = f"Firebase初期化エラー: {error_str}"
-                            raise ValueError(_initialization_error)
+                            raise FirebaseInitializationError(_initialization_error)
                     except json.JSONDecodeError as e:
                         _initialization_error = f"サービスアカウントキーファイルのJSON形式が正しくありません: {str(e)}"
-                        raise ValueError(_initialization_error)
+                        raise FirebaseInitializationError(_initialization_error)
                     except FileNotFoundError:
                         _initialization_error = f"サービスアカウントキーファイルが見つかりません: {service_account_path}"
-                        raise ValueError(_initialization_error)
+                        raise FirebaseInitializationError(_initialization_error)
                 else:
                     # 方法2: 環境変数から認証情報を取得
                     project_id = os.getenv("FIREBASE_PROJECT_ID")
@@ -133,7 +177,7 @@ def get_firestore_db():
                         is_valid, error_msg = _validate_service_account_key(key_data)
                         if not is_valid:
                             _initialization_error = f"サービスアカウントキーの検証に失敗しました: {error_msg}"
-                            raise ValueError(_initialization_error)
+                            raise FirebaseInitializationError(_initialization_error)
                         
                         cred = credentials.Certificate(key_data)
                         firebase_admin.initialize_app(cred)
@@ -147,9 +191,9 @@ def get_firestore_db():
                             "詳細は backend/ENV_SETUP_GUIDE.md を参照してください。"
                         )
                         _initialization_error = error_msg
-                        raise ValueError(error_msg)
-            except ValueError:
-                # ValueErrorは既に設定されたエラーメッセージを使用
+                        raise FirebaseInitializationError(error_msg)
+            except FirebaseInitializationError:
+                # 既に設定されたエラーメッセージを使用
                 raise
             except Exception as e:
                 error_str = str(e)
@@ -173,10 +217,10 @@ def get_firestore_db():
                     )
                 else:
                     _initialization_error = f"Firebase初期化エラー: {error_str}"
-                raise ValueError(_initialization_error)
+                raise FirebaseInitializationError(_initialization_error)
         
         if _initialization_error:
-            raise ValueError(_initialization_error)
+            raise FirebaseInitializationError(_initialization_error)
         
         try:
             _db = firestore.client()
@@ -219,10 +263,10 @@ def get_firestore_db():
                 )
             else:
                 _initialization_error = f"Firestore接続エラー: {error_str}"
-            raise ValueError(_initialization_error)
+            raise FirebaseInitializationError(_initialization_error)
     
     if _initialization_error:
-        raise ValueError(_initialization_error)
+        raise FirebaseInitializationError(_initialization_error)
     
     return _db
 
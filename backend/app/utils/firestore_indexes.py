@@ -0,0 +1,178 @@
+# Firestoreクエリ形状の登録とインデックス定義の生成・検証
+import asyncio
+import itertools
+import logging
+from typing import Dict, List, Optional
+from google.api_core.exceptions import FailedPrecondition
+from app.utils.firebase import get_firestore_db
+
+logger = logging.getLogger(__name__)
+
+# 等価条件として扱う演算子（インデックス上は範囲フィールドより前に並べる）
+_EQUALITY_OPS = ("==", "in", "array-contains")
+
+def _search_reservation_shapes() -> List[dict]:
+    """search_reservations が発行しうる検索条件の組み合わせを列挙"""
+    fields = ["reservation_number", "user_name", "visit_date", "status"]
+    shapes = []
+    for size in range(1, len(fields) + 1):
+        for combo in itertools.combinations(fields, size):
+            shapes.append({
+                "name": "search_reservations:" + "+".join(combo),
+                "collection": "reservations",
+                "filters": [(field, "==") for field in combo],
+            })
+    return shapes
+
+# サービスが発行するクエリ形状の一覧
+# filters は (フィールド名, 演算子) のリスト、order_by は (フィールド名, 方向) のリスト
+QUERY_SHAPES: List[dict] = [
+    # timeslot_service
+    {"name": "timeslots_by_date", "collection": "timeslots",
+     "filters": [("date", "==")]},
+    {"name": "timeslots_by_date_range", "collection": "timeslots",
+     "filters": [("date", ">="), ("date", "<=")]},
+    # product_service
+    {"name": "active_products", "collection": "products",
+     "filters": [("is_active", "==")]},
+    {"name": "user_purchase_limit", "collection": "reservations",
+     "filters": [("user_email", "=="), ("status", "in")]},
+    # reservation_service
+    {"name": "reservation_by_number", "collection": "reservations",
+     "filters": [("reservation_number", "==")]},
+    {"name": "reservations_by_email", "collection": "reservations",
+     "filters": [("user_email", "==")]},
+    # reservation_complete_service
+    {"name": "reservations_by_numbers", "collection": "reservations",
+     "filters": [("reservation_number", "in")]},
+    # reservation_query_service
+    {"name": "reservations_by_slot", "collection": "reservations",
+     "filters": [("slot_id", "==")], "order_by": [("status", "ASCENDING"), ("reservation_number", "ASCENDING")]},
+    # checkin_service
+    {"name": "checkin_manifest", "collection": "reservations",
+     "filters": [("visit_date", "==")]},
+    # export_service
+    {"name": "export_reservations", "collection": "reservations",
+     "filters": [("visit_date", ">=")], "order_by": [("visit_date", "ASCENDING")]},
+    {"name": "export_reservations_by_status", "collection": "reservations",
+     "filters": [("status", "=="), ("visit_date", ">="), ("visit_date", "<=")],
+     "order_by": [("visit_date", "ASCENDING")]},
+] + _search_reservation_shapes()
+
+# 検証クエリで使用するフィールドごとのダミー値
+_PROBE_VALUES = {
+    "is_active": True,
+    "status": "confirmed",
+}
+
+# 起動時の検証結果（クエリ形状名 -> 結果）
+_check_results: Dict[str, dict] = {}
+
+def is_missing_index_error(error: Exception) -> bool:
+    """Firestoreの「インデックスが必要」エラーかどうかを判定"""
+    return isinstance(error, FailedPrecondition) and "requires an index" in str(error).lower()
+
+def _index_fields(shape: dict) -> List[dict]:
+    """クエリ形状から複合インデックスのフィールド定義を組み立てる"""
+    equality_fields = []
+    range_fields = []
+    for field, op in shape.get("filters", []):
+        target = equality_fields if op in _EQUALITY_OPS else range_fields
+        if field not in equality_fields and field not in range_fields:
+            target.append(field)
+
+    fields = [{"fieldPath": f, "order": "ASCENDING"} for f in sorted(equality_fields)]
+    fields += [{"fieldPath": f, "order": "ASCENDING"} for f in range_fields]
+    for field, direction in shape.get("order_by", []):
+        if field in range_fields:
+            continue
+        fields.append({"fieldPath": field, "order": direction})
+    return fields
+
+def build_index_manifest(shapes: Optional[List[dict]] = None) -> dict:
+    """firestore.indexes.json 形式のインデックス定義を生成
+
+    単一フィールドのクエリは自動インデックスで処理できるため、
+    2フィールド以上を使用するクエリ形状のみ複合インデックスとして出力する
+    """
+    indexes = []
+    seen = set()
+    for shape in shapes if shapes is not None else QUERY_SHAPES:
+        fields = _index_fields(shape)
+        if len(fields) < 2:
+            continue
+        key = (shape["collection"], tuple((f["fieldPath"], f["order"]) for f in fields))
+        if key in seen:
+            continue
+        seen.add(key)
+        indexes.append({
+            "collectionGroup": shape["collection"],
+            "queryScope": "COLLECTION",
+            "fields": fields,
+        })
+
+    indexes.sort(key=lambda x: (x["collectionGroup"], [f["fieldPath"] for f in x["fields"]]))
+    return {"indexes": indexes, "fieldOverrides": []}
+
+def _build_probe_query(db, shape: dict):
+    """クエリ形状に対応する検証用クエリ（limit 1）を組み立てる"""
+    from google.cloud.firestore_v1 import FieldFilter
+
+    query = db.collection(shape["collection"])
+    for field, op in shape.get("filters", []):
+        value = _PROBE_VALUES.get(field, "")
+        if op == "in":
+            value = [value]
+        query = query.where(filter=FieldFilter(field, op, value))
+    for field, direction in shape.get("order_by", []):
+        query = query.order_by(field, direction=direction)
+    return query.limit(1)
+
+def _probe_shape(shape: dict) -> dict:
+    """クエリ形状を1件だけ実行し、インデックスの有無を確認（同期処理）"""
+    db = get_firestore_db()
+    try:
+        list(_build_probe_query(db, shape).stream())
+        return {"name": shape["name"], "ok": True, "error": None}
+    except Exception as e:
+        return {
+            "name": shape["name"],
+            "ok": False,
+            "missing_index": is_missing_index_error(e),
+            "error": str(e),
+        }
+
+async def check_query_indexes(shapes: Optional[List[dict]] = None) -> List[dict]:
+    """全クエリ形状のインデックスを検証し、結果を記録する"""
+    results = await asyncio.gather(*(
+        asyncio.to_thread(_probe_shape, shape)
+        for shape in (shapes if shapes is not None else QUERY_SHAPES)
+    ))
+
+    for result in results:
+        _check_results[result["name"]] = result
+        if result["ok"]:
+            continue
+        if result.get("missing_index"):
+            logger.error(f"複合インデックスが不足しています ({result['name']}): {result['error']}")
+        else:
+            logger.warning(f"インデックス検証クエリに失敗しました ({result['name']}): {result['error']}")
+
+    missing = [r["name"] for r in results if r.get("missing_index")]
+    if missing:
+        logger.error(
+            f"{len(missing)}件のクエリ形状でインデックスが不足しています。"
+            f"python generate_firestore_indexes.py を実行して firebase deploy --only firestore:indexes でデプロイしてください"
+        )
+    else:
+        logger.info(f"Firestoreインデックス検証完了（{len(results)}件）")
+    return list(results)
+
+def is_index_missing(shape_name: str) -> bool:
+    """起動時の検証でインデックス不足が判明しているかどうか"""
+    result = _check_results.get(shape_name)
+    return bool(result and result.get("missing_index"))
+
+def get_index_check_results() -> List[dict]:
+    """起動時の検証結果を取得"""
+    return list(_check_results.values())
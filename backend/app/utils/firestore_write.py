@@ -0,0 +1,77 @@
+# Firestoreドキュメントの更新ヘルパー
+import copy
+import os
+from typing import Callable, Optional
+from google.api_core.exceptions import FailedPrecondition, NotFound
+from app.utils.cache import TTLCache
+from app.utils.firebase import get_firestore_db
+
+# 読み取り後に他の更新と競合した場合の再試行回数
+UPDATE_MAX_ATTEMPTS = 3
+
+# このプロセスで更新したドキュメントの内容と更新時刻を保持する秒数と件数の上限
+# （次の更新は保持した更新時刻を前提条件にして読み取りを省略する）
+KNOWN_VERSION_TTL = float(os.getenv("KNOWN_VERSION_TTL", "60"))
+KNOWN_VERSION_MAX_ENTRIES = int(os.getenv("KNOWN_VERSION_MAX_ENTRIES", "1024"))
+_known_versions = TTLCache(ttl=KNOWN_VERSION_TTL, max_entries=KNOWN_VERSION_MAX_ENTRIES)
+
+def update_document(
+    doc_ref,
+    update_data: dict,
+    check: Optional[Callable[[dict], None]] = None,
+    max_attempts: int = UPDATE_MAX_ATTEMPTS,
+) -> Optional[dict]:
+    """ドキュメントを読み取り時点から変更されていないことを前提条件に更新する
+
+    更新後の再読み取りは行わず、読み取った内容に更新内容をマージして返す。
+    書き込み結果の更新時刻を記録し、同じドキュメントの次の更新は記録した内容と更新時刻で
+    読み取りを省略する（他から更新されていた場合は前提条件が成立しないため読み直す）。
+    ドキュメントが存在しない場合は None を返す。
+    check を指定した場合は更新前の内容で呼び出す（業務エラーは ValueError を送出する）。
+    update_data には加算などの変換を含めないこと（マージ結果が保存内容と一致しなくなる）。
+    """
+    db = get_firestore_db()
+    known = _known_versions.get(doc_ref.path)
+    for _ in range(max_attempts):
+        if known is not None:
+            data, update_time = copy.deepcopy(known[0]), known[1]
+            known = None
+            if check:
+                try:
+                    check(data)
+                except ValueError:
+                    # 記録後に変更されている可能性があるため、最新の内容で判定し直す
+                    _known_versions.invalidate(doc_ref.path)
+                    continue
+        else:
+            snapshot = doc_ref.get()
+            if not snapshot.exists:
+                _known_versions.invalidate(doc_ref.path)
+                return None
+            data, update_time = snapshot.to_dict(), snapshot.update_time
+            if check:
+                check(data)
+
+        try:
+            write_result = doc_ref.update(update_data, option=db.write_option(last_update_time=update_time))
+        except NotFound:
+            _known_versions.invalidate(doc_ref.path)
+            return None
+        except FailedPrecondition:
+            # 読み取り後に他の更新が入ったため、読み直して再試行
+            _known_versions.invalidate(doc_ref.path)
+            continue
+
+        data.update(update_data)
+        _known_versions.set(doc_ref.path, (copy.deepcopy(data), write_result.update_time))
+        return data
+
+    raise ValueError("他の更新と競合したため処理できませんでした。もう一度お試しください")
+
+def update_existing(doc_ref, update_data: dict) -> bool:
+    """ドキュメントが存在する場合のみ更新（読み取りなしの1回の書き込み）"""
+    try:
+        doc_ref.update(update_data)
+        return True
+    except NotFound:
+        return False
@@ -0,0 +1,45 @@
+# Firestoreのドキュメントを使った期限付きのリース（複数プロセス間の排他）
+import os
+import time
+import uuid
+from typing import Optional
+from google.api_core.exceptions import Conflict, FailedPrecondition, NotFound
+from app.utils.firebase import get_firestore_db
+
+# リースを保存するコレクション
+LEASE_COLLECTION = os.getenv("LEASE_COLLECTION", "leases")
+
+def acquire_lease(name: str, ttl: float) -> Optional[object]:
+    """リースを取得（同期処理）
+
+    取得できた場合は解放時に使う更新時刻を返し、他のプロセスが保持中の場合は None を返す。
+    保持者が解放せずに終了した場合も、ttl 秒経過後は取得できる。
+    """
+    db = get_firestore_db()
+    doc_ref = db.collection(LEASE_COLLECTION).document(name)
+    lease = {"owner": uuid.uuid4().hex, "expires_at": time.time() + ttl}
+
+    try:
+        return doc_ref.create(lease).update_time
+    except Conflict:
+        pass
+
+    snapshot = doc_ref.get()
+    if snapshot.exists and snapshot.to_dict().get("expires_at", 0) > time.time():
+        return None
+    try:
+        if not snapshot.exists:
+            return doc_ref.create(lease).update_time
+        # 期限切れのリースを引き継ぐ（同時に引き継ごうとした場合は先に更新した方のみ成功）
+        return doc_ref.update(lease, option=db.write_option(last_update_time=snapshot.update_time)).update_time
+    except (Conflict, FailedPrecondition, NotFound):
+        return None
+
+def release_lease(name: str, token: object) -> None:
+    """リースを解放（同期処理）。期限切れ後に他のプロセスが取得したリースは削除しない"""
+    db = get_firestore_db()
+    doc_ref = db.collection(LEASE_COLLECTION).document(name)
+    try:
+        doc_ref.delete(option=db.write_option(last_update_time=token))
+    except (FailedPrecondition, NotFound):
+        pass
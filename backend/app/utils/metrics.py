@@ -0,0 +1,22 @@
+# 処理回数などの簡易メトリクス（プロセス内で集計）
+import threading
+from collections import defaultdict
+from typing import Dict
+
+_counters: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+_lock = threading.Lock()
+
+def increment(name: str, event: str, value: int = 1) -> None:
+    """メトリクスを加算（name: 操作名、event: 呼び出し・再試行などの種別）"""
+    with _lock:
+        _counters[name][event] += value
+
+def get_metrics() -> Dict[str, Dict[str, int]]:
+    """現在の集計値を取得"""
+    with _lock:
+        return {name: dict(events) for name, events in sorted(_counters.items())}
+
+def reset_metrics() -> None:
+    """集計値をリセット"""
+    with _lock:
+        _counters.clear()
@@ -0,0 +1,119 @@
+# 存在しないキーの短時間キャッシュ（ネガティブキャッシュ）
+import hashlib
+import logging
+import math
+import os
+import time
+from typing import Callable, Iterable, Optional
+from app.utils.cache import TTLCache
+from app.utils.metrics import increment
+from app.utils.storage import run_storage
+
+logger = logging.getLogger(__name__)
+
+# 「存在しない」と判定したキーを保持する秒数と件数の上限
+NEGATIVE_CACHE_TTL = float(os.getenv("NEGATIVE_CACHE_TTL", "30"))
+NEGATIVE_CACHE_MAX_ENTRIES = int(os.getenv("NEGATIVE_CACHE_MAX_ENTRIES", "10000"))
+
+# 存在するキーのブルームフィルタを併用する場合は1（他のインスタンスで作成されたキーは再構築まで反映されない）
+NEGATIVE_CACHE_BLOOM = os.getenv("NEGATIVE_CACHE_BLOOM", "0") == "1"
+NEGATIVE_CACHE_BLOOM_REFRESH = float(os.getenv("NEGATIVE_CACHE_BLOOM_REFRESH", "60"))
+NEGATIVE_CACHE_BLOOM_ERROR_RATE = 0.01
+
+class BloomFilter:
+    """キーの集合のブルームフィルタ（含まれない判定は確実、含まれる判定は誤検知あり）"""
+
+    def __init__(self, capacity: int, error_rate: float = NEGATIVE_CACHE_BLOOM_ERROR_RATE):
+        capacity = max(capacity, 1)
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key: str) -> Iterable[int]:
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hash_count):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, key: str) -> None:
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+class NegativeCache:
+    """存在しないことが分かったキーを記録し、同じキーの読み取りを省略する
+
+    作成時は mark_exists で記録を破棄する。loader（存在するキーの一覧を返す同期関数）を
+    指定し NEGATIVE_CACHE_BLOOM=1 の場合は、ブルームフィルタに含まれないキーも存在しないと判定する。
+    メトリクスは negative_cache.{kind} に hit（読み取り省略）・miss・marked（記録）を記録する。
+    """
+
+    def __init__(self, kind: str, loader: Optional[Callable[[], Iterable[str]]] = None):
+        self.kind = kind
+        self._metric = f"negative_cache.{kind}"
+        self._cache = TTLCache(ttl=NEGATIVE_CACHE_TTL, max_entries=NEGATIVE_CACHE_MAX_ENTRIES)
+        self._loader = loader
+        self._bloom: Optional[BloomFilter] = None
+        self._bloom_expires_at = 0.0
+        self._bloom_refreshing = False
+        self._created_during_refresh = []
+
+    def is_missing(self, key: str) -> bool:
+        """存在しないと判定できる場合はTrue"""
+        if self._cache.get(key):
+            increment(self._metric, "hit")
+            return True
+        bloom = self._bloom
+        if bloom is not None and time.monotonic() < self._bloom_expires_at and key not in bloom:
+            increment(self._metric, "hit")
+            return True
+        increment(self._metric, "miss")
+        return False
+
+    def mark_missing(self, key: str) -> None:
+        """存在しなかったキーを記録"""
+        self._cache.set(key, True)
+        increment(self._metric, "marked")
+
+    def mark_exists(self, key: str) -> None:
+        """作成したキーの記録を破棄"""
+        self._cache.invalidate(key)
+        bloom = self._bloom
+        if bloom is not None:
+            bloom.add(key)
+        if self._bloom_refreshing:
+            # 再構築中の一覧に含まれない可能性があるため、構築後に追加する
+            self._created_during_refresh.append(key)
+
+    def clear(self) -> None:
+        """すべての記録を破棄（ブルームフィルタは次回の判定前に再構築）"""
+        self._cache.clear()
+        self._bloom = None
+        self._bloom_expires_at = 0.0
+
+    async def refresh(self) -> None:
+        """ブルームフィルタが有効期限切れの場合に再構築（同時に1回のみ）"""
+        if not NEGATIVE_CACHE_BLOOM or self._loader is None:
+            return
+        if self._bloom_refreshing or time.monotonic() < self._bloom_expires_at:
+            return
+
+        self._bloom_refreshing = True
+        try:
+            keys = list(await run_storage(f"{self.kind}.keys", self._loader))
+            bloom = BloomFilter(max(len(keys) * 2, 1024))
+            for key in keys + self._created_during_refresh:
+                bloom.add(key)
+            self._bloom = bloom
+            self._bloom_expires_at = time.monotonic() + NEGATIVE_CACHE_BLOOM_REFRESH
+        except Exception as e:
+            # 構築できない間はブルームフィルタを使わず、通常どおり読み取る
+            self._bloom = None
+            self._bloom_expires_at = time.monotonic() + NEGATIVE_CACHE_BLOOM_REFRESH
+            logger.warning(f"存在するキーの一覧を取得できませんでした ({self.kind}): {e}")
+        finally:
+            self._bloom_refreshing = False
+            self._created_during_refresh = []
@@ -0,0 +1,233 @@
+# スライディングウィンドウ方式のレート制限（IPアドレス・IPアドレスとメールアドレスの組単位）
+import json
+import logging
+import math
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+from app.utils.metrics import increment
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "1") != "0"
+# memory: プロセス内で集計、redis: 複数ワーカーで共有（RATE_LIMIT_REDIS_URL が必要）
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL", "redis://localhost:6379/0")
+# リバースプロキシ配下で X-Forwarded-For の先頭をクライアントIPとして扱う場合は1
+RATE_LIMIT_TRUST_FORWARDED = os.getenv("RATE_LIMIT_TRUST_FORWARDED", "0") == "1"
+
+# メールアドレスを取り出すために読み込むリクエストボディの上限（バイト）
+_MAX_BODY_FOR_EMAIL = 64 * 1024
+
+@dataclass(frozen=True)
+class RateLimitRule:
+    """ルートごとの制限（window 秒あたり limit 回まで）"""
+    name: str
+    method: str
+    path: str  # 正規表現
+    limit: int
+    window: int
+    # ip: IPアドレス単位、ip_email: IPアドレスとメールアドレスの組単位
+    # （メールアドレスのみで制限すると、第三者が他人のアドレスで送信して予約できなくさせられる）
+    key: str = "ip"
+
+# ルートごとの制限
+RATE_LIMIT_RULES: List[RateLimitRule] = [
+    RateLimitRule("reservation_create_ip", "POST", r"^/api/reservations/?$", limit=10, window=60),
+    RateLimitRule("reservation_create_email", "POST", r"^/api/reservations/?$", limit=5, window=600, key="ip_email"),
+    RateLimitRule("reservation_lookup_number", "GET", r"^/api/reservations/by-number/[^/]+$", limit=20, window=60),
+    RateLimitRule("reservation_lookup_id", "GET", r"^/api/reservations/[^/]+$", limit=60, window=60),
+    RateLimitRule("reservation_modify", "PUT", r"^/api/reservations/[^/]+$", limit=20, window=60),
+    RateLimitRule("reservation_cancel", "DELETE", r"^/api/reservations/[^/]+$", limit=20, window=60),
+]
+
+_COMPILED_RULES = [(rule, re.compile(rule.path)) for rule in RATE_LIMIT_RULES]
+
+class MemoryRateLimitBackend:
+    """プロセス内のカウンター（キーごとに現在と直前のウィンドウの件数のみ保持）"""
+
+    # 期限切れのキーを掃除する間隔（記録回数）
+    SWEEP_INTERVAL = 1000
+
+    def __init__(self):
+        self._counters: Dict[str, List[int]] = {}  # キー -> [ウィンドウ番号, 現在の件数, 直前の件数, ウィンドウ秒数]
+        self._lock = threading.Lock()
+        self._hits = 0
+
+    async def increment(self, key: str, window_index: int, window: int) -> Tuple[int, int]:
+        """現在のウィンドウの件数を加算し、(現在の件数, 直前のウィンドウの件数) を返す"""
+        with self._lock:
+            self._hits += 1
+            if self._hits % self.SWEEP_INTERVAL == 0:
+                self._sweep()
+
+            entry = self._counters.get(key)
+            if entry is None or entry[0] < window_index - 1:
+                entry = [window_index, 0, 0, window]
+            elif entry[0] == window_index - 1:
+                entry = [window_index, 0, entry[1], window]
+            entry[1] += 1
+            self._counters[key] = entry
+            return entry[1], entry[2]
+
+    def _sweep(self) -> None:
+        """2ウィンドウ以上更新のないキーを削除"""
+        now = time.time()
+        expired = [
+            key for key, (window_index, _, _, window) in self._counters.items()
+            if window_index < math.floor(now / window) - 1
+        ]
+        for key in expired:
+            del self._counters[key]
+
+class RedisRateLimitBackend:
+    """Redisで共有するカウンター（複数ワーカー・複数台で全体の制限をかける場合）"""
+
+    def __init__(self, url: str):
+        import redis.asyncio as redis  # 使用する場合のみ必要な依存関係
+
+        self._client = redis.from_url(url)
+
+    async def increment(self, key: str, window_index: int, window: int) -> Tuple[int, int]:
+        current_key = f"ratelimit:{key}:{window_index}"
+        pipe = self._client.pipeline()
+        pipe.incr(current_key)
+        pipe.expire(current_key, window * 2)
+        pipe.get(f"ratelimit:{key}:{window_index - 1}")
+        current, _, previous = await pipe.execute()
+        return int(current), int(previous or 0)
+
+def create_backend():
+    """設定に応じたバックエンドを作成"""
+    if RATE_LIMIT_BACKEND == "redis":
+        try:
+            return RedisRateLimitBackend(RATE_LIMIT_REDIS_URL)
+        except ImportError:
+            logger.error("redisパッケージがインストールされていないため、プロセス内のレート制限を使用します")
+    return MemoryRateLimitBackend()
+
+def _client_ip(scope) -> str:
+    if RATE_LIMIT_TRUST_FORWARDED:
+        for name, value in scope.get("headers", []):
+            if name == b"x-forwarded-for":
+                return value.decode("latin-1").split(",")[0].strip()
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+def _extract_email(body: bytes) -> Optional[str]:
+    """リクエストボディ（JSON）から user_email を取り出す"""
+    try:
+        data = json.loads(body)
+    except (ValueError, UnicodeDecodeError):
+        return None
+    email = data.get("user_email") if isinstance(data, dict) else None
+    return email.strip().lower() if isinstance(email, str) and email.strip() else None
+
+async def _send_rejection(send, retry_after: int) -> None:
+    body = json.dumps(
+        {"detail": "リクエストが多すぎます。しばらくしてから再度お試しください"}, ensure_ascii=False
+    ).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": 429,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(retry_after).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+class RateLimitMiddleware:
+    """予約・照会エンドポイントのレート制限（ルート処理やFirestore呼び出しの前に判定する）
+
+    スライディングウィンドウは直前のウィンドウの件数を経過時間で按分して推定する。
+    メールアドレス単位の制限のためにボディを読み込んだ場合は、後続の処理に同じボディを渡し直す。
+    """
+
+    def __init__(self, app, backend=None):
+        self.app = app
+        self.backend = backend or create_backend()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not RATE_LIMIT_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        path = scope["path"]
+        rules = [rule for rule, pattern in _COMPILED_RULES if rule.method == method and pattern.match(path)]
+        if not rules:
+            await self.app(scope, receive, send)
+            return
+
+        # 個別の予約IDのルールは、より具体的なルート（by-number など）と重複させない
+        if any(rule.name == "reservation_lookup_number" for rule in rules):
+            rules = [rule for rule in rules if rule.name != "reservation_lookup_id"]
+
+        email = None
+        if any(rule.key == "ip_email" for rule in rules):
+            body, receive = await self._buffer_body(receive)
+            if body is not None:
+                email = _extract_email(body)
+
+        for rule in rules:
+            if rule.key == "ip":
+                identifier = _client_ip(scope)
+            else:
+                if not email:
+                    continue
+                identifier = f"{_client_ip(scope)}:{email}"
+            retry_after = await self._check(rule, identifier)
+            if retry_after:
+                increment(f"rate_limit.{rule.name}", "rejected")
+                await _send_rejection(send, retry_after)
+                return
+
+        await self.app(scope, receive, send)
+
+    async def _check(self, rule: RateLimitRule, identifier: str) -> int:
+        """制限を超えた場合は再試行までの秒数、超えていなければ0を返す"""
+        now = time.time()
+        window_index = math.floor(now / rule.window)
+        elapsed = now - window_index * rule.window
+        try:
+            current, previous = await self.backend.increment(f"{rule.name}:{identifier}", window_index, rule.window)
+        except Exception as e:
+            # 共有バックエンドの障害時は制限しない（予約受付を止めない）
+            logger.warning(f"レート制限のカウンターを更新できませんでした ({rule.name}): {e}")
+            return 0
+
+        estimated = previous * (1 - elapsed / rule.window) + current
+        if estimated <= rule.limit:
+            return 0
+        return max(1, math.ceil(rule.window - elapsed))
+
+    @staticmethod
+    async def _buffer_body(receive):
+        """リクエストボディを読み込み、同じボディを返す receive を作り直す
+
+        上限を超えた時点で読み込みをやめ（ボディは None）、残りは後続の処理が元の receive から読み込む。
+        """
+        messages = []
+        body = b""
+        more_body = True
+        while more_body:
+            message = await receive()
+            messages.append(message)
+            if message["type"] != "http.request":
+                break
+            body += message.get("body", b"")
+            if len(body) > _MAX_BODY_FOR_EMAIL:
+                break
+            more_body = message.get("more_body", False)
+
+        async def replay():
+            if messages:
+                return messages.pop(0)
+            return await receive()
+
+        return (body if len(body) <= _MAX_BODY_FOR_EMAIL else None), replay
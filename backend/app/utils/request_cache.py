@@ -0,0 +1,43 @@
+# リクエスト単位の読み取りキャッシュ（/api/batch のサブリクエスト間で同じ読み取りを共有する）
+import asyncio
+import copy
+import functools
+from contextvars import ContextVar, Token
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+# キャッシュが有効な間の読み取り結果（キー -> 実行中または完了した読み取り）
+_request_cache: ContextVar[Optional[Dict[Hashable, asyncio.Future]]] = ContextVar("request_cache", default=None)
+
+def start_request_cache() -> Token:
+    """現在のコンテキスト（および以降に作成するタスク）でリクエスト単位のキャッシュを有効にする"""
+    return _request_cache.set({})
+
+def reset_request_cache(token: Token) -> None:
+    _request_cache.reset(token)
+
+def request_cached(func: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+    """リクエスト単位のキャッシュが有効な場合、同じ引数の読み取りを1回にまとめるデコレーター
+
+    結果は呼び出し元が変更しても他に影響しないよう、呼び出しごとにコピーして返す。
+    キャッシュが無効な場合や引数がハッシュできない場合はそのまま実行する。
+    """
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        cache = _request_cache.get()
+        if cache is None:
+            return await func(*args, **kwargs)
+        key = (func.__module__, func.__qualname__, args, tuple(sorted(kwargs.items())))
+        try:
+            future = cache.get(key)
+        except TypeError:
+            return await func(*args, **kwargs)
+
+        if future is None:
+            future = asyncio.ensure_future(func(*args, **kwargs))
+            # 読み取りが失敗し、待っている呼び出しがない場合に「例外が取得されなかった」警告を出さない
+            future.add_done_callback(lambda f: f.cancelled() or f.exception())
+            cache[key] = future
+        # 1つのサブリクエストが中断されても、共有している読み取りは中断しない
+        return copy.deepcopy(await asyncio.shield(future))
+
+    return wrapper
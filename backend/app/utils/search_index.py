@@ -0,0 +1,390 @@
+# 予約検索用のプロセス内インデックス（n-gramの転置インデックス）
+import glob
+import hashlib
+import json
+import logging
+import mmap
+import os
+import re
+import struct
+import threading
+import unicodedata
+from collections import defaultdict
+from typing import Dict, Iterable, Iterator, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# メモリ上に保持する予約数の上限（超えた場合はディスク上のセグメントに書き出す）
+SEARCH_INDEX_MAX_MEMORY_DOCS = int(os.getenv("SEARCH_INDEX_MAX_MEMORY_DOCS", "20000"))
+# セグメントの保存先
+SEARCH_INDEX_DIR = os.getenv(
+    "SEARCH_INDEX_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), ".search_index"),
+)
+
+# 部分一致検索の対象フィールドとn-gramの長さ（氏名は1文字でも検索できるよう1-gramも登録する）
+TEXT_FIELDS = {
+    "name": (1, 2),
+    "phone": (3,),
+    "email": (3,),
+    "number": (3,),
+}
+_FIELD_LABELS = {"name": "予約者名", "phone": "電話番号", "email": "メールアドレス", "number": "予約番号"}
+# 完全一致で絞り込むフィールド
+EXACT_FIELDS = ("visit_date", "status")
+
+_SEGMENT_MAGIC = b"RSX1"
+_HEADER = struct.Struct("<4sIIQQQ")  # magic, 件数, トークン数, 予約テーブル位置, ポスティング位置, トークンテーブル位置
+_DOC_ENTRY = struct.Struct("<QI")  # 予約データの位置, 長さ
+_TOKEN_ENTRY = struct.Struct("<QQI")  # トークンのハッシュ, ポスティングの位置, 件数
+
+def normalize_name(value: str) -> str:
+    """氏名を正規化（全角・半角の統一、小文字化、空白の除去）"""
+    return re.sub(r"\s+", "", unicodedata.normalize("NFKC", value or "")).lower()
+
+def normalize_phone(value: str) -> str:
+    """電話番号を数字のみに正規化"""
+    return re.sub(r"\D", "", unicodedata.normalize("NFKC", value or ""))
+
+def normalize_email(value: str) -> str:
+    return unicodedata.normalize("NFKC", value or "").strip().lower()
+
+def normalize_number(value: str) -> str:
+    """予約番号を英数字のみの大文字に正規化（ハイフンの有無を問わず検索できるようにする）"""
+    return re.sub(r"[^0-9A-Z]", "", unicodedata.normalize("NFKC", value or "").upper())
+
+_NORMALIZERS = {
+    "name": normalize_name,
+    "phone": normalize_phone,
+    "email": normalize_email,
+    "number": normalize_number,
+}
+
+def searchable_fields(doc: dict) -> Dict[str, str]:
+    """予約から検索対象の正規化済みフィールドを取り出す"""
+    return {
+        "name": normalize_name(doc.get("user_name", "")),
+        "phone": normalize_phone(doc.get("user_phone", "")),
+        "email": normalize_email(doc.get("user_email", "")),
+        "number": normalize_number(doc.get("reservation_number", "")),
+        "visit_date": doc.get("visit_date", ""),
+        "status": doc.get("status", ""),
+    }
+
+def _ngrams(value: str, size: int) -> Set[str]:
+    if len(value) < size:
+        return set()
+    return {value[i:i + size] for i in range(len(value) - size + 1)}
+
+def document_tokens(doc: dict) -> Set[str]:
+    """予約を登録するトークン（フィールド名を接頭辞に付ける）"""
+    fields = searchable_fields(doc)
+    tokens = set()
+    for field, sizes in TEXT_FIELDS.items():
+        for size in sizes:
+            tokens |= {f"{field}:{gram}" for gram in _ngrams(fields[field], size)}
+    for field in EXACT_FIELDS:
+        if fields[field]:
+            tokens.add(f"{field}={fields[field]}")
+    return tokens
+
+def query_tokens(criteria: Dict[str, str]) -> Set[str]:
+    """検索条件から、候補の絞り込みに使うトークンを作る
+
+    検索語より短いn-gramは使わず、登録されている最長のn-gramで引く。
+    n-gramの一致は部分一致の必要条件のため、候補は元の値で検証する。
+    """
+    tokens = set()
+    for field, value in criteria.items():
+        if field in EXACT_FIELDS:
+            tokens.add(f"{field}={value}")
+            continue
+        sizes = [size for size in TEXT_FIELDS[field] if size <= len(value)]
+        if not sizes:
+            raise ValueError(f"{_FIELD_LABELS[field]}は{min(TEXT_FIELDS[field])}文字以上で検索してください")
+        tokens |= {f"{field}:{gram}" for gram in _ngrams(value, max(sizes))}
+    return tokens
+
+def matches(doc: dict, criteria: Dict[str, str]) -> bool:
+    """予約が検索条件（部分一致・完全一致）をすべて満たすか"""
+    fields = searchable_fields(doc)
+    for field, value in criteria.items():
+        if field in EXACT_FIELDS:
+            if fields[field] != value:
+                return False
+        elif value not in fields[field]:
+            return False
+    return True
+
+def _token_hash(token: str) -> int:
+    return int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+
+class Segment:
+    """ディスク上の読み取り専用セグメント（mmapで必要な部分だけを読み込む）
+
+    トークンテーブルはハッシュ順に並んでいるため二分探索で引く。
+    ハッシュが衝突した場合はポスティングが混ざるが、候補は検索時に元の値で検証する。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.doc_count, self.token_count, self._doc_table, _, self._token_table = _HEADER.unpack_from(self._mmap, 0)
+        if magic != _SEGMENT_MAGIC:
+            raise ValueError(f"検索インデックスのセグメントが不正です: {path}")
+
+    @classmethod
+    def write(cls, path: str, docs: Iterable[dict]) -> "Segment":
+        """予約をセグメントファイルに書き出して開く"""
+        postings: Dict[int, List[int]] = defaultdict(list)
+        doc_entries = []
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(b"\0" * _HEADER.size)
+            for number, doc in enumerate(docs):
+                data = json.dumps(doc, ensure_ascii=False, default=str).encode("utf-8")
+                doc_entries.append((f.tell(), len(data)))
+                f.write(data)
+                for token in document_tokens(doc):
+                    postings[_token_hash(token)].append(number)
+
+            doc_table = f.tell()
+            for offset, length in doc_entries:
+                f.write(_DOC_ENTRY.pack(offset, length))
+
+            postings_start = f.tell()
+            token_entries = []
+            for token_hash in sorted(postings):
+                numbers = postings[token_hash]
+                token_entries.append((token_hash, f.tell(), len(numbers)))
+                f.write(struct.pack(f"<{len(numbers)}I", *numbers))
+
+            token_table = f.tell()
+            for entry in token_entries:
+                f.write(_TOKEN_ENTRY.pack(*entry))
+
+            f.seek(0)
+            f.write(_HEADER.pack(_SEGMENT_MAGIC, len(doc_entries), len(token_entries), doc_table, postings_start, token_table))
+        os.replace(tmp_path, path)
+        return cls(path)
+
+    def postings(self, token: str) -> Set[int]:
+        """トークンを含む予約の番号"""
+        target = _token_hash(token)
+        low, high = 0, self.token_count
+        while low < high:
+            middle = (low + high) // 2
+            token_hash, offset, count = _TOKEN_ENTRY.unpack_from(self._mmap, self._token_table + middle * _TOKEN_ENTRY.size)
+            if token_hash == target:
+                return set(struct.unpack_from(f"<{count}I", self._mmap, offset))
+            if token_hash < target:
+                low = middle + 1
+            else:
+                high = middle
+        return set()
+
+    def doc(self, number: int) -> dict:
+        offset, length = _DOC_ENTRY.unpack_from(self._mmap, self._doc_table + number * _DOC_ENTRY.size)
+        return json.loads(self._mmap[offset:offset + length])
+
+    def docs(self) -> Iterator[dict]:
+        for number in range(self.doc_count):
+            yield self.doc(number)
+
+    def close(self, remove: bool = True) -> None:
+        self._mmap.close()
+        self._file.close()
+        if remove:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+class ReservationSearchIndex:
+    """予約の検索インデックス（スレッドセーフ）
+
+    更新はメモリ上の転置インデックスに反映し、件数が上限を超えたら
+    ディスク上のセグメントと統合して書き出す（書き出し中もロックは保持せず、検索・更新を止めない）。
+    セグメント内の予約が更新・削除された場合は削除済みとして記録し、検索結果から除外する。
+    反映できなかった変更がある場合は stale とし、全件から作り直すまで ready にしない。
+    """
+
+    def __init__(self, max_memory_docs: int = SEARCH_INDEX_MAX_MEMORY_DOCS, directory: str = SEARCH_INDEX_DIR):
+        self.max_memory_docs = max_memory_docs
+        self.directory = directory
+        self._docs: Dict[str, dict] = {}
+        self._postings: Dict[str, Set[str]] = defaultdict(set)
+        self._segment: Optional[Segment] = None
+        self._segment_deleted: Set[str] = set()
+        self._generation = 0
+        self._lock = threading.RLock()
+        # 書き出し中に更新・削除された予約（None は書き出し中でない）
+        self._changed_during_spill: Optional[Set[str]] = None
+        self.ready = False
+        self.stale = False
+
+    def upsert(self, doc_id: str, doc: dict) -> None:
+        """予約を登録・更新"""
+        with self._lock:
+            self._forget(doc_id)
+            doc = dict(doc, reservation_id=doc.get("reservation_id", doc_id))
+            self._docs[doc_id] = doc
+            for token in document_tokens(doc):
+                self._postings[token].add(doc_id)
+            should_spill = len(self._docs) > self.max_memory_docs and self._changed_during_spill is None
+        if should_spill:
+            self._spill()
+
+    def remove(self, doc_id: str) -> None:
+        """予約を削除"""
+        with self._lock:
+            self._forget(doc_id)
+
+    def rebuild(self, docs: Iterable[tuple]) -> None:
+        """(予約ID, 予約) の一覧から作り直す"""
+        self.clear()
+        for doc_id, doc in docs:
+            self.upsert(doc_id, doc)
+
+    def mark_ready(self) -> None:
+        """すべての変更を反映できた状態にする"""
+        with self._lock:
+            self.ready = True
+            self.stale = False
+
+    def mark_stale(self) -> None:
+        """反映できなかった変更があるため、作り直すまで検索に使わない"""
+        with self._lock:
+            self.ready = False
+            self.stale = True
+
+    def clear(self) -> None:
+        with self._lock:
+            self._docs.clear()
+            self._postings.clear()
+            if self._segment is not None:
+                self._segment.close()
+                self._segment = None
+            self._segment_deleted.clear()
+            self.ready = False
+
+    def _forget(self, doc_id: str) -> None:
+        """メモリ上の予約を削除し、セグメント内の予約は削除済みとして記録（ロック内で呼び出す）"""
+        self._remove_from_memory(doc_id)
+        if self._segment is not None:
+            self._segment_deleted.add(doc_id)
+        if self._changed_during_spill is not None:
+            self._changed_during_spill.add(doc_id)
+
+    def _remove_from_memory(self, doc_id: str) -> None:
+        doc = self._docs.pop(doc_id, None)
+        if doc is None:
+            return
+        for token in document_tokens(doc):
+            ids = self._postings.get(token)
+            if ids is not None:
+                ids.discard(doc_id)
+                if not ids:
+                    del self._postings[token]
+
+    def _spill(self) -> None:
+        """メモリ上の予約と既存のセグメントを統合し、新しいセグメントに書き出す
+
+        書き出しはロックの外で行い、書き出し中の更新・削除は新しいセグメントで削除済みとして扱う。
+        """
+        with self._lock:
+            if self._changed_during_spill is not None:
+                return
+            self._changed_during_spill = set()
+            memory_docs = dict(self._docs)
+            old_segment = self._segment
+            old_deleted = set(self._segment_deleted)
+            self._generation += 1
+            generation = self._generation
+
+        def live_docs() -> Iterator[dict]:
+            if old_segment is not None:
+                for doc in old_segment.docs():
+                    if doc["reservation_id"] not in old_deleted:
+                        yield doc
+            yield from memory_docs.values()
+
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            if generation == 1:
+                # 同じプロセスIDで残っている古いセグメントは変更通知から作り直すため削除する
+                for path in glob.glob(os.path.join(self.directory, f"segment_{os.getpid()}_*.bin*")):
+                    os.remove(path)
+            path = os.path.join(self.directory, f"segment_{os.getpid()}_{generation}.bin")
+            segment = Segment.write(path, live_docs())
+        except Exception:
+            with self._lock:
+                self._changed_during_spill = None
+            raise
+
+        with self._lock:
+            changed = self._changed_during_spill
+            self._changed_during_spill = None
+            if self._segment is not old_segment:
+                # 書き出し中に破棄された場合は、書き出したセグメントを使わない
+                segment.close()
+                return
+            for doc_id in memory_docs:
+                if doc_id not in changed:
+                    self._remove_from_memory(doc_id)
+            if old_segment is not None:
+                old_segment.close()
+            self._segment = segment
+            self._segment_deleted = changed
+        logger.info(f"検索インデックスをディスクに書き出しました: {segment.doc_count}件")
+
+    def search(self, criteria: Dict[str, str], limit: int = 100) -> List[dict]:
+        """条件をすべて満たす予約を作成日時の降順で返す
+
+        criteria のキーは name / phone / email / number / visit_date / status。
+        """
+        criteria = {
+            field: (_NORMALIZERS[field](value) if field in _NORMALIZERS else value)
+            for field, value in criteria.items() if value
+        }
+        if not criteria:
+            raise ValueError("検索条件を1つ以上指定してください")
+        tokens = query_tokens(criteria)
+
+        with self._lock:
+            results = []
+            memory_ids = None
+            for token in tokens:
+                ids = self._postings.get(token, set())
+                memory_ids = set(ids) if memory_ids is None else memory_ids & ids
+                if not memory_ids:
+                    break
+            results += [self._docs[doc_id] for doc_id in memory_ids or ()]
+
+            if self._segment is not None:
+                numbers = None
+                for token in tokens:
+                    found = self._segment.postings(token)
+                    numbers = found if numbers is None else numbers & found
+                    if not numbers:
+                        break
+                for number in numbers or ():
+                    doc = self._segment.doc(number)
+                    if doc["reservation_id"] not in self._segment_deleted:
+                        results.append(doc)
+
+        results = [dict(doc) for doc in results if matches(doc, criteria)]
+        results.sort(key=lambda doc: doc.get("created_at", ""), reverse=True)
+        return results[:limit]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "ready": self.ready,
+                "stale": self.stale,
+                "memory_docs": len(self._docs),
+                "memory_tokens": len(self._postings),
+                "segment_docs": self._segment.doc_count if self._segment else 0,
+                "segment_deleted": len(self._segment_deleted),
+            }
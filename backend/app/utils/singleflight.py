@@ -0,0 +1,45 @@
+# 同一キーの処理の多重実行を防ぐシングルフライト
+import asyncio
+import copy
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+class InFlightConflictError(Exception):
+    """同じキーで内容の異なる処理が実行中の場合のエラー"""
+
+class SingleFlight:
+    """同じキーの処理を同時に1件だけ実行する（イベントループ内で使用）
+
+    実行中に同じキー・同じ内容（fingerprint）の呼び出しがあった場合は、実行中の処理の結果を共有する。
+    内容が異なる場合は InFlightConflictError を送出する。
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, Tuple[str, asyncio.Future]] = {}
+
+    def is_in_flight(self, key: Hashable) -> bool:
+        return key in self._calls
+
+    async def run(self, key: Hashable, fingerprint: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        existing = self._calls.get(key)
+        if existing is not None:
+            existing_fingerprint, future = existing
+            if existing_fingerprint != fingerprint:
+                raise InFlightConflictError(key)
+            # 後続の呼び出しには結果のコピーを返す（先行の呼び出しの結果を変更されないように）
+            result = await asyncio.shield(future)
+            return copy.deepcopy(result)
+
+        future = asyncio.get_running_loop().create_future()
+        # 後続の呼び出しがない場合に「例外が取得されなかった」警告を出さない
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._calls[key] = (fingerprint, future)
+        try:
+            result = await fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            self._calls.pop(key, None)
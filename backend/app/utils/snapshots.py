@@ -0,0 +1,111 @@
+# 最後に正常取得できたデータのスナップショット（Firestore障害時の読み取り専用フォールバック）
+import asyncio
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Optional, Tuple
+from fastapi import Response
+from app.utils.firebase import FirebaseInitializationError
+from app.utils.storage import StorageUnavailableError
+
+logger = logging.getLogger(__name__)
+
+# スナップショットの保存先（プロセス再起動後もフォールバックできるようローカルディスクにも保存）
+SNAPSHOT_DIR = os.getenv(
+    "SNAPSHOT_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), ".snapshots"),
+)
+# 同じキーをディスクに書き込む最短間隔（秒）
+SNAPSHOT_DISK_INTERVAL = float(os.getenv("SNAPSHOT_DISK_INTERVAL", "60"))
+# メモリに保持するスナップショットの最大件数
+SNAPSHOT_MAX_ENTRIES = int(os.getenv("SNAPSHOT_MAX_ENTRIES", "512"))
+
+# Firestoreが利用できないことを示すエラー
+OUTAGE_ERRORS = (StorageUnavailableError, FirebaseInitializationError)
+
+_snapshots: "OrderedDict[str, Tuple[datetime, Any]]" = OrderedDict()
+_last_disk_write = {}
+_lock = threading.Lock()
+
+def _snapshot_path(key: str) -> str:
+    """キーに対応するファイルパス"""
+    return os.path.join(SNAPSHOT_DIR, re.sub(r"[^0-9A-Za-z_.-]", "_", key) + ".json")
+
+def _write_to_disk(key: str, saved_at: datetime, data: Any) -> None:
+    """スナップショットをファイルに書き込む（書き込み途中のファイルを読まないよう置き換えで保存）"""
+    try:
+        os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+        path = _snapshot_path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"saved_at": saved_at.isoformat(), "data": data}, f, ensure_ascii=False, default=str)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f"スナップショットを保存できませんでした ({key}): {e}")
+
+def save_snapshot(key: str, data: Any) -> bool:
+    """スナップショットをメモリに保存し、ディスクへの書き込みが必要かどうかを返す"""
+    now = time.monotonic()
+    with _lock:
+        _snapshots[key] = (datetime.now(), data)
+        _snapshots.move_to_end(key)
+        while len(_snapshots) > SNAPSHOT_MAX_ENTRIES:
+            evicted, _ = _snapshots.popitem(last=False)
+            _last_disk_write.pop(evicted, None)
+
+        if now - _last_disk_write.get(key, float("-inf")) < SNAPSHOT_DISK_INTERVAL:
+            return False
+        _last_disk_write[key] = now
+        return True
+
+def load_snapshot(key: str) -> Optional[Tuple[Any, datetime]]:
+    """スナップショットを取得（メモリになければディスクから読み込む）。戻り値は (データ, 保存日時)"""
+    with _lock:
+        entry = _snapshots.get(key)
+    if entry is not None:
+        saved_at, data = entry
+        return data, saved_at
+
+    try:
+        with open(_snapshot_path(key), "r", encoding="utf-8") as f:
+            stored = json.load(f)
+        return stored["data"], datetime.fromisoformat(stored["saved_at"])
+    except (OSError, ValueError, KeyError):
+        return None
+
+async def read_through_snapshot(
+    key: str,
+    loader: Callable[[], Awaitable[Any]],
+    should_save: Optional[Callable[[Any], bool]] = None,
+) -> Tuple[Any, Optional[datetime]]:
+    """データを取得し、成功時はスナップショットを更新する
+
+    Firestoreが利用できない場合はスナップショットを返す。
+    戻り値は (データ, スナップショットの保存日時)。最新のデータを取得できた場合の保存日時は None。
+    スナップショットがない場合は元のエラーを送出する。
+    """
+    try:
+        data = await loader()
+    except OUTAGE_ERRORS as e:
+        snapshot = load_snapshot(key)
+        if snapshot is None:
+            raise
+        logger.warning(f"Firestoreが利用できないため、スナップショットで応答しました ({key}): {e}")
+        return snapshot
+
+    if should_save is None or should_save(data):
+        if save_snapshot(key, data):
+            await asyncio.to_thread(_write_to_disk, key, datetime.now(), data)
+    return data, None
+
+def mark_stale(response: Response, saved_at: Optional[datetime]) -> None:
+    """スナップショットで応答した場合にヘッダーで通知"""
+    if saved_at is None:
+        return
+    response.headers["X-Data-Stale"] = "true"
+    response.headers["X-Snapshot-At"] = saved_at.isoformat()
@@ -0,0 +1,253 @@
+# Firestore呼び出しの共通実行レイヤー（再試行・バックオフ・リクエスト期限）
+import asyncio
+import contextvars
+import logging
+import os
+import random
+import threading
+import time
+from typing import Any, Callable, Optional
+from google.api_core import exceptions as gexc
+from app.utils.errors import STORAGE_RETRY_AFTER, StorageUnavailableError
+from app.utils.concurrency import LaneOverloadedError, get_request_lane, lane_limiter, STORAGE_QUEUE_TIMEOUT
+from app.utils.firebase import get_firestore_db
+from app.utils.metrics import increment
+
+logger = logging.getLogger(__name__)
+
+# 再試行の設定
+STORAGE_MAX_ATTEMPTS = int(os.getenv("STORAGE_MAX_ATTEMPTS", "5"))
+STORAGE_BACKOFF_BASE = float(os.getenv("STORAGE_BACKOFF_BASE", "0.1"))  # 秒
+STORAGE_BACKOFF_MAX = float(os.getenv("STORAGE_BACKOFF_MAX", "2.0"))  # 秒
+
+# 過負荷で打ち切った503応答で返す再試行までの目安（秒）
+STORAGE_OVERLOAD_RETRY_AFTER = int(os.getenv("STORAGE_OVERLOAD_RETRY_AFTER", "1"))
+
+# サーキットブレーカーの設定（連続失敗回数と、遮断後に試行を再開するまでの秒数）
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("STORAGE_CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_TIMEOUT = float(os.getenv("STORAGE_CIRCUIT_RESET_TIMEOUT", "30"))
+
+# 何度実行しても結果が変わらない操作（読み取り・上書き）で再試行するエラー
+_IDEMPOTENT_RETRYABLE = (
+    gexc.Aborted,
+    gexc.DeadlineExceeded,
+    gexc.ServiceUnavailable,
+    gexc.InternalServerError,
+    gexc.TooManyRequests,
+    gexc.ResourceExhausted,
+)
+
+# 加算などの非冪等な書き込みでは、書き込みが反映されていないことが確実なエラーのみ再試行する
+_NON_IDEMPOTENT_RETRYABLE = (
+    gexc.Aborted,
+    gexc.TooManyRequests,
+    gexc.ResourceExhausted,
+)
+
+# リクエストの処理期限（time.monotonic() 基準、None は期限なし）
+_request_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar(
+    "request_deadline", default=None
+)
+
+class CircuitBreaker:
+    """Firestoreの障害時に呼び出しを即座に失敗させるサーキットブレーカー（スレッドセーフ）
+
+    closed: 通常状態。再試行しても失敗した呼び出しが連続 failure_threshold 回に達すると open になる。
+    open: 呼び出しを行わずに失敗させる。reset_timeout 秒経過後に half_open になる。
+    half_open: 1件だけ試行し、成功すれば closed、失敗すれば再び open に戻る。
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == "open" and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return "half_open"
+            return self._state
+
+    def allow(self) -> bool:
+        """呼び出しを許可するかどうか"""
+        with self._lock:
+            if self._state == "closed":
+                return True
+            if self._state == "open":
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    return False
+                self._state = "half_open"
+                self._probing = False
+            # half_open: 同時に試行するのは1件のみ
+            if self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._state != "closed":
+                logger.info("Firestoreへの接続が回復しました（サーキットブレーカーを解除）")
+            self._state = "closed"
+            self._failures = 0
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self._state == "half_open" or self._failures >= self.failure_threshold:
+                if self._state != "open":
+                    logger.error(
+                        f"Firestoreの呼び出しが連続して失敗したため、{self.reset_timeout:.0f}秒間呼び出しを遮断します"
+                    )
+                self._state = "open"
+                self._opened_at = time.monotonic()
+
+    def retry_after(self) -> int:
+        """次に試行が再開されるまでの秒数"""
+        with self._lock:
+            if self._state != "open":
+                return STORAGE_RETRY_AFTER
+            remaining = self.reset_timeout - (time.monotonic() - self._opened_at)
+            return max(1, int(remaining + 0.999))
+
+circuit_breaker = CircuitBreaker(CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_TIMEOUT)
+
+def set_request_deadline(timeout: Optional[float]) -> contextvars.Token:
+    """現在のリクエストの処理期限を設定（timeout秒後）"""
+    deadline = time.monotonic() + timeout if timeout else None
+    return _request_deadline.set(deadline)
+
+def reset_request_deadline(token: contextvars.Token) -> None:
+    """処理期限の設定を元に戻す"""
+    _request_deadline.reset(token)
+
+def get_remaining_time() -> Optional[float]:
+    """処理期限までの残り時間（秒）。期限が設定されていない場合はNone"""
+    deadline = _request_deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+def _is_transaction_contention(error: Exception) -> bool:
+    """トランザクションが競合により規定回数失敗した場合のエラーかどうか"""
+    return isinstance(error, ValueError) and isinstance(error.__cause__, gexc.Aborted)
+
+def _backoff(attempt: int) -> float:
+    """指数バックオフ（フルジッター）の待機時間"""
+    return random.uniform(0, min(STORAGE_BACKOFF_MAX, STORAGE_BACKOFF_BASE * (2 ** attempt)))
+
+def _record_outcome(contention: bool) -> None:
+    """再試行を打ち切った呼び出しの結果をサーキットブレーカーに記録
+
+    トランザクションの競合はFirestoreが応答しているため障害とはみなさない
+    """
+    if contention:
+        circuit_breaker.record_success()
+    else:
+        circuit_breaker.record_failure()
+
+def call_with_retry(operation: str, fn: Callable[..., Any], *args, idempotent: bool = True, **kwargs) -> Any:
+    """Firestore呼び出しを一時的なエラー時に再試行しながら実行（同期処理）
+
+    リクエストの処理期限を超える待機は行わず、期限切れの場合は StorageUnavailableError を送出する。
+    サーキットブレーカーが遮断中の場合は呼び出しを行わずに StorageUnavailableError を送出する。
+    非冪等な書き込み（idempotent=False）は反映されていないことが確実なエラーのみ再試行する。
+    """
+    retryable = _IDEMPOTENT_RETRYABLE if idempotent else _NON_IDEMPOTENT_RETRYABLE
+    increment(operation, "calls")
+
+    remaining = get_remaining_time()
+    if remaining is not None and remaining <= 0:
+        increment(operation, "deadline_exceeded")
+        raise StorageUnavailableError(operation)
+
+    # 障害中は呼び出しを行わずに即座に失敗させる
+    if not circuit_breaker.allow():
+        increment(operation, "short_circuited")
+        raise StorageUnavailableError(operation, retry_after=circuit_breaker.retry_after())
+
+    attempt = 0
+    while True:
+        try:
+            result = fn(*args, **kwargs)
+            circuit_breaker.record_success()
+            return result
+        except Exception as e:
+            contention = _is_transaction_contention(e)
+            if not contention and not isinstance(e, retryable):
+                # 業務エラーやNotFoundなどはFirestoreが応答しているため障害とはみなさない
+                circuit_breaker.record_success()
+                raise
+            increment(operation, "aborts" if contention or isinstance(e, gexc.Aborted) else "errors")
+
+            attempt += 1
+            if attempt >= STORAGE_MAX_ATTEMPTS:
+                increment(operation, "failures")
+                logger.warning(f"Firestore呼び出しが{attempt}回失敗しました ({operation}): {e}")
+                _record_outcome(contention)
+                raise StorageUnavailableError(operation) from e
+
+            delay = _backoff(attempt)
+            remaining = get_remaining_time()
+            if remaining is not None and delay >= remaining:
+                increment(operation, "deadline_exceeded")
+                _record_outcome(contention)
+                raise StorageUnavailableError(operation) from e
+
+            increment(operation, "retries")
+            time.sleep(delay)
+
+async def run_storage(operation: str, fn: Callable[..., Any], *args, idempotent: bool = True, **kwargs) -> Any:
+    """Firestore呼び出しをスレッドで実行（再試行・処理期限・レーンごとの同時実行数制限つき）
+
+    同時実行数の上限に達している場合は待ち行列で待機し、待ち行列が満杯または
+    待ち時間が上限（処理期限がそれより短い場合は処理期限）を超えた場合は503で打ち切る。
+    """
+    lane = get_request_lane()
+    timeout = STORAGE_QUEUE_TIMEOUT
+    remaining = get_remaining_time()
+    if remaining is not None:
+        timeout = max(0.0, min(timeout, remaining))
+
+    try:
+        slot = await lane_limiter.acquire(lane, timeout)
+    except LaneOverloadedError:
+        increment(operation, "shed")
+        raise StorageUnavailableError(
+            operation,
+            retry_after=STORAGE_OVERLOAD_RETRY_AFTER,
+            detail="アクセスが集中しているため処理できませんでした。しばらくしてから再度お試しください",
+        )
+    work = asyncio.ensure_future(
+        asyncio.to_thread(call_with_retry, operation, fn, *args, idempotent=idempotent, **kwargs)
+    )
+
+    def release_slot(task: asyncio.Future) -> None:
+        lane_limiter.release(lane, slot)
+        if not task.cancelled():
+            # 呼び出し元がキャンセルされた場合に、未取得の例外として記録されないようにする
+            task.exception()
+
+    # スレッドの処理は中断できないため、呼び出し元がキャンセルされても終了するまで枠を保持する
+    work.add_done_callback(release_slot)
+    return await asyncio.shield(work)
+
+async def run_transaction(operation: str, fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """@firestore.transactional 関数を実行（競合で失敗した場合は新しいトランザクションで再試行）
+
+    コミットが反映された後に応答が失われた場合に読み取りからやり直すと、反映済みの状態を
+    業務エラーと判定してしまうため、反映されていないことが確実なエラーのみ再試行する。
+    """
+    db = get_firestore_db()
+
+    def attempt():
+        return fn(db.transaction(), *args, **kwargs)
+
+    return await run_storage(operation, attempt, idempotent=False)
@@ -0,0 +1,49 @@
+# Firestoreインデックス定義生成スクリプト
+"""
+サービスが発行するクエリ形状から firestore.indexes.json を生成し、
+firebase.json にFirestoreインデックスのデプロイ設定を追加するスクリプト
+使用方法: python generate_firestore_indexes.py [--check]
+  --check: ファイルを書き換えずに、生成結果と既存ファイルの差分有無のみ確認する
+"""
+import json
+import sys
+from pathlib import Path
+
+from app.utils.firestore_indexes import build_index_manifest
+
+REPO_ROOT = Path(__file__).parent.parent
+INDEXES_PATH = REPO_ROOT / "firestore.indexes.json"
+FIREBASE_CONFIG_PATH = REPO_ROOT / "firebase.json"
+
+def _dump(data: dict) -> str:
+    return json.dumps(data, ensure_ascii=False, indent=2) + "\n"
+
+def generate_firestore_indexes(check_only: bool = False) -> bool:
+    """インデックス定義を生成（check_only の場合は差分の有無を返す）"""
+    manifest = _dump(build_index_manifest())
+    current = INDEXES_PATH.read_text(encoding="utf-8") if INDEXES_PATH.exists() else ""
+
+    if check_only:
+        if current != manifest:
+            print(f"✗ {INDEXES_PATH.name} が最新ではありません。python generate_firestore_indexes.py を実行してください")
+            return False
+        print(f"✓ {INDEXES_PATH.name} は最新です")
+        return True
+
+    INDEXES_PATH.write_text(manifest, encoding="utf-8")
+    print(f"✓ {INDEXES_PATH.name} を書き出しました（{len(json.loads(manifest)['indexes'])}件の複合インデックス）")
+
+    # firebase.json にFirestoreのインデックス設定を追加
+    config = json.loads(FIREBASE_CONFIG_PATH.read_text(encoding="utf-8"))
+    firestore_config = config.setdefault("firestore", {})
+    if firestore_config.get("indexes") != INDEXES_PATH.name:
+        firestore_config["indexes"] = INDEXES_PATH.name
+        FIREBASE_CONFIG_PATH.write_text(_dump(config), encoding="utf-8")
+        print(f"✓ {FIREBASE_CONFIG_PATH.name} にインデックス設定を追加しました")
+
+    print("デプロイ: firebase deploy --only firestore:indexes")
+    return True
+
+if __name__ == "__main__":
+    success = generate_firestore_indexes(check_only="--check" in sys.argv[1:])
+    sys.exit(0 if success else 1)
@@ -0,0 +1,53 @@
+# テスト共通の設定（Firestoreはインメモリの実装に差し替える）
+import os
+import shutil
+import tempfile
+
+# アプリの読み込み前に設定する（起動時のインデックス検証・レート制限を無効化し、ファイルは一時ディレクトリに保存）
+os.environ.setdefault("FIRESTORE_INDEX_CHECK", "0")
+os.environ.setdefault("RATE_LIMIT_ENABLED", "0")
+os.environ.setdefault("SNAPSHOT_DIR", tempfile.mkdtemp(prefix="snapshots-"))
+os.environ.setdefault("SEARCH_INDEX_DIR", tempfile.mkdtemp(prefix="search-index-"))
+
+import pytest
+from tests.fake_firestore import FakeFirestore
+
+def _reset_state() -> None:
+    """テスト間で共有されるキャッシュ・集計をリセット"""
+    from app.services import calendar_service, product_service, reservation_service, schedule_service, timeslot_service
+    from app.utils import firestore_write, metrics, snapshots
+    from app.utils.storage import circuit_breaker
+
+    calendar_service.clear_calendar_cache()
+    timeslot_service.missing_timeslots.clear()
+    schedule_service._rules_cache.clear()
+    product_service.invalidate_product_catalog()
+    product_service.missing_products.clear()
+    reservation_service.missing_reservation_numbers.clear()
+    snapshots._snapshots.clear()
+    snapshots._last_disk_write.clear()
+    shutil.rmtree(snapshots.SNAPSHOT_DIR, ignore_errors=True)
+    firestore_write._known_versions.clear()
+    metrics.reset_metrics()
+    circuit_breaker.record_success()
+
+@pytest.fixture
+def db(monkeypatch):
+    """インメモリのFirestoreを使用する"""
+    import app.utils.firebase as firebase
+
+    fake = FakeFirestore()
+    monkeypatch.setattr(firebase, "_db", fake)
+    monkeypatch.setattr(firebase, "_initialization_error", None)
+    _reset_state()
+    yield fake
+    _reset_state()
+
+@pytest.fixture
+def client(db):
+    """インメモリのFirestoreを使用するテストクライアント"""
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    with TestClient(app) as test_client:
+        yield test_client
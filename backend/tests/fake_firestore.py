@@ -0,0 +1,311 @@
+# テスト用のインメモリFirestore（サービス層が使用するAPIのみ実装）
+import copy
+import itertools
+import uuid
+from google.api_core import exceptions as gexc
+from google.cloud.firestore_v1 import Increment
+
+# 書き込みごとに増える更新時刻（update_time の代わり）
+_clock = itertools.count(1)
+
+def _apply(old: dict, data: dict) -> dict:
+    new = dict(old or {})
+    for key, value in data.items():
+        if isinstance(value, Increment):
+            new[key] = (new.get(key) or 0) + value.value
+        else:
+            new[key] = value
+    return new
+
+def _match(data: dict, field_filter) -> bool:
+    value = data.get(field_filter.field_path)
+    op, expected = field_filter.op_string, field_filter.value
+    if op == "==":
+        return value == expected
+    if op == "in":
+        return value in expected
+    if value is None:
+        return False
+    return {">=": value >= expected, "<=": value <= expected, ">": value > expected, "<": value < expected}[op]
+
+class Snapshot:
+    def __init__(self, ref, data, update_time=None):
+        self.reference = ref
+        self.id = ref.id
+        self._data = copy.deepcopy(data) if data is not None else None
+        self.exists = data is not None
+        self.update_time = update_time
+
+    def to_dict(self):
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+    def get(self, field):
+        return self._data.get(field)
+
+class WriteResult:
+    def __init__(self, update_time):
+        self.update_time = update_time
+
+class WriteOption:
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+
+class DocumentReference:
+    def __init__(self, db, collection: str, doc_id: str):
+        self._db = db
+        self._collection = collection
+        self.id = doc_id
+        self.path = f"{collection}/{doc_id}"
+
+    @property
+    def _store(self) -> dict:
+        return self._db.data.setdefault(self._collection, {})
+
+    def _check(self, option, must_exist: bool = False):
+        self._db.before_write(self)
+        entry = self._store.get(self.id)
+        if option is not None:
+            if "last_update_time" in option.kwargs and (entry is None or entry[1] != option.kwargs["last_update_time"]):
+                raise gexc.FailedPrecondition("precondition failed")
+            if option.kwargs.get("exists") is True and entry is None:
+                raise gexc.NotFound("No document to update")
+        if must_exist and entry is None:
+            raise gexc.NotFound("No document to update")
+        return entry
+
+    def get(self, **kwargs):
+        self._db.ops.append(("get", self.path))
+        self._db.before_read(self)
+        entry = self._store.get(self.id)
+        return Snapshot(self, entry[0] if entry else None, entry[1] if entry else None)
+
+    def set(self, data, merge=False, **kwargs):
+        self._db.ops.append(("set", self.path))
+        entry = self._check(None)
+        update_time = next(_clock)
+        self._store[self.id] = (_apply(entry[0] if (merge and entry) else {}, data), update_time)
+        return WriteResult(update_time)
+
+    def create(self, data, **kwargs):
+        self._db.ops.append(("create", self.path))
+        if self._check(None) is not None:
+            raise gexc.Conflict("Document already exists")
+        update_time = next(_clock)
+        self._store[self.id] = (_apply({}, data), update_time)
+        return WriteResult(update_time)
+
+    def update(self, data, option=None, **kwargs):
+        self._db.ops.append(("update", self.path))
+        entry = self._check(option, must_exist=True)
+        update_time = next(_clock)
+        self._store[self.id] = (_apply(entry[0], data), update_time)
+        return WriteResult(update_time)
+
+    def delete(self, option=None, **kwargs):
+        self._db.ops.append(("delete", self.path))
+        self._check(option)
+        self._store.pop(self.id, None)
+        return WriteResult(next(_clock))
+
+class Query:
+    def __init__(self, db, collection, filters=(), orders=(), limit=None, start_after=None, fields=None):
+        self._db = db
+        self._collection = collection
+        self._filters = list(filters)
+        self._orders = list(orders)
+        self._limit = limit
+        self._start_after = start_after
+        self._fields = fields
+
+    def _copy(self, **changes):
+        params = dict(
+            filters=self._filters, orders=self._orders, limit=self._limit,
+            start_after=self._start_after, fields=self._fields,
+        )
+        params.update(changes)
+        return Query(self._db, self._collection, **params)
+
+    def where(self, *args, filter=None):
+        return self._copy(filters=self._filters + [filter])
+
+    def order_by(self, field, direction="ASCENDING"):
+        return self._copy(orders=self._orders + [(field, direction)])
+
+    def limit(self, count):
+        return self._copy(limit=count)
+
+    def start_after(self, snapshot_or_values):
+        return self._copy(start_after=snapshot_or_values)
+
+    def select(self, fields):
+        return self._copy(fields=fields)
+
+    def _results(self):
+        if self._db.fail_query is not None:
+            self._db.fail_query(self._collection, self._filters)
+        if self._db.range_index_error and self._collection == "timeslots":
+            if any(f.op_string not in ("==", "in") for f in self._filters):
+                raise gexc.FailedPrecondition("The query requires an index. You can create it here: https://example")
+
+        store = self._db.data.get(self._collection, {})
+        rows = [(doc_id, entry) for doc_id, entry in store.items() if all(_match(entry[0], f) for f in self._filters)]
+        orders = self._orders or [
+            (f.field_path, "ASCENDING") for f in self._filters if f.op_string not in ("==", "in")
+        ][:1]
+
+        def sort_key(row):
+            doc_id, (data, _) = row
+            values = [doc_id if field == "__name__" else data.get(field) for field, _ in orders] + [doc_id]
+            return tuple((value is None, value) for value in values)
+
+        rows.sort(key=sort_key)
+        if orders and orders[0][1] == "DESCENDING":
+            rows.reverse()
+
+        if self._start_after is not None:
+            if isinstance(self._start_after, Snapshot):
+                ids = [doc_id for doc_id, _ in rows]
+                after_id = self._start_after.id
+                rows = rows[ids.index(after_id) + 1:] if after_id in ids else []
+            else:
+                cursor = tuple(self._start_after[field] for field, _ in orders)
+                rows = [row for row in rows if tuple(row[1][0].get(field) for field, _ in orders) > cursor]
+        if self._limit is not None:
+            rows = rows[:self._limit]
+        return rows
+
+    def stream(self, **kwargs):
+        self._db.ops.append(("query", self._collection))
+        for doc_id, (data, update_time) in self._results():
+            if self._fields is not None:
+                data = {field: data.get(field) for field in self._fields}
+            yield Snapshot(DocumentReference(self._db, self._collection, doc_id), data, update_time)
+
+    def get(self, **kwargs):
+        return list(self.stream())
+
+class CollectionReference(Query):
+    def __init__(self, db, name):
+        super().__init__(db, name)
+        self.id = name
+
+    def document(self, doc_id=None):
+        return DocumentReference(self._db, self._collection, doc_id or uuid.uuid4().hex)
+
+class WriteBatch:
+    def __init__(self, db):
+        self._db = db
+        self._writes = []
+
+    def set(self, ref, data, merge=False):
+        self._writes.append(lambda: ref.set(data, merge=merge))
+
+    def create(self, ref, data):
+        self._writes.append(lambda: ref.create(data))
+
+    def update(self, ref, data, option=None):
+        self._writes.append(lambda: ref.update(data, option=option))
+
+    def delete(self, ref, option=None):
+        self._writes.append(lambda: ref.delete(option=option))
+
+    def __len__(self):
+        return len(self._writes)
+
+    def commit(self, **kwargs):
+        """すべての書き込みを適用（1件でも失敗した場合は何も反映しない）"""
+        self._db.ops.append(("commit", len(self._writes)))
+        saved = copy.deepcopy(self._db.data)
+        try:
+            results = [write() for write in self._writes]
+        except Exception:
+            self._db.data = saved
+            raise
+        self._writes = []
+        return results
+
+class Transaction(WriteBatch):
+    """@firestore.transactional から利用されるトランザクション"""
+
+    def __init__(self, db, **kwargs):
+        super().__init__(db)
+        self._id = None
+        self._max_attempts = kwargs.get("max_attempts", 5)
+        self._read_only = False
+
+    def get(self, ref_or_query, **kwargs):
+        if isinstance(ref_or_query, DocumentReference):
+            return ref_or_query.get()
+        return ref_or_query.stream()
+
+    def get_all(self, refs, **kwargs):
+        return self._db.get_all(refs)
+
+    def _begin(self, retry_id=None):
+        self._id = b"transaction"
+
+    def _clean_up(self):
+        self._writes = []
+        self._id = None
+
+    def _rollback(self):
+        self._clean_up()
+
+    def _commit(self):
+        results = WriteBatch.commit(self)
+        self._clean_up()
+        return results
+
+    @property
+    def in_progress(self):
+        return self._id is not None
+
+    @property
+    def id(self):
+        return self._id
+
+class FakeFirestore:
+    def __init__(self):
+        self.data = {}
+        self.ops = []
+        # Trueの場合、timeslots の範囲クエリをインデックス不足として失敗させる
+        self.range_index_error = False
+        # クエリごとに呼ばれるフック（例外を送出するとそのクエリを失敗させる）
+        self.fail_query = None
+        # ドキュメントの読み取り・書き込みごとに呼ばれるフック
+        self.fail_read = None
+        self.fail_write = None
+
+    def before_read(self, ref) -> None:
+        if self.fail_read is not None:
+            self.fail_read(ref)
+
+    def before_write(self, ref) -> None:
+        if self.fail_write is not None:
+            self.fail_write(ref)
+
+    def collection(self, name):
+        return CollectionReference(self, name)
+
+    def batch(self):
+        return WriteBatch(self)
+
+    def transaction(self, **kwargs):
+        return Transaction(self, **kwargs)
+
+    def get_all(self, refs, field_paths=None, **kwargs):
+        refs = list(refs)
+        self.ops.append(("get_all", len(refs)))
+        return [DocumentReference(self, ref._collection, ref.id).get() for ref in refs]
+
+    def write_option(self, **kwargs):
+        return WriteOption(**kwargs)
+
+    def put(self, collection: str, doc_id: str, data: dict) -> None:
+        """テストデータを投入"""
+        self.data.setdefault(collection, {})[doc_id] = (copy.deepcopy(data), next(_clock))
+
+    def doc(self, collection: str, doc_id: str):
+        """保存されているデータを取得（存在しない場合はNone）"""
+        entry = self.data.get(collection, {}).get(doc_id)
+        return copy.deepcopy(entry[0]) if entry else None
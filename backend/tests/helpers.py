@@ -0,0 +1,45 @@
+# テストデータの投入ヘルパー
+from typing import Optional
+
+def put_slot(db, day: str, time: str = "10:00", capacity: int = 5, reserved: int = 0, available: bool = True) -> str:
+    """予約枠を投入し、予約枠IDを返す"""
+    slot_id = f"{day}_{time.replace(':', '')}"
+    db.put("timeslots", slot_id, {
+        "slot_id": slot_id,
+        "date": day,
+        "time": time,
+        "capacity": capacity,
+        "reserved_count": reserved,
+        "is_available": available,
+    })
+    return slot_id
+
+def put_product(db, product_id: str, price: int = 1000, ordered: int = 0,
+                total_order_limit: Optional[int] = None, **fields) -> str:
+    """商品を投入し、商品IDを返す"""
+    db.put("products", product_id, {
+        "product_id": product_id,
+        "name": f"商品{product_id}",
+        "description": f"{product_id}の説明",
+        "price": price,
+        "max_per_reservation": 10,
+        "max_per_user": 5,
+        "total_order_limit": total_order_limit,
+        "current_order_count": ordered,
+        "is_active": True,
+        **fields,
+    })
+    return product_id
+
+def reservation_request(email: str = "user@example.com", day: str = "2030-01-01", time: str = "10:00",
+                        products: Optional[list] = None, **fields) -> dict:
+    """予約作成リクエストのボディ"""
+    return {
+        "user_email": email,
+        "user_name": "虎杖悠仁",
+        "user_phone": "09012345678",
+        "visit_date": day,
+        "visit_time": time,
+        "products": products if products is not None else [],
+        **fields,
+    }
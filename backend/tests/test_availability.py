@@ -0,0 +1,72 @@
+# 空き状況の一括確認（/api/availability/batch）のテスト
+import asyncio
+from app.services import product_service
+from tests.helpers import put_product, put_slot, reservation_request
+
+def _put_rule(db):
+    db.put("schedule_rules", "r1", {
+        "rule_id": "r1", "name": "", "start_date": "2030-01-01", "end_date": None,
+        "weekdays": [0, 1, 2, 3, 4, 5, 6], "start_time": "10:00", "end_time": "12:00",
+        "interval_minutes": 60, "capacity": 8, "exclude_dates": [], "is_active": True,
+        "created_at": "2029-01-01T00:00:00", "updated_at": "2029-01-01T00:00:00",
+    })
+
+def _batch(client, slots, product_ids):
+    response = client.post("/api/availability/batch", json={"slots": slots, "product_ids": product_ids})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+def test_batch_matches_single_availability_endpoints(client, db):
+    _put_rule(db)
+    put_slot(db, "2030-01-01", "10:00", capacity=5, reserved=2)
+    put_product(db, "p1", ordered=3, total_order_limit=10)
+    put_product(db, "p2", is_active=False)
+    slots = [{"date": "2030-01-01", "time": "10:00"}, {"date": "2030-01-01", "time": "11:00"},
+             {"date": "2030-01-01", "time": "15:00"}]
+
+    body = _batch(client, slots, ["p2", "missing", "p1"])
+
+    for slot, result in zip(slots, body["slots"]):
+        single = client.get("/api/timeslots/availability", params=slot).json()
+        assert {key: result[key] for key in single} == single
+    assert body["slots"][1] == {
+        "available": True, "available_count": 8, "capacity": 8, "reserved_count": 0,
+        "slot_id": "2030-01-01_1100", "date": "2030-01-01", "time": "11:00",
+    }
+    assert body["slots"][2]["available"] is False
+
+    for product_id, result in zip(["p2", "p1"], [body["products"][0], body["products"][2]]):
+        single = client.get(f"/api/products/{product_id}/availability").json()
+        assert {key: result[key] for key in single} == single
+        assert result["found"] is True
+    assert body["products"][2]["available_count"] == 7
+    assert client.get("/api/products/missing/availability").status_code == 404
+    assert body["products"][1]["found"] is False
+    assert body["products"][1]["available"] is False
+
+def test_products_are_served_from_warm_catalog_and_negative_cache(client, db):
+    put_slot(db, "2030-01-01")
+    put_product(db, "p1", ordered=3, total_order_limit=10)
+    asyncio.run(product_service.get_product_catalog())
+    product_service.missing_products.mark_missing("missing")
+    db.ops.clear()
+
+    body = _batch(client, [{"date": "2030-01-01", "time": "10:00"}], ["p1", "missing"])
+
+    assert [(p["found"], p["available_count"]) for p in body["products"]] == [(True, 7), (False, 0)]
+    # 商品は読み取らず、予約枠のみ1回の get_all で取得する
+    assert [op for op in db.ops if op[0] in ("get_all", "query")] == [("get_all", 1)]
+    assert not any(op[1].startswith("products/") for op in db.ops if op[0] == "get")
+
+def test_warm_catalog_reflects_bookings_made_in_this_process(client, db):
+    put_slot(db, "2030-01-01")
+    put_product(db, "p1", ordered=3, total_order_limit=10)
+    asyncio.run(product_service.get_product_catalog())
+
+    response = client.post("/api/reservations", json=reservation_request(products=[{"product_id": "p1", "quantity": 2}]))
+    assert response.status_code == 200, response.text
+
+    body = _batch(client, [], ["p1"])
+    single = client.get("/api/products/p1/availability").json()
+
+    assert body["products"][0]["available_count"] == single["available_count"] == 5
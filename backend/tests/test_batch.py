@@ -0,0 +1,70 @@
+# 一括リクエストAPI（/api/batch）のテスト
+from tests.helpers import put_product, put_slot
+
+def _batch(client, *paths):
+    response = client.post("/api/batch", json={"requests": [{"id": str(i), "path": path} for i, path in enumerate(paths)]})
+    assert response.status_code == 200, response.text
+    return response.json()["responses"]
+
+def test_sub_responses_keep_request_order_and_their_own_status(client, db):
+    put_slot(db, "2030-01-01", capacity=5, reserved=2)
+    put_product(db, "p1")
+
+    responses = _batch(
+        client,
+        "/api/products/p1/availability",
+        "/api/reservations/missing",
+        "/api/timeslots/availability?date=2030-01-01&time=10:00",
+    )
+
+    assert [r["id"] for r in responses] == ["0", "1", "2"]
+    assert [r["status"] for r in responses] == [200, 404, 200]
+    assert responses[0]["body"]["available"] is True
+    assert responses[1]["body"]["detail"] == "予約が見つかりません"
+    assert responses[2]["body"]["available_count"] == 3
+    assert responses[2]["headers"]["content-type"] == "application/json"
+
+def test_nested_batch_and_admin_paths_are_rejected(client, db):
+    put_slot(db, "2030-01-01")
+
+    responses = _batch(
+        client, "/api/batch", "/api/admin/timeslots/stats", "/api/timeslots/availability?date=2030-01-01&time=10:00",
+    )
+
+    assert [r["status"] for r in responses] == [400, 400, 200]
+    assert "入れ子" in responses[0]["body"]["detail"]
+    assert "管理者用" in responses[1]["body"]["detail"]
+
+def test_failing_sub_request_does_not_fail_the_batch(client, db):
+    put_slot(db, "2030-01-01")
+    # 保存内容がレスポンスのスキーマを満たさないため、このサブリクエストのみ失敗する
+    put_product(db, "p1")
+
+    responses = _batch(client, "/api/products/p1", "/api/timeslots/availability?date=2030-01-01&time=10:00")
+
+    assert [r["status"] for r in responses] == [500, 200]
+    assert responses[1]["body"]["available"] is True
+
+def test_paths_outside_the_api_are_rejected(client, db):
+    response = client.post("/api/batch", json={"requests": [{"path": "/docs"}]})
+
+    assert response.status_code == 422
+
+def test_sub_requests_share_one_timeslot_read(client, db):
+    put_slot(db, "2030-01-01")
+    db.ops.clear()
+
+    responses = _batch(
+        client,
+        "/api/timeslots/availability?date=2030-01-01&time=10:00",
+        "/api/timeslots/availability?date=2030-01-01&time=10:00",
+    )
+
+    assert [r["status"] for r in responses] == [200, 200]
+    assert responses[0]["body"] == responses[1]["body"]
+    assert db.ops.count(("get", "timeslots/2030-01-01_1000")) == 1
+
+    # 一括リクエスト以外では共有しない
+    client.get("/api/timeslots/availability", params={"date": "2030-01-01", "time": "10:00"})
+    client.get("/api/timeslots/availability", params={"date": "2030-01-01", "time": "10:00"})
+    assert db.ops.count(("get", "timeslots/2030-01-01_1000")) == 3
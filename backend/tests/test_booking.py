@@ -0,0 +1,134 @@
+# 予約の作成・変更のテスト
+import threading
+import time
+from tests.helpers import put_product, put_slot, reservation_request
+
+def _book(client, email="a@example.com", day="2030-01-01", products=None):
+    response = client.post("/api/reservations", json=reservation_request(email, day=day, products=products))
+    assert response.status_code == 200, response.text
+    return response.json()
+
+def test_second_booking_on_same_day_is_rejected(client, db):
+    put_slot(db, "2030-01-01", "10:00")
+    put_slot(db, "2030-01-01", "11:00")
+    _book(client)
+
+    response = client.post("/api/reservations", json=reservation_request(" A@example.com", time="11:00"))
+
+    assert response.status_code == 409
+    assert "1人1件" in response.json()["detail"]
+    assert db.doc("timeslots", "2030-01-01_1100")["reserved_count"] == 0
+    assert len(db.data["reservations"]) == 1
+
+def test_moving_booking_to_another_date_frees_the_old_day(client, db):
+    put_slot(db, "2030-01-01")
+    put_slot(db, "2030-01-02")
+    reservation = _book(client)
+
+    response = client.put(f"/api/reservations/{reservation['reservation_id']}", json={"visit_date": "2030-01-02"})
+
+    assert response.status_code == 200, response.text
+    assert response.json()["slot_id"] == "2030-01-02_1000"
+    assert [data["visit_date"] for data, _ in db.data["user_day"].values()] == ["2030-01-02"]
+    assert db.doc("timeslots", "2030-01-01_1000")["reserved_count"] == 0
+    assert db.doc("timeslots", "2030-01-02_1000")["reserved_count"] == 1
+    # 元の日は再び予約でき、変更先の日は予約できない
+    _book(client)
+    assert client.post("/api/reservations", json=reservation_request("a@example.com", day="2030-01-02")).status_code == 409
+
+def test_moving_booking_onto_a_day_already_booked_is_rejected(client, db):
+    put_slot(db, "2030-01-01")
+    put_slot(db, "2030-01-02")
+    first = _book(client)
+    _book(client, day="2030-01-02")
+
+    response = client.put(f"/api/reservations/{first['reservation_id']}", json={"visit_date": "2030-01-02"})
+
+    assert response.status_code == 409
+    assert db.doc("reservations", first["reservation_id"])["visit_date"] == "2030-01-01"
+    assert db.doc("timeslots", "2030-01-02_1000")["reserved_count"] == 1
+
+def test_update_changes_order_counts_by_the_difference(client, db):
+    put_slot(db, "2030-01-01")
+    for product_id in ("p1", "p2", "p3"):
+        put_product(db, product_id, ordered=10)
+    reservation = _book(client, products=[{"product_id": "p1", "quantity": 2}, {"product_id": "p2", "quantity": 1}])
+    db.ops.clear()
+
+    response = client.put(f"/api/reservations/{reservation['reservation_id']}", json={"products": [
+        {"product_id": "p1", "quantity": 3},
+        {"product_id": "p3", "quantity": 2},
+    ]})
+
+    assert response.status_code == 200, response.text
+    counts = {product_id: db.doc("products", product_id)["current_order_count"] for product_id in ("p1", "p2", "p3")}
+    assert counts == {"p1": 13, "p2": 10, "p3": 12}
+    assert db.doc("timeslots", "2030-01-01_1000")["reserved_count"] == 1
+    assert [(p["product_id"], p["quantity"]) for p in response.json()["products"]] == [("p1", 3), ("p3", 2)]
+    # 予約枠・1日1件のキーは変更がないため読み取らない
+    assert [op for op in db.ops if op[0] == "get_all"] == [("get_all", 3)]
+
+def test_unchanged_products_are_not_written(client, db):
+    put_slot(db, "2030-01-01")
+    put_slot(db, "2030-01-01", "11:00")
+    put_product(db, "p1")
+    reservation = _book(client, products=[{"product_id": "p1", "quantity": 2}])
+    db.ops.clear()
+
+    response = client.put(f"/api/reservations/{reservation['reservation_id']}", json={"visit_time": "11:00"})
+
+    assert response.status_code == 200, response.text
+    assert db.doc("products", "p1")["current_order_count"] == 2
+    assert db.doc("timeslots", "2030-01-01_1000")["reserved_count"] == 0
+    assert db.doc("timeslots", "2030-01-01_1100")["reserved_count"] == 1
+    assert [op for op in db.ops if op[0] == "commit"] == [("commit", 3)]
+
+def _post_concurrently(client, db, bodies):
+    """最初の予約の読み取りを遅らせ、処理中に残りの予約を送信する"""
+    delayed = threading.Event()
+
+    def slow_first_read(ref):
+        if not delayed.is_set():
+            delayed.set()
+            time.sleep(0.3)
+
+    db.fail_read = slow_first_read
+    responses = [None] * len(bodies)
+
+    def post(i):
+        responses[i] = client.post("/api/reservations", json=bodies[i])
+
+    threads = [threading.Thread(target=post, args=(0,))]
+    threads[0].start()
+    delayed.wait(1)
+    threads += [threading.Thread(target=post, args=(i,)) for i in range(1, len(bodies))]
+    for thread in threads[1:]:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    return responses
+
+def test_concurrent_identical_bookings_share_one_reservation(client, db):
+    put_slot(db, "2030-01-01")
+    body = reservation_request("a@example.com")
+
+    first, second = _post_concurrently(client, db, [body, body])
+
+    assert (first.status_code, second.status_code) == (200, 200)
+    assert first.json()["reservation_id"] == second.json()["reservation_id"]
+    assert len(db.data["reservations"]) == 1
+    assert db.doc("timeslots", "2030-01-01_1000")["reserved_count"] == 1
+
+def test_concurrent_different_booking_for_same_user_gets_409(client, db):
+    put_slot(db, "2030-01-01")
+    put_slot(db, "2030-01-02")
+
+    first, second = _post_concurrently(client, db, [
+        reservation_request("a@example.com"),
+        reservation_request("A@example.com", day="2030-01-02"),
+    ])
+
+    assert first.status_code == 200
+    assert second.status_code == 409
+    assert "処理中" in second.json()["detail"]
+    assert len(db.data["reservations"]) == 1
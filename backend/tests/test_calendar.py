@@ -0,0 +1,122 @@
+# カレンダー（月次集計・日別フォールバック）のテスト
+from datetime import date
+from google.api_core import exceptions as gexc
+from tests.helpers import put_slot
+
+def test_calendar_summarizes_each_day(client, db):
+    put_slot(db, "2030-01-01", reserved=0)
+    put_slot(db, "2030-01-02", reserved=4)
+    put_slot(db, "2030-01-03", reserved=5)
+
+    response = client.get("/api/calendar", params={"year": 2030, "month": 1})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["degraded"] is False
+    assert "X-Degraded" not in response.headers
+    assert len(body["data"]) == 31
+    assert body["data"]["1"] == {"status": "available", "availableSlots": 5}
+    assert body["data"]["2"] == {"status": "limited", "availableSlots": 1}
+    assert body["data"]["3"] == {"status": "full", "availableSlots": 0}
+    assert body["data"]["4"] == {"status": "unavailable", "availableSlots": 0}
+    # 月全体を1回の範囲クエリで取得する
+    assert [op for op in db.ops if op == ("query", "timeslots")] == [("query", "timeslots")]
+
+def test_calendar_falls_back_to_per_day_queries_without_index(client, db):
+    put_slot(db, "2030-02-10", reserved=1)
+    db.range_index_error = True
+
+    response = client.get("/api/calendar", params={"year": 2030, "month": 2})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["degraded"] is True
+    assert body["missing_dates"] == []
+    assert response.headers["X-Degraded"] == "timeslot-fallback"
+    assert body["data"]["10"] == {"status": "available", "availableSlots": 4}
+    # 範囲クエリ1回 + 日別クエリ28回
+    assert len([op for op in db.ops if op == ("query", "timeslots")]) == 1 + 28
+
+def test_calendar_reports_days_that_could_not_be_loaded(client, db):
+    put_slot(db, "2030-02-10")
+    db.range_index_error = True
+
+    def fail_one_day(collection, filters):
+        if collection == "timeslots" and any(f.value == "2030-02-11" for f in filters):
+            raise gexc.PermissionDenied("denied")
+
+    db.fail_query = fail_one_day
+
+    body = client.get("/api/calendar", params={"year": 2030, "month": 2}).json()
+
+    assert body["degraded"] is True
+    assert body["missing_dates"] == ["2030-02-11"]
+    assert body["data"]["10"]["status"] == "available"
+
+def test_degraded_calendar_is_not_cached(client, db):
+    put_slot(db, "2030-03-01")
+    db.range_index_error = True
+    assert client.get("/api/calendar", params={"year": 2030, "month": 3}).json()["degraded"] is True
+
+    db.range_index_error = False
+    body = client.get("/api/calendar", params={"year": 2030, "month": 3}).json()
+    assert body["degraded"] is False
+
+def test_calendar_is_served_from_cache(client, db):
+    put_slot(db, "2030-04-01")
+    client.get("/api/calendar", params={"year": 2030, "month": 4})
+    db.ops.clear()
+
+    client.get("/api/calendar", params={"year": 2030, "month": 4})
+
+    assert ("query", "timeslots") not in db.ops
+
+def test_per_day_fallback_returns_slots_of_every_day(db):
+    import asyncio
+    from app.services.timeslot_service import _get_timeslots_by_day_concurrently
+
+    put_slot(db, "2030-05-01", "10:00")
+    put_slot(db, "2030-05-01", "11:00")
+    put_slot(db, "2030-05-03", "10:00")
+
+    slots, failed = asyncio.run(_get_timeslots_by_day_concurrently(date(2030, 5, 1), date(2030, 5, 3)))
+
+    assert failed == []
+    assert [s["slot_id"] for s in slots] == ["2030-05-01_1000", "2030-05-01_1100", "2030-05-03_1000"]
+
+def test_calendar_range_returns_months_and_day_slots(client, db):
+    put_slot(db, "2030-01-31", reserved=4)
+    put_slot(db, "2030-03-15")
+
+    response = client.get("/api/calendar/range", params={
+        "year": 2029, "month": 12, "months": 4, "include_slots": "true",
+    })
+
+    assert response.status_code == 200
+    months = response.json()["months"]
+    assert [(m["year"], m["month"]) for m in months] == [(2029, 12), (2030, 1), (2030, 2), (2030, 3)]
+    assert months[1]["data"]["31"] == {"status": "limited", "availableSlots": 1}
+    assert months[1]["slots"]["31"] == [{
+        "slot_id": "2030-01-31_1000", "time": "10:00", "available": True,
+        "available_count": 1, "capacity": 5, "reserved_count": 4,
+    }]
+    assert months[2]["slots"]["1"] == []
+    # 4か月分を1回の範囲クエリで取得する
+    assert [op for op in db.ops if op == ("query", "timeslots")] == [("query", "timeslots")]
+
+def test_calendar_range_omits_slots_unless_requested(client, db):
+    months = client.get("/api/calendar/range", params={"year": 2030, "month": 1, "months": 2}).json()["months"]
+
+    assert all(m["slots"] is None for m in months)
+
+def test_calendar_range_does_not_reload_cached_months(client, db):
+    put_slot(db, "2030-02-01")
+    client.get("/api/calendar", params={"year": 2030, "month": 2})
+    db.ops.clear()
+
+    months = client.get("/api/calendar/range", params={"year": 2030, "month": 1, "months": 3}).json()["months"]
+
+    assert months[1]["data"]["1"]["status"] == "available"
+    # 1月と3月をそれぞれ取得し、キャッシュ済みの2月は読み直さない
+    assert len([op for op in db.ops if op == ("query", "timeslots")]) == 2
+    assert client.get("/api/calendar/range", params={"year": 2030, "month": 1, "months": 13}).status_code == 422
@@ -0,0 +1,71 @@
+# 予約キャンセルのテスト
+from google.api_core import exceptions as gexc
+from tests.helpers import put_product, put_slot, reservation_request
+
+def _book(client, db, email="a@example.com"):
+    response = client.post("/api/reservations", json=reservation_request(
+        email, products=[{"product_id": "p1", "quantity": 2}],
+    ))
+    assert response.status_code == 200, response.text
+    return response.json()["reservation_id"]
+
+def test_cancel_updates_reservation_counters_and_user_day_in_one_commit(client, db):
+    put_slot(db, "2030-01-01")
+    put_product(db, "p1")
+    reservation_id = _book(client, db)
+    db.ops.clear()
+
+    response = client.delete(f"/api/reservations/{reservation_id}")
+
+    assert response.status_code == 200
+    assert response.json()["status"] == "cancelled"
+    assert db.doc("timeslots", "2030-01-01_1000")["reserved_count"] == 0
+    assert db.doc("products", "p1")["current_order_count"] == 0
+    assert db.data["user_day"] == {}
+    assert [op for op in db.ops if op[0] == "commit"] == [("commit", 4)]
+    # キーが解放されたため、同じ日に再び予約できる
+    _book(client, db)
+
+def test_second_cancel_is_rejected_without_touching_counters(client, db):
+    put_slot(db, "2030-01-01", reserved=3)
+    put_product(db, "p1", ordered=5)
+    reservation_id = _book(client, db)
+    client.delete(f"/api/reservations/{reservation_id}")
+
+    response = client.delete(f"/api/reservations/{reservation_id}")
+
+    assert response.status_code == 400
+    assert "既にキャンセル済み" in response.json()["detail"]
+    assert db.doc("timeslots", "2030-01-01_1000")["reserved_count"] == 3
+    assert db.doc("products", "p1")["current_order_count"] == 5
+
+def test_cancel_does_not_push_drifted_counters_below_zero(client, db):
+    put_slot(db, "2030-01-01")
+    put_product(db, "p1")
+    reservation_id = _book(client, db)
+    # 予約後にカウンターがずれて0になっていた場合
+    put_slot(db, "2030-01-01", reserved=0)
+    put_product(db, "p1", ordered=1)
+
+    response = client.delete(f"/api/reservations/{reservation_id}")
+
+    assert response.status_code == 200
+    assert db.doc("timeslots", "2030-01-01_1000")["reserved_count"] == 0
+    assert db.doc("products", "p1")["current_order_count"] == 0
+
+def test_failed_cancel_leaves_everything_unchanged(client, db):
+    put_slot(db, "2030-01-01")
+    put_product(db, "p1")
+    reservation_id = _book(client, db)
+
+    def fail_product_write(ref):
+        if ref.path == "products/p1":
+            raise gexc.PermissionDenied("denied")
+
+    db.fail_write = fail_product_write
+    response = client.delete(f"/api/reservations/{reservation_id}")
+
+    assert response.status_code == 500
+    assert db.doc("reservations", reservation_id)["status"] == "confirmed"
+    assert db.doc("timeslots", "2030-01-01_1000")["reserved_count"] == 1
+    assert len(db.data["user_day"]) == 1
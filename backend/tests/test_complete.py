@@ -0,0 +1,58 @@
+# 予約の一括完了のテスト
+
+def _put_reservation(db, number, status="confirmed"):
+    db.put("reservations", f"id-{number}", {
+        "reservation_id": f"id-{number}",
+        "reservation_number": number,
+        "user_email": f"{number.lower()}@example.com",
+        "user_name": "予約者",
+        "user_phone": "09012345678",
+        "visit_date": "2030-01-01",
+        "visit_time": "10:00",
+        "status": status,
+        "products": [],
+    })
+
+def _complete(client, **body):
+    response = client.post("/api/admin/reservations/complete", json=body)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+def test_bulk_complete_returns_results_in_request_order(client, db):
+    _put_reservation(db, "N1")
+    _put_reservation(db, "N2", status="cancelled")
+
+    body = _complete(client, reservation_ids=["id-N2", "id-N1"], reservation_numbers=["N9"])
+
+    assert (body["total"], body["completed"], body["failed"]) == (3, 1, 2)
+    assert [r["success"] for r in body["results"]] == [False, True, False]
+    assert "キャンセル済み" in body["results"][0]["error"]
+    assert body["results"][2] == {
+        "reservation_id": None, "reservation_number": "N9", "success": False, "error": "予約が見つかりません",
+    }
+    assert db.doc("reservations", "id-N1")["status"] == "completed"
+    assert db.doc("reservations", "id-N2")["status"] == "cancelled"
+
+def test_same_reservation_given_twice_is_counted_once(client, db):
+    _put_reservation(db, "N1")
+
+    body = _complete(client, reservation_ids=["id-N1", "id-N1"], reservation_numbers=["N1"])
+
+    assert (body["total"], body["completed"], body["failed"], body["duplicates"]) == (3, 1, 0, 2)
+    assert body["results"][0]["success"] is True
+    assert all(r["duplicate"] and not r["success"] for r in body["results"][1:])
+
+def test_malformed_ids_are_reported_per_item(client, db):
+    _put_reservation(db, "N1")
+    db.ops.clear()
+
+    body = _complete(client, reservation_ids=["", "a/b", "__id__", "id-N1"])
+
+    assert [r["success"] for r in body["results"]] == [False, False, False, True]
+    assert all(r["error"] == "予約IDが正しくありません" for r in body["results"][:3])
+    assert [op for op in db.ops if op[0] == "get_all"] == [("get_all", 1)]
+
+def test_bulk_complete_requires_reservations(client, db):
+    response = client.post("/api/admin/reservations/complete", json={})
+
+    assert response.status_code == 422
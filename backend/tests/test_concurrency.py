@@ -0,0 +1,83 @@
+# レーンごとの同時実行数制限のテスト
+import asyncio
+import threading
+import pytest
+from app.utils import storage
+from app.utils.concurrency import LANES, LaneLimiter, LaneOverloadedError
+
+def _limiter(total=1, queue_size=4, **reserved):
+    return LaneLimiter(total, {lane: reserved.get(lane, 0) for lane in LANES}, queue_size)
+
+def test_full_queue_is_shed_and_waiting_times_out():
+    async def scenario():
+        limiter = _limiter(queue_size=1)
+        await limiter.acquire("public", None)
+        waiter = asyncio.ensure_future(limiter.acquire("public", 0.05))
+        await asyncio.sleep(0)
+
+        with pytest.raises(LaneOverloadedError):
+            await limiter.acquire("public", 1)
+        with pytest.raises(LaneOverloadedError):
+            await waiter
+        return limiter.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["public"]["waiting"] == 0
+    assert stats["shared"]["in_use"] == 1
+
+def test_released_shared_slot_goes_to_higher_priority_lane():
+    async def scenario():
+        limiter = _limiter()
+        slot = await limiter.acquire("booking", None)
+        public = asyncio.ensure_future(limiter.acquire("public", 1))
+        admin = asyncio.ensure_future(limiter.acquire("admin", 1))
+        await asyncio.sleep(0)
+
+        limiter.release("booking", slot)
+        admin_slot = await asyncio.wait_for(admin, 1)
+        return admin_slot, public.done(), limiter.stats()["public"]["waiting"]
+
+    assert asyncio.run(scenario()) == ("shared", False, 1)
+
+def test_slot_handed_to_cancelled_waiter_is_released():
+    async def scenario():
+        limiter = _limiter()
+        slot = await limiter.acquire("public", None)
+        waiter = asyncio.ensure_future(limiter.acquire("public", 1))
+        await asyncio.sleep(0)
+
+        # 枠を引き渡した直後、待機者が再開する前にキャンセルされた場合
+        limiter.release("public", slot)
+        waiter.cancel()
+        result, = await asyncio.gather(waiter, return_exceptions=True)
+        if isinstance(result, str):
+            # キャンセルより先に枠を受け取れた場合は通常どおり解放する
+            limiter.release("public", result)
+        return limiter.stats()
+
+    assert asyncio.run(scenario())["shared"]["in_use"] == 0
+
+def test_cancelled_storage_call_holds_slot_until_thread_finishes(monkeypatch):
+    limiter = _limiter()
+    monkeypatch.setattr(storage, "lane_limiter", limiter)
+    started = threading.Event()
+    finish = threading.Event()
+
+    def slow_call():
+        started.set()
+        finish.wait(5)
+
+    async def scenario():
+        task = asyncio.ensure_future(storage.run_storage("test.slow", slow_call))
+        await asyncio.to_thread(started.wait, 5)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        in_use_after_cancel = limiter.stats()["shared"]["in_use"]
+
+        finish.set()
+        while limiter.stats()["shared"]["in_use"]:
+            await asyncio.sleep(0.01)
+        return in_use_after_cancel
+
+    assert asyncio.run(asyncio.wait_for(scenario(), 5)) == 1
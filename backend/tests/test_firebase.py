@@ -0,0 +1,56 @@
+# Firebase初期化エラーのテスト
+import pytest
+from tests.helpers import reservation_request
+
+@pytest.fixture
+def unconfigured_client(monkeypatch):
+    """認証情報が設定されていない状態のテストクライアント"""
+    import firebase_admin
+    from fastapi.testclient import TestClient
+    import app.utils.firebase as firebase
+    from app.main import app
+    from tests.conftest import _reset_state
+
+    for name in ("GOOGLE_APPLICATION_CREDENTIALS", "FIREBASE_PROJECT_ID", "FIREBASE_PRIVATE_KEY", "FIREBASE_CLIENT_EMAIL"):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setattr(firebase, "_get_service_account_path", lambda env_path: None)
+    monkeypatch.setattr(firebase_admin, "_apps", {})
+    monkeypatch.setattr(firebase, "_db", None)
+    monkeypatch.setattr(firebase, "_initialization_error", None)
+    _reset_state()
+    with TestClient(app) as test_client:
+        yield test_client
+    _reset_state()
+
+def test_missing_credentials_is_reported_as_503_until_next_initialization(unconfigured_client):
+    for path in ("/api/products", "/api/timeslots?date=2030-01-01", "/api/admin/schedules"):
+        response = unconfigured_client.get(path)
+
+        assert response.status_code == 503, path
+        # 再び初期化を試みるまでの秒数
+        assert 1 <= int(response.headers["Retry-After"]) <= 30
+
+def test_initialization_is_retried_after_the_interval(unconfigured_client, monkeypatch):
+    import firebase_admin
+    import app.utils.firebase as firebase
+    from tests.fake_firestore import FakeFirestore
+
+    assert unconfigured_client.get("/api/products").status_code == 503
+
+    # 認証情報が設定された後も、間隔が経過するまでは初期化を試みない
+    fake = FakeFirestore()
+    monkeypatch.setattr(firebase_admin, "_apps", {"[DEFAULT]": object()})
+    monkeypatch.setattr(firebase.firestore, "client", lambda: fake)
+    assert unconfigured_client.get("/api/products").status_code == 503
+
+    monkeypatch.setattr(firebase, "FIREBASE_INIT_RETRY_INTERVAL", 0)
+    response = unconfigured_client.get("/api/products")
+
+    assert response.status_code == 200
+    assert response.json() == []
+
+def test_missing_credentials_on_write_is_not_reported_as_bad_request(unconfigured_client):
+    response = unconfigured_client.post("/api/reservations", json=reservation_request())
+
+    assert response.status_code == 503
+    assert "Retry-After" in response.headers
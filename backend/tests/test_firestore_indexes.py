@@ -0,0 +1,24 @@
+# インデックス不足エラーの判定のテスト
+from google.api_core import exceptions as gexc
+from app.utils.firestore_indexes import is_missing_index_error
+
+def test_detects_missing_index_error():
+    error = gexc.FailedPrecondition("The query requires an index. You can create it here: https://example")
+    assert is_missing_index_error(error) is True
+
+def test_ignores_unrelated_errors_mentioning_index():
+    assert is_missing_index_error(IndexError("list index out of range")) is False
+    assert is_missing_index_error(ValueError("index")) is False
+    assert is_missing_index_error(gexc.FailedPrecondition("precondition failed: index")) is False
+
+def test_unrelated_error_does_not_trigger_calendar_fallback(client, db):
+    def broken_query(collection, filters):
+        raise IndexError("list index out of range")
+
+    db.fail_query = broken_query
+
+    response = client.get("/api/calendar", params={"year": 2030, "month": 1})
+
+    assert response.status_code == 500
+    # 日別フォールバックに切り替えず、範囲クエリ1回で失敗する
+    assert len([op for op in db.ops if op == ("query", "timeslots")]) == 1
@@ -0,0 +1,79 @@
+# 前提条件つき更新のテスト
+import asyncio
+import pytest
+from google.api_core import exceptions as gexc
+from app.services import reservation_complete_service
+from app.utils.firestore_write import update_document
+
+def _ops(db, path):
+    return [op for op, target in db.ops if target == path]
+
+def test_second_update_uses_previous_write_result_instead_of_reading(db):
+    db.put("items", "a", {"name": "a", "count": 1})
+    ref = db.collection("items").document("a")
+
+    assert update_document(ref, {"count": 2}) == {"name": "a", "count": 2}
+    assert update_document(ref, {"count": 3}) == {"name": "a", "count": 3}
+
+    assert _ops(db, "items/a") == ["get", "update", "update"]
+    assert db.doc("items", "a") == {"name": "a", "count": 3}
+
+def test_update_rereads_when_changed_elsewhere(db):
+    db.put("items", "a", {"name": "a", "count": 1})
+    ref = db.collection("items").document("a")
+    update_document(ref, {"count": 2})
+
+    # 他のインスタンスからの更新
+    db.put("items", "a", {"name": "b", "count": 5})
+    result = update_document(ref, {"count": 6})
+
+    assert result == {"name": "b", "count": 6}
+    assert _ops(db, "items/a") == ["get", "update", "update", "get", "update"]
+
+def test_check_failing_on_remembered_content_is_rechecked_with_latest(db):
+    db.put("items", "a", {"status": "done"})
+    ref = db.collection("items").document("a")
+
+    def not_done(data):
+        if data["status"] == "done":
+            raise ValueError("done")
+
+    update_document(ref, {"note": "x"})
+    db.put("items", "a", {"status": "open"})
+
+    assert update_document(ref, {"status": "done"}, check=not_done) == {"status": "done"}
+
+def test_update_missing_document_returns_none(db):
+    assert update_document(db.collection("items").document("missing"), {"count": 1}) is None
+
+def test_complete_is_not_rerun_after_ambiguous_write_failure(db):
+    db.put("reservations", "r1", {"reservation_id": "r1", "status": "pending"})
+    calls = []
+
+    def deadline_after_write(ref):
+        if ref.path == "reservations/r1":
+            calls.append(ref.path)
+            if len(calls) == 1:
+                raise gexc.DeadlineExceeded("deadline exceeded")
+
+    db.fail_write = deadline_after_write
+
+    # 反映されたか不明なエラーは再試行せず、「既に完了済み」の400にしない
+    with pytest.raises(gexc.DeadlineExceeded):
+        asyncio.run(reservation_complete_service.complete_reservation("r1"))
+
+    assert calls == ["reservations/r1"]
+
+def test_update_schedule_rule_reads_once_and_returns_merged_rule(client, db):
+    db.put("schedule_rules", "r1", {
+        "rule_id": "r1", "name": "平日", "start_date": "2030-01-01", "end_date": None, "weekdays": [0],
+        "start_time": "10:00", "end_time": "12:00", "interval_minutes": 30, "capacity": 5,
+        "exclude_dates": [], "is_active": True, "created_at": "2029-01-01T00:00:00", "updated_at": "2029-01-01T00:00:00",
+    })
+
+    response = client.put("/api/admin/schedules/r1", json={"capacity": 8, "weekdays": [2, 1, 2]})
+
+    assert response.status_code == 200
+    assert (response.json()["capacity"], response.json()["weekdays"]) == (8, [1, 2])
+    assert _ops(db, "schedule_rules/r1") == ["get", "update"]
+    assert client.put("/api/admin/schedules/missing", json={"capacity": 1}).status_code == 404
@@ -0,0 +1,101 @@
+# 予約の一括インポートのテスト
+import json
+from google.api_core import exceptions as gexc
+from app.services import import_service
+from tests.helpers import put_product, put_slot, reservation_request
+
+def _import(client, rows, **params):
+    body = "\n".join(json.dumps(row, ensure_ascii=False) for row in rows)
+    return client.post("/api/admin/reservations/import", params={"format": "ndjson", **params}, content=body.encode("utf-8"))
+
+def _reservations(db):
+    return [data for data, _ in db.data.get("reservations", {}).values()]
+
+def test_import_writes_reservations_and_counters(client, db):
+    put_slot(db, "2030-01-01", capacity=5)
+    put_product(db, "p1", price=500)
+
+    response = _import(client, [
+        reservation_request("a@example.com", products=[{"product_id": "p1", "quantity": 2}]),
+        reservation_request("b@example.com", products=[{"product_id": "p1", "quantity": 1}], reservation_number="EXT-1"),
+    ])
+
+    assert response.status_code == 200
+    result = response.json()
+    assert (result["imported"], result["failed"]) == (2, 0)
+    assert result["reservation_numbers"][1] == {"row": 2, "reservation_number": "EXT-1"}
+    assert db.doc("timeslots", "2030-01-01_1000")["reserved_count"] == 2
+    assert db.doc("products", "p1")["current_order_count"] == 3
+    assert len(db.data["user_day"]) == 2
+    assert _reservations(db)[0]["products"][0]["line_total"] == 1000
+
+def test_import_dry_run_does_not_write(client, db):
+    put_slot(db, "2030-01-01")
+
+    result = _import(client, [reservation_request()], dry_run="true").json()
+
+    assert (result["valid"], result["imported"]) == (1, 0)
+    assert _reservations(db) == []
+
+def test_import_rejects_rows_over_capacity_and_per_day_limit(client, db):
+    put_slot(db, "2030-01-01", capacity=2, reserved=1)
+    put_slot(db, "2030-01-01", time="11:00")
+
+    result = _import(client, [
+        reservation_request("a@example.com"),
+        reservation_request("b@example.com"),
+        reservation_request("a@example.com", time="11:00"),
+    ]).json()
+
+    assert result["imported"] == 1
+    assert [e["row"] for e in result["errors"]] == [2, 3]
+    assert "満席" in result["errors"][0]["errors"][0]
+    assert result["errors"][1]["errors"] == ["同じ日の予約は1人1件までです"]
+    assert db.doc("timeslots", "2030-01-01_1000")["reserved_count"] == 2
+
+def test_import_rejects_duplicate_reservation_numbers(client, db):
+    put_slot(db, "2030-01-01")
+    db.put("reservations", "existing", {"reservation_id": "existing", "reservation_number": "EXT-OLD"})
+
+    result = _import(client, [
+        reservation_request("a@example.com", reservation_number="EXT-1"),
+        reservation_request("b@example.com", reservation_number="EXT-1"),
+        reservation_request("c@example.com", reservation_number="EXT-OLD"),
+    ]).json()
+
+    assert result["imported"] == 1
+    assert result["errors"] == [
+        {"row": 2, "errors": ["予約番号 EXT-1 がファイル内で重複しています"]},
+        {"row": 3, "errors": ["予約番号 EXT-OLD は既に使用されています"]},
+    ]
+    numbers = sorted(r["reservation_number"] for r in _reservations(db))
+    assert numbers == ["EXT-1", "EXT-OLD"]
+
+def test_failed_batch_is_reported_per_row_and_leaves_counters_consistent(client, db, monkeypatch):
+    # 1バッチに2行（予約2件 + キー2件 + 加算1件）ずつ書き込む
+    monkeypatch.setattr(import_service, "IMPORT_BATCH_SIZE", 5)
+    put_slot(db, "2030-01-01", capacity=10)
+    rows = [reservation_request(f"user{i}@example.com") for i in range(4)]
+
+    # 3行目の1日1件のキーが、検証後に別の予約で作成された場合
+    conflict_key = None
+
+    def conflict_on_third_row(ref):
+        nonlocal conflict_key
+        if ref.path.startswith("user_day/") and conflict_key is None and len(db.data.get("user_day", {})) == 2:
+            conflict_key = ref.path
+            raise gexc.Conflict("Document already exists")
+
+    db.fail_write = conflict_on_third_row
+
+    response = _import(client, rows)
+
+    assert response.status_code == 200
+    result = response.json()
+    assert result["imported"] == 2
+    assert [e["row"] for e in result["errors"]] == [3, 4]
+    assert "書き込みに失敗しました" in result["errors"][0]["errors"][0]
+    assert [n["row"] for n in result["reservation_numbers"]] == [1, 2]
+    # 書き込まれた予約の分だけ予約済み数が加算されている
+    assert len(_reservations(db)) == 2
+    assert db.doc("timeslots", "2030-01-01_1000")["reserved_count"] == 2
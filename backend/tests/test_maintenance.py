@@ -0,0 +1,77 @@
+# 保守運用（カウンター再集計・slot_id補完）・エクスポート・定期スケジュールのテスト
+import asyncio
+from app.services import export_service, reconciliation_service
+from app.utils.metrics import get_metrics
+from tests.helpers import put_product, put_slot
+
+def _put_reservation(db, reservation_id, day="2030-01-01", time="10:00", status="pending", products=None, **fields):
+    db.put("reservations", reservation_id, {
+        "reservation_id": reservation_id,
+        "visit_date": day,
+        "visit_time": time,
+        "status": status,
+        "products": products or [],
+        **fields,
+    })
+
+def test_reconcile_counters_fixes_drift_through_storage_calls(client, db):
+    put_slot(db, "2030-01-01", reserved=5)
+    put_product(db, "p1", ordered=0)
+    _put_reservation(db, "r1", products=[{"product_id": "p1", "quantity": 2}])
+    _put_reservation(db, "r2", status="cancelled", products=[{"product_id": "p1", "quantity": 1}])
+
+    result = client.post("/api/admin/maintenance/reconcile-counters", params={"fix": "true"}).json()
+
+    assert (result["timeslot_discrepancies"], result["product_discrepancies"], result["fixed"]) == (1, 1, 2)
+    assert db.doc("timeslots", "2030-01-01_1000")["reserved_count"] == 1
+    assert db.doc("products", "p1")["current_order_count"] == 2
+    metrics = get_metrics()
+    assert metrics["timeslots.reconcile_read"]["calls"] == 1
+    assert metrics["reservations.export_page"]["calls"] == 1
+    assert metrics["timeslots.reconcile_fix"]["calls"] == 1
+
+def test_backfill_slot_ids_pages_through_reservations(client, db, monkeypatch):
+    monkeypatch.setattr(reconciliation_service, "BACKFILL_PAGE_SIZE", 2)
+    for i, day in enumerate(["2030-01-01", "2030-01-02", "2030-01-03"]):
+        _put_reservation(db, f"r{i}", day=day)
+    _put_reservation(db, "r3", day="2030-01-04", slot_id="2030-01-04_1000")
+
+    result = client.post("/api/admin/maintenance/backfill-slot-ids").json()
+
+    assert (result["scanned"], result["missing"], result["updated"]) == (4, 3, 3)
+    assert db.doc("reservations", "r0")["slot_id"] == "2030-01-01_1000"
+    # 2件・2件・0件の3ページ
+    assert get_metrics()["reservations.backfill_page"]["calls"] == 3
+
+def test_export_streams_csv_with_catalog_names(client, db):
+    put_product(db, "p1", price=300)
+    _put_reservation(db, "r0", reservation_number="N0", products=[{"product_id": "p1", "quantity": 2}])
+
+    response = client.get("/api/admin/reservations/export")
+
+    assert response.status_code == 200
+    assert "商品p1 x 2" in response.text
+    assert get_metrics()["reservations.export_page"]["calls"] == 1
+
+def test_iter_reservations_fetches_each_page_through_storage_calls(db):
+    for i in range(3):
+        _put_reservation(db, f"r{i}", day=f"2030-01-0{i + 1}")
+
+    async def collect():
+        return [r["reservation_id"] async for r in export_service.iter_reservations(page_size=2)]
+
+    assert asyncio.run(collect()) == ["r0", "r1", "r2"]
+    assert get_metrics()["reservations.export_page"]["calls"] == 2
+
+def test_schedule_rule_crud(client, db):
+    created = client.post("/api/admin/schedules", json={
+        "name": "平日", "start_date": "2030-01-01", "weekdays": [0, 1],
+        "start_time": "10:00", "end_time": "12:00", "interval_minutes": 30, "capacity": 5,
+    })
+    assert created.status_code == 200
+    rule_id = created.json()["rule_id"]
+
+    assert client.delete(f"/api/admin/schedules/{rule_id}").status_code == 200
+    assert db.doc("schedule_rules", rule_id) is None
+    assert client.delete(f"/api/admin/schedules/{rule_id}").status_code == 404
+    assert get_metrics()["schedule_rules.delete"]["calls"] == 2
@@ -0,0 +1,57 @@
+# 予約時点の商品情報（商品明細のスナップショット）のテスト
+from tests.helpers import put_product, put_slot, reservation_request
+
+def _book(client, email="a@example.com", quantity=2):
+    response = client.post("/api/reservations", json=reservation_request(
+        email, products=[{"product_id": "p1", "quantity": quantity}],
+    ))
+    assert response.status_code == 200, response.text
+    return response.json()
+
+def _change_product(db, **fields):
+    data = db.doc("products", "p1")
+    data.update(fields)
+    db.put("products", "p1", data)
+
+def test_reservation_details_use_booking_time_description(client, db):
+    put_slot(db, "2030-01-01")
+    put_product(db, "p1", price=500)
+    reservation = _book(client)
+    _change_product(db, name="新しい商品名", price=900, description="新しい説明")
+    db.ops.clear()
+
+    details = client.get(f"/api/reservations/{reservation['reservation_id']}").json()["product_details"]
+
+    assert details == [{"product_id": "p1", "name": "商品p1", "description": "p1の説明", "price": 500, "quantity": 2}]
+    assert ("query", "products") not in db.ops
+
+def test_description_missing_from_snapshot_is_read_from_catalog(client, db):
+    put_product(db, "p1", price=500)
+    db.put("reservations", "r1", {
+        "reservation_id": "r1", "reservation_number": "N1", "user_email": "a@example.com",
+        "user_name": "予約者", "user_phone": "09012345678", "visit_date": "2030-01-01", "visit_time": "10:00",
+        "status": "confirmed", "created_at": "2029-12-01T00:00:00", "updated_at": "2029-12-01T00:00:00",
+        "products": [{"product_id": "p1", "quantity": 1, "name": "旧商品名", "price": 400, "line_total": 400}],
+    })
+
+    details = client.get("/api/reservations/r1").json()["product_details"]
+
+    assert details[0]["name"] == "旧商品名"
+    assert details[0]["description"] == "p1の説明"
+
+def test_checkin_manifest_uses_booking_time_name_and_price(client, db):
+    put_slot(db, "2030-01-01")
+    put_product(db, "p1", price=500)
+    _book(client, "a@example.com")
+    _change_product(db, name="新しい商品名", price=900)
+    _book(client, "b@example.com", quantity=1)
+    db.ops.clear()
+
+    manifest = client.get("/api/admin/checkin/2030-01-01/manifest").json()
+
+    products = manifest["products"]
+    assert sorted(products, key=lambda row: row[2]) == [["p1", "商品p1", 500], ["p1", "新しい商品名", 900]]
+    # 各予約の明細は予約時点の商品名・価格の行を参照する
+    booked = {(products[index][2], quantity) for entry in manifest["entries"] for index, quantity in entry[5]}
+    assert booked == {(500, 2), (900, 1)}
+    assert ("query", "products") not in db.ops
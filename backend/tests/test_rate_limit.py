@@ -0,0 +1,66 @@
+# レート制限のテスト
+import asyncio
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+from app.utils import rate_limit
+from app.utils.rate_limit import MemoryRateLimitBackend, RateLimitMiddleware
+
+@pytest.fixture
+def limited_client(monkeypatch):
+    """レート制限を有効にした最小限のアプリ"""
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_ENABLED", True)
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_TRUST_FORWARDED", True)
+    app = FastAPI()
+    app.add_middleware(RateLimitMiddleware, backend=MemoryRateLimitBackend())
+
+    @app.post("/api/reservations")
+    async def create(request: Request):
+        return {"size": len(await request.body())}
+
+    return TestClient(app)
+
+def _book(client, ip, email="victim@example.com"):
+    return client.post("/api/reservations", json={"user_email": email}, headers={"X-Forwarded-For": ip})
+
+def test_requests_over_ip_limit_are_rejected_with_retry_after(limited_client):
+    responses = [_book(limited_client, "198.51.100.1", f"user{i}@example.com") for i in range(11)]
+
+    assert [r.status_code for r in responses[:10]] == [200] * 10
+    assert responses[10].status_code == 429
+    assert int(responses[10].headers["Retry-After"]) >= 1
+
+def test_email_limit_from_other_ip_does_not_lock_out_owner(limited_client):
+    statuses = [_book(limited_client, "203.0.113.9").status_code for _ in range(6)]
+
+    assert statuses == [200] * 5 + [429]
+    assert _book(limited_client, "198.51.100.1").status_code == 200
+
+def test_large_body_is_passed_through_without_email_check(limited_client):
+    body = b'{"user_email": "victim@example.com", "note": "' + b"x" * (100 * 1024) + b'"}'
+
+    response = limited_client.post("/api/reservations", content=body, headers={"content-type": "application/json"})
+
+    assert response.status_code == 200
+    assert response.json()["size"] == len(body)
+
+def test_buffer_body_stops_reading_past_limit():
+    chunk = b"x" * (32 * 1024)
+    messages = [{"type": "http.request", "body": chunk, "more_body": True} for _ in range(5)]
+    messages[-1]["more_body"] = False
+    received = []
+
+    async def receive():
+        received.append(messages[len(received)])
+        return received[-1]
+
+    async def scenario():
+        body, replay = await RateLimitMiddleware._buffer_body(receive)
+        read_before_replay = len(received)
+        replayed = [await replay() for _ in range(5)]
+        return body, read_before_replay, replayed
+
+    body, read_before_replay, replayed = asyncio.run(scenario())
+    assert body is None
+    assert read_before_replay == 3
+    assert replayed == messages
@@ -0,0 +1,45 @@
+# 定期スケジュールの作成・更新のテスト
+RULE = {
+    "start_date": "2030-01-01",
+    "end_date": "2030-01-31",
+    "weekdays": [0, 1, 2, 3, 4],
+    "start_time": "10:00",
+    "end_time": "12:00",
+    "interval_minutes": 30,
+    "capacity": 8,
+}
+
+def _create(client):
+    response = client.post("/api/admin/schedules", json=RULE)
+    assert response.status_code == 200, response.text
+    return response.json()["rule_id"]
+
+def test_create_rejects_inverted_date_range(client, db):
+    response = client.post("/api/admin/schedules", json={**RULE, "end_date": "2029-12-31"})
+
+    assert response.status_code == 422
+
+def test_partial_update_cannot_invert_the_stored_date_range(client, db):
+    rule_id = _create(client)
+
+    response = client.put(f"/api/admin/schedules/{rule_id}", json={"end_date": "2029-12-31"})
+
+    assert response.status_code == 400
+    assert "end_date" in response.json()["detail"]
+    assert db.doc("schedule_rules", rule_id)["end_date"] == "2030-01-31"
+
+def test_update_within_range_is_saved(client, db):
+    rule_id = _create(client)
+
+    response = client.put(f"/api/admin/schedules/{rule_id}", json={"end_date": "2030-01-01", "capacity": 4})
+
+    assert response.status_code == 200, response.text
+    stored = db.doc("schedule_rules", rule_id)
+    assert (stored["end_date"], stored["capacity"]) == ("2030-01-01", 4)
+
+def test_update_rejects_invalid_weekdays(client, db):
+    rule_id = _create(client)
+
+    response = client.put(f"/api/admin/schedules/{rule_id}", json={"weekdays": [7]})
+
+    assert response.status_code == 422
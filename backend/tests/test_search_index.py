@@ -0,0 +1,113 @@
+# 予約検索インデックスのテスト（変更通知の反映・ディスクへの書き出し・検索APIの一致方法）
+import threading
+from types import SimpleNamespace
+import pytest
+from app.services import search_service
+from app.utils import search_index
+from app.utils.search_index import ReservationSearchIndex
+
+def _reservation(number, name="五条悟", status="confirmed"):
+    return {
+        "reservation_id": f"id-{number}",
+        "reservation_number": number,
+        "user_email": f"{number.lower()}@example.com",
+        "user_name": name,
+        "user_phone": "09012345678",
+        "visit_date": "2030-01-01",
+        "visit_time": "10:00",
+        "slot_id": "2030-01-01_1000",
+        "status": status,
+        "products": [],
+        "created_at": f"2029-12-01T00:00:{number[-1]}0",
+        "updated_at": "2029-12-01T00:00:00",
+    }
+
+class _Doc:
+    def __init__(self, data):
+        self.id = data["reservation_id"]
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data)
+
+def _change(kind, data):
+    return SimpleNamespace(type=SimpleNamespace(name=kind), document=_Doc(data))
+
+def _numbers(results):
+    return sorted(r["reservation_number"] for r in results)
+
+@pytest.fixture
+def index(monkeypatch, tmp_path):
+    index = ReservationSearchIndex(max_memory_docs=2, directory=str(tmp_path))
+    monkeypatch.setattr(search_service, "reservation_index", index)
+    yield index
+    index.clear()
+
+def test_failed_snapshot_marks_index_stale_and_next_snapshot_rebuilds(index, monkeypatch):
+    first, second = _reservation("N1"), _reservation("N2")
+    original_upsert = index.upsert
+
+    def failing_upsert(doc_id, doc):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(index, "upsert", failing_upsert)
+    search_service._on_reservations_snapshot([_Doc(first)], [_change("ADDED", first)], None)
+
+    assert index.stale and not search_service.is_search_index_ready()
+    with pytest.raises(search_service.SearchIndexNotReadyError):
+        search_service.search_reservation_index(user_name="五条")
+
+    # 次の通知では変更分ではなく全件から作り直す
+    monkeypatch.setattr(index, "upsert", original_upsert)
+    search_service._on_reservations_snapshot([_Doc(first), _Doc(second)], [_change("ADDED", second)], None)
+
+    assert search_service.is_search_index_ready() and not index.stale
+    assert _numbers(search_service.search_reservation_index(user_name="五条")) == ["N1", "N2"]
+
+def test_spill_keeps_results_consistent(index):
+    for number in ["N1", "N2", "N3", "N4"]:
+        index.upsert(f"id-{number}", _reservation(number))
+    index.upsert("id-N1", _reservation("N1", name="夏油傑"))
+    index.remove("id-N2")
+
+    assert index.stats()["segment_docs"] > 0
+    assert _numbers(index.search({"name": "五条"})) == ["N3", "N4"]
+    assert _numbers(index.search({"name": "夏油"})) == ["N1"]
+
+def test_spill_writes_segment_without_holding_lock(index, monkeypatch):
+    for number in ["N1", "N2"]:
+        index.upsert(f"id-{number}", _reservation(number))
+    original_write = search_index.Segment.write
+    searched = []
+
+    def write_while_searching(path, docs):
+        # 書き出し中に別スレッドの検索・更新が待たされないこと
+        def concurrent():
+            searched.append(_numbers(index.search({"name": "五条"})))
+            index.upsert("id-N1", _reservation("N1", name="夏油傑"))
+
+        thread = threading.Thread(target=concurrent)
+        thread.start()
+        thread.join(timeout=1)
+        assert not thread.is_alive()
+        return original_write(path, docs)
+
+    monkeypatch.setattr(search_index.Segment, "write", write_while_searching)
+    index.upsert("id-N3", _reservation("N3"))
+
+    assert searched == [["N1", "N2", "N3"]]
+    assert _numbers(index.search({"name": "五条"})) == ["N2", "N3"]
+    assert _numbers(index.search({"name": "夏油"})) == ["N1"]
+
+def test_reservation_list_filters_stay_exact_while_admin_search_matches_partially(client, db, index):
+    reservation = _reservation("N1")
+    db.put("reservations", "id-N1", reservation)
+    search_service._on_reservations_snapshot([_Doc(reservation)], [_change("ADDED", reservation)], None)
+
+    partial = client.get("/api/reservations", params={"user_name": "五条"})
+    exact = client.get("/api/reservations", params={"user_name": "五条悟"})
+    admin = client.get("/api/admin/reservations/search", params={"user_name": "五条"})
+
+    assert partial.status_code == 200 and partial.json() == []
+    assert _numbers(exact.json()) == ["N1"]
+    assert _numbers(admin.json()) == ["N1"]
@@ -0,0 +1,51 @@
+# 予約枠ごとの予約者一覧（カーソルによるページング）のテスト
+import base64
+import json
+import pytest
+
+def _put_reservation(db, number, status="confirmed", slot_id="2030-01-01_1000"):
+    db.put("reservations", f"id-{number}", {
+        "reservation_id": f"id-{number}",
+        "reservation_number": number,
+        "user_email": f"{number}@example.com",
+        "user_name": "予約者",
+        "user_phone": "09012345678",
+        "visit_date": "2030-01-01",
+        "visit_time": "10:00",
+        "slot_id": slot_id,
+        "status": status,
+        "products": [],
+        "created_at": "2029-12-01T00:00:00",
+        "updated_at": "2029-12-01T00:00:00",
+    })
+
+def _page(client, cursor=None):
+    params = {"limit": 2}
+    if cursor:
+        params["cursor"] = cursor
+    return client.get("/api/admin/timeslots/2030-01-01_1000/reservations", params=params)
+
+def test_pages_through_slot_reservations_in_status_and_number_order(client, db):
+    for number, status in [("N3", "confirmed"), ("N1", "confirmed"), ("N2", "cancelled")]:
+        _put_reservation(db, number, status)
+    _put_reservation(db, "OTHER", slot_id="2030-01-01_1100")
+
+    first = _page(client).json()
+    second = _page(client, first["next_cursor"]).json()
+
+    assert [r["reservation_number"] for r in first["reservations"]] == ["N2", "N1"]
+    assert [r["reservation_number"] for r in second["reservations"]] == ["N3"]
+    assert second["next_cursor"] is None
+
+@pytest.mark.parametrize("cursor", [
+    "not base64!",
+    base64.urlsafe_b64encode(b"{}").decode(),
+    base64.urlsafe_b64encode(json.dumps(["confirmed"]).encode()).decode(),
+    base64.urlsafe_b64encode(json.dumps([1, {"a": 1}]).encode()).decode(),
+    base64.urlsafe_b64encode(b"\xff\xfe").decode(),
+])
+def test_malformed_cursor_is_rejected_as_bad_request(client, db, cursor):
+    response = _page(client, cursor)
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "cursor が正しくありません"
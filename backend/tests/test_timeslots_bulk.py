@@ -0,0 +1,90 @@
+# 予約枠の一括作成のテスト
+import json
+from google.api_core import exceptions as gexc
+from app.utils.storage import StorageUnavailableError
+
+BULK_REQUEST = {
+    "start_date": "2030-01-01",
+    "end_date": "2030-01-03",
+    "times": ["10:00", "11:00"],
+    "capacity": 5,
+}
+
+def test_bulk_create_writes_every_slot(client, db):
+    response = client.post("/api/admin/timeslots/bulk", json=BULK_REQUEST)
+
+    assert response.status_code == 200
+    assert response.json()["created"] == 6
+    assert db.doc("timeslots", "2030-01-03_1100")["capacity"] == 5
+
+def test_bulk_create_keeps_reserved_count_on_overwrite(client, db):
+    db.put("timeslots", "2030-01-01_1000", {
+        "slot_id": "2030-01-01_1000", "date": "2030-01-01", "time": "10:00",
+        "capacity": 3, "reserved_count": 2, "is_available": False,
+    })
+
+    result = client.post("/api/admin/timeslots/bulk", json={**BULK_REQUEST, "capacity": 8, "overwrite": True}).json()
+
+    assert (result["created"], result["updated"]) == (5, 1)
+    slot = db.doc("timeslots", "2030-01-01_1000")
+    assert (slot["capacity"], slot["reserved_count"], slot["is_available"]) == (8, 2, True)
+
+def test_streamed_bulk_create_ends_with_done_event(client, db):
+    response = client.post("/api/admin/timeslots/bulk", params={"stream": "true"}, json=BULK_REQUEST)
+
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert lines[-1]["event"] == "done"
+    assert lines[-1]["created"] == 6
+
+def test_streamed_bulk_create_reports_errors_as_last_line(client, db):
+    def unavailable(ref):
+        raise StorageUnavailableError("timeslots.bulk_commit")
+
+    db.fail_write = unavailable
+
+    response = client.post("/api/admin/timeslots/bulk", params={"stream": "true"}, json=BULK_REQUEST)
+
+    assert response.status_code == 200
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert lines[-1]["event"] == "error"
+    assert lines[-1]["status_code"] == 503
+    assert lines[-1]["error"]
+
+def test_bulk_create_refuses_when_a_day_could_not_be_checked(client, db):
+    db.put("timeslots", "2030-01-02_1000", {
+        "slot_id": "2030-01-02_1000", "date": "2030-01-02", "time": "10:00",
+        "capacity": 5, "reserved_count": 4, "is_available": True,
+    })
+    db.range_index_error = True
+
+    def fail_one_day(collection, filters):
+        if collection == "timeslots" and any(f.value == "2030-01-02" for f in filters):
+            raise gexc.PermissionDenied("denied")
+
+    db.fail_query = fail_one_day
+
+    response = client.post("/api/admin/timeslots/bulk", json=BULK_REQUEST)
+
+    assert response.status_code == 503
+    assert "2030-01-02" in response.json()["detail"]
+    assert db.doc("timeslots", "2030-01-02_1000")["reserved_count"] == 4
+    assert db.doc("timeslots", "2030-01-01_1000") is None
+
+def test_bulk_create_does_not_overwrite_slot_created_concurrently(client, db, monkeypatch):
+    from app.services import timeslot_bulk_service
+
+    db.put("timeslots", "2030-01-03_1100", {
+        "slot_id": "2030-01-03_1100", "date": "2030-01-03", "time": "11:00",
+        "capacity": 5, "reserved_count": 1, "is_available": True,
+    })
+
+    async def checked_before_creation(start_date, end_date):
+        # 確認した時点ではまだ作成されていなかった場合
+        return [], {"degraded": False, "missing_dates": []}
+
+    monkeypatch.setattr(timeslot_bulk_service, "get_stored_timeslots_by_date_range", checked_before_creation)
+
+    response = client.post("/api/admin/timeslots/bulk", json=BULK_REQUEST)
+
+    assert response.status_code == 409
+    assert db.doc("timeslots", "2030-01-03_1100")["reserved_count"] == 1